@@ -0,0 +1,135 @@
+/*
+ * Steps a compiled netlist (see netlist.py) for many ticks at once, without
+ * going back to the interpreter between ticks.
+ *
+ * This is an optional speed-up. Build it with `python -m shortcircuit.native`
+ * and `engine.NativeEngine` will pick it up. Everything works without it.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+PyDoc_STRVAR(step_doc,
+"step(offsets, indices, signals, scratch, nand_count, wire_count, ticks, mask)\n"
+"\n"
+"Runs a netlist forwards `ticks` times, updating `signals` in place. Has\n"
+"exactly the same effect as `Netlist.step`, for up to 64 lanes.\n"
+"\n"
+"`offsets` and `indices` are the netlist's inputs, as uint32 buffers (eg,\n"
+"array('I')). `signals` is a uint64 buffer (array('Q')) with a signal per\n"
+"node. `scratch` is a uint64 buffer with room for `nand_count` signals.\n"
+"The GIL is released while stepping.");
+
+static PyObject *
+kernel_step(PyObject *self, PyObject *args)
+{
+    Py_buffer offsets_buf, indices_buf, signals_buf, scratch_buf;
+    Py_ssize_t nand_count, wire_count, ticks;
+    unsigned long long mask;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "y*y*w*w*nnnK",
+                          &offsets_buf, &indices_buf, &signals_buf,
+                          &scratch_buf, &nand_count, &wire_count, &ticks,
+                          &mask)) {
+        return NULL;
+    }
+
+    const uint32_t *offsets = offsets_buf.buf;
+    const uint32_t *indices = indices_buf.buf;
+    uint64_t *signals = signals_buf.buf;
+    uint64_t *scratch = scratch_buf.buf;
+    Py_ssize_t node_count = signals_buf.len / (Py_ssize_t)sizeof(uint64_t);
+    Py_ssize_t edge_count = indices_buf.len / (Py_ssize_t)sizeof(uint32_t);
+    Py_ssize_t evaluated = nand_count + wire_count;
+    int bad_index = 0;
+
+    if (nand_count < 0 || wire_count < 0 || ticks < 0 ||
+            evaluated > node_count ||
+            offsets_buf.len / (Py_ssize_t)sizeof(uint32_t) < evaluated + 1 ||
+            scratch_buf.len / (Py_ssize_t)sizeof(uint64_t) < nand_count) {
+        PyErr_SetString(PyExc_ValueError, "Buffers are too small");
+        goto done;
+    }
+    if ((Py_ssize_t)offsets[evaluated] > edge_count) {
+        PyErr_SetString(PyExc_ValueError, "Offsets run past the indices");
+        goto done;
+    }
+    for (Py_ssize_t i = 0; i < evaluated; i++) {
+        if (offsets[i] > offsets[i + 1]) {
+            PyErr_SetString(PyExc_ValueError, "Offsets must not decrease");
+            goto done;
+        }
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    for (Py_ssize_t k = offsets[0]; k < (Py_ssize_t)offsets[evaluated]; k++) {
+        if ((Py_ssize_t)indices[k] >= node_count) {
+            bad_index = 1;
+            break;
+        }
+    }
+
+    for (Py_ssize_t t = 0; t < ticks && !bad_index; t++) {
+        /* NANDs all read the old signals, then update together */
+        for (Py_ssize_t i = 0; i < nand_count; i++) {
+            uint64_t acc = mask;
+            for (uint32_t k = offsets[i]; k < offsets[i + 1]; k++) {
+                acc &= signals[indices[k]];
+                if (!acc) {
+                    break;
+                }
+            }
+            scratch[i] = acc ^ mask;
+        }
+        memcpy(signals, scratch, nand_count * sizeof(uint64_t));
+
+        /* Wires only read NANDs and switches, so can go in any order */
+        for (Py_ssize_t i = nand_count; i < evaluated; i++) {
+            uint64_t acc = 0;
+            for (uint32_t k = offsets[i]; k < offsets[i + 1]; k++) {
+                acc |= signals[indices[k]];
+                if (acc == mask) {
+                    break;
+                }
+            }
+            signals[i] = acc;
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    if (bad_index) {
+        PyErr_SetString(PyExc_ValueError, "Index out of range");
+        goto done;
+    }
+
+    Py_INCREF(Py_None);
+    result = Py_None;
+
+done:
+    PyBuffer_Release(&offsets_buf);
+    PyBuffer_Release(&indices_buf);
+    PyBuffer_Release(&signals_buf);
+    PyBuffer_Release(&scratch_buf);
+    return result;
+}
+
+static PyMethodDef kernel_methods[] = {
+    {"step", kernel_step, METH_VARARGS, step_doc},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef kernel_module = {
+    PyModuleDef_HEAD_INIT,
+    "_kernel",
+    "Native netlist kernel for short-circuit.",
+    -1,
+    kernel_methods
+};
+
+PyMODINIT_FUNC
+PyInit__kernel(void)
+{
+    return PyModule_Create(&kernel_module);
+}
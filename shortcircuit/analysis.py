@@ -0,0 +1,290 @@
+"""Works out what a board will cost to simulate, without simulating it.
+
+    PYTHONPATH=. python -m shortcircuit.analysis BOARD
+
+prints a JSON report. Everything here takes time in proportion to the size
+of the board.
+"""
+import argparse
+import json
+import sys
+
+from shortcircuit.board import Board
+from shortcircuit.netlist import CONST, NAND, WIRE, Netlist
+from shortcircuit.simnode import WireBridge
+
+
+def histogram(values):
+    """Counts values in power of two buckets: "0", "1", "2-3", "4-7"..."""
+    counts = {}
+    for value in values:
+        if value < 2:
+            low = high = value
+        else:
+            low = 1 << (value.bit_length() - 1)
+            high = 2 * low - 1
+        counts[(low, high)] = counts.get((low, high), 0) + 1
+    return {(str(low) if low == high else f'{low}-{high}'): counts[low, high]
+            for low, high in sorted(counts)}
+
+
+def strongly_connected(count, sources):
+    """Tarjan's algorithm, without recursion so that long chains don't blow
+    the stack.
+
+    Parameters
+    ----------
+
+    count : int
+      Number of nodes.
+    sources : list
+      The nodes each node reads from.
+
+    Returns : list
+      The strongly connected components, as lists of nodes. Each comes
+      before any component which reads from it.
+    """
+    index = [None] * count
+    low = [0] * count
+    on_stack = [False] * count
+    stack = []
+    components = []
+    counter = 0
+
+    for root in range(count):
+        if index[root] is not None:
+            continue
+        # (node, iterator over what it reads)
+        work = [(root, iter(sources[root]))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while work:
+            node, edges = work[-1]
+            for j in edges:
+                if index[j] is None:
+                    index[j] = low[j] = counter
+                    counter += 1
+                    stack.append(j)
+                    on_stack[j] = True
+                    work.append((j, iter(sources[j])))
+                    break
+                elif on_stack[j] and index[j] < low[node]:
+                    low[node] = index[j]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        j = stack.pop()
+                        on_stack[j] = False
+                        component.append(j)
+                        if j == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def is_loop(component, sources):
+    """Whether a strongly connected component is a feedback loop, rather than
+    a single node which doesn't read itself."""
+    return len(component) > 1 or component[0] in sources[component[0]]
+
+
+def analyze(board, top=10):
+    """Reports on the structure of a board.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to look at. It is only read from, besides being resolved if
+      it was loaded lazily (see `Board.resolve`).
+    top : int
+      How many of the worst offenders to list, for the lists of nodes.
+
+    Returns : dict
+      Something which can be dumped to JSON. Nodes are given by the coords
+      of their first tile (along the rows). Has:
+
+      counts : the number of tiles, NANDs, wires, switches (and portals),
+        bridges and connections.
+      fan_in, fan_out : for NANDs and for wires, how many nodes read from
+        (or are read by) how many others, in power of two buckets.
+      widest_wires : the wires with the most inputs, which are the slowest
+        to evaluate.
+      depth : the most ticks it takes a change to ripple through the logic,
+        counting each feedback loop as one step.
+      loops : each feedback loop, with how many NANDs it has, and whether it
+        inverts (and so can oscillate) or latches.
+      dead : wires and NANDs which nothing drives, nodes which drive
+        nothing, and nodes which will never change once settled.
+    """
+    board.resolve()
+    netlist = Netlist(board)
+    count = len(netlist)
+    kinds = netlist.kinds
+    sources = netlist.sources
+
+    first = {}
+    tiles = 0
+    bridges = 0
+    for y, row in enumerate(board.grid):
+        for x, node in enumerate(row):
+            if node is None:
+                continue
+            tiles += 1
+            if isinstance(node, WireBridge):
+                bridges += 1
+            elif node not in first:
+                first[node] = (x, y)
+    coords = [list(first[node]) for node in netlist.nodes]
+
+    fan_out = [0] * count
+    for i in range(count):
+        for j in sources[i]:
+            fan_out[j] += 1
+
+    nands = [i for i in range(count) if kinds[i] == NAND]
+    wires = [i for i in range(count) if kinds[i] == WIRE]
+    widest = sorted(wires, key=lambda i: len(sources[i]), reverse=True)
+
+    report = {
+        'counts': {
+            'tiles': tiles,
+            'nands': len(nands),
+            'wires': len(wires),
+            'switches': count - len(nands) - len(wires),
+            'bridges': bridges,
+            'connections': len(netlist.indices),
+        },
+        'fan_in': {
+            'nands': histogram(len(sources[i]) for i in nands),
+            'wires': histogram(len(sources[i]) for i in wires),
+        },
+        'fan_out': {
+            'nands': histogram(fan_out[i] for i in nands),
+            'wires': histogram(fan_out[i] for i in wires),
+        },
+        'widest_wires': [{'coords': coords[i], 'inputs': len(sources[i])}
+                         for i in widest[:top] if sources[i]],
+    }
+
+    # Components come out with everything they read from first, so one pass
+    # is enough to work out depths and what can change
+    components = strongly_connected(count, sources)
+    component_of = [0] * count
+    for c, component in enumerate(components):
+        for i in component:
+            component_of[i] = c
+
+    loops = []
+    depth = [0] * len(components)
+    # Whether anything in a component can ever change once the board has
+    # settled: switches can be flipped, and loops can oscillate
+    live = [False] * len(components)
+    for c, component in enumerate(components):
+        i = component[0]
+        looped = is_loop(component, sources)
+        inputs = [component_of[j] for k in component for j in sources[k]
+                  if component_of[j] != c]
+        d = max((depth[s] for s in inputs), default=0)
+        # Only NANDs take a tick. A loop is counted as a single step.
+        if looped or kinds[i] == NAND:
+            d += 1
+        depth[c] = d
+        live[c] = (kinds[i] == CONST or looped or
+                   any(live[s] for s in inputs))
+
+        if looped:
+            loop_nands = sum(1 for k in component if kinds[k] == NAND)
+            loops.append({
+                'coords': min(coords[k] for k in component),
+                'nodes': len(component),
+                'nands': loop_nands,
+                'kind': ('inverting' if _inverts(component, component_of, c,
+                                                 kinds, sources)
+                         else 'latching'),
+            })
+
+    report['depth'] = max(depth, default=0)
+    loops.sort(key=lambda loop: loop['nodes'], reverse=True)
+    report['loops'] = {
+        'count': len(loops),
+        'inverting': sum(1 for loop in loops if loop['kind'] == 'inverting'),
+        'largest': loops[:top],
+    }
+
+    undriven = [i for i in range(count)
+                if kinds[i] != CONST and not sources[i]]
+    unused = [i for i in range(count) if kinds[i] != WIRE and not fan_out[i]]
+    constant = [i for i in range(count) if not live[component_of[i]]]
+    report['dead'] = {
+        'undriven': {'count': len(undriven),
+                     'coords': [coords[i] for i in undriven[:top]]},
+        'unused': {'count': len(unused),
+                   'coords': [coords[i] for i in unused[:top]]},
+        'constant': {'count': len(constant),
+                     'coords': [coords[i] for i in constant[:top]]},
+    }
+    return report
+
+
+def _inverts(component, component_of, c, kinds, sources):
+    """Whether a loop has a path round it through an odd number of NANDs.
+
+    Gives each node a parity, flipping at each NAND. If a node can be reached
+    with both parities, there's an odd loop.
+    """
+    parity = {component[0]: 0}
+    todo = [component[0]]
+    # Follow the edges backwards, which is the way they're stored
+    while todo:
+        i = todo.pop()
+        p = parity[i] ^ (kinds[i] == NAND)
+        for j in sources[i]:
+            if component_of[j] != c:
+                continue
+            seen = parity.get(j)
+            if seen is None:
+                parity[j] = p
+                todo.append(j)
+            elif seen != p:
+                return True
+    return False
+
+
+def add_arguments(parser):
+    """Adds the analysis' arguments to an argparse parser."""
+    parser.add_argument('board', help='Board file to analyze')
+    parser.add_argument('--top', metavar='N', type=int, default=10,
+                        help='How many nodes to list for each problem')
+
+
+def run(args):
+    """Prints a JSON report on a board.
+
+    Returns : int
+      The exit status.
+    """
+    with open(args.board) as f:
+        board = Board.deserialize(f.read())
+    json.dump(analyze(board, args.top), sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reports on the structure '
+                                                 'of a board')
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Times loading a large board, and editing it.
+
+Run with:
+
+    PYTHONPATH=. python shortcircuit/bench/edit.py
+"""
+import argparse
+import random
+import time
+
+from shortcircuit.bench.generate import full_adders
+from shortcircuit.board import Board
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=30, metavar='N',
+                        help='Build an NxN grid of full adders')
+    parser.add_argument('--edits', type=int, default=2000, metavar='N',
+                        help='Number of random edits to make')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    board_str = full_adders(args.repeat, args.repeat)
+
+    start = time.perf_counter()
+    board = Board.deserialize(board_str)
+    load_time = time.perf_counter() - start
+    tiles = sum(len(row) for row in board.grid)
+    print(f'Load: {load_time:.3f}s for {tiles} tiles '
+          f'({tiles / load_time:.0f} tiles/s)')
+
+    # Scribble over the board. Tiles are picked from the original design, so
+    # edits join and break wires as well as placing components.
+    rng = random.Random(args.seed)
+    height = len(board.grid)
+    width = len(board.grid[0])
+    glyphs = '.-rx|'
+    edits = [((rng.randrange(width), rng.randrange(height)),
+              rng.choice(glyphs)) for i in range(args.edits)]
+
+    start = time.perf_counter()
+    for coords, glyph in edits:
+        board.set(coords, Board.deserialize_simnode(glyph))
+    edit_time = time.perf_counter() - start
+    print(f'Edit: {edit_time:.3f}s for {args.edits} edits '
+          f'({edit_time / args.edits * 1e6:.1f}us per edit)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""Generates large boards for benchmarking."""
+import os
+
+FULL_ADDER = os.path.join(os.path.dirname(__file__),
+                          '..', '..', 'data', 'full-adder.ssboard')
+
+
+def tiled(board_str, repeat_x, repeat_y):
+    """Repeats a serialized board to make a bigger one.
+
+    Parameters
+    ----------
+
+    board_str : str
+      A serialized board.
+    repeat_x : int
+      How many copies to place side by side.
+    repeat_y : int
+      How many copies to stack on top of each other.
+
+    Returns : str
+      The bigger board, serialized.
+    """
+    rows = board_str.split('\n')
+    width = max(len(row) for row in rows)
+    rows = [row.ljust(width, '.') * repeat_x for row in rows]
+    return '\n'.join(rows * repeat_y)
+
+
+def full_adders(repeat_x, repeat_y):
+    """A grid of copies of the demo full adder."""
+    with open(FULL_ADDER) as f:
+        return tiled(f.read(), repeat_x, repeat_y)
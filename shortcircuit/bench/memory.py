@@ -0,0 +1,70 @@
+"""Measures how much memory SimNodes take up.
+
+Run with:
+
+    PYTHONPATH=. python shortcircuit/bench/memory.py
+"""
+import argparse
+import gc
+import tracemalloc
+
+from shortcircuit.bench.generate import full_adders
+from shortcircuit.board import Board
+from shortcircuit.simnode import Nand, Switch, Wire, WireBridge
+
+
+def allocated(fn):
+    """Runs `fn`, and returns how many bytes it left allocated along with
+    whatever it returned."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return after - before, result
+
+
+def per_class(count):
+    """Bytes per freshly created node, for each SimNode class."""
+    sizes = {}
+    for cls in [Wire, Nand, Switch, WireBridge]:
+        size, nodes = allocated(lambda: [cls() for i in range(count)])
+        # Don't count the list holding them
+        size -= nodes.__sizeof__()
+        sizes[cls.__name__] = size / count
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=30, metavar='N',
+                        help='Build an NxN grid of full adders')
+    parser.add_argument('--count', type=int, default=100000, metavar='N',
+                        help='Nodes to create when measuring each class')
+    args = parser.parse_args()
+
+    print('Bytes per freshly created node:')
+    for name, size in per_class(args.count).items():
+        print(f'  {name:<12} {size:8.1f}')
+
+    board_str = full_adders(args.repeat, args.repeat)
+    size, board = allocated(lambda: Board.deserialize(board_str))
+    # The grid's own lists aren't SimNodes, so leave them out
+    size -= sum(row.__sizeof__() for row in board.grid)
+    size -= board.grid.__sizeof__()
+
+    tiles = sum(1 for row in board.grid for n in row if n is not None)
+    nodes = len({id(n) for row in board.grid for n in row if n is not None})
+    print(f'Board of {args.repeat}x{args.repeat} full adders: '
+          f'{tiles} tiles, {nodes} distinct nodes')
+    print(f'  Total        {size / 2**20:8.1f} MiB')
+    print(f'  Per tile     {size / tiles:8.1f} bytes')
+    print(f'  Per node     {size / nodes:8.1f} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Times `Board.tick()` on a large board, and works out the cost per gate.
+
+Run with:
+
+    PYTHONPATH=. python shortcircuit/bench/tick.py
+
+Other engines can be timed with `--engine`.
+"""
+import argparse
+import time
+
+import shortcircuit.engine as engine
+from shortcircuit.bench.generate import full_adders
+from shortcircuit.board import Board
+from shortcircuit.simnode import Wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--repeat', type=int, default=10, metavar='N',
+                        help='Build an NxN grid of full adders')
+    parser.add_argument('-t', '--ticks', type=int, default=20, metavar='N',
+                        help='Number of ticks to time')
+    parser.add_argument('--engine', default='object',
+                        choices=['fastest'] + list(engine.ENGINES),
+                        help='Simulation engine to time')
+    args = parser.parse_args()
+
+    board = Board.deserialize(full_adders(args.repeat, args.repeat))
+    nodes = {n for row in board.grid for n in row if n is not None}
+    wires = sum(1 for n in nodes if isinstance(n, Wire))
+    gates = len(nodes) - wires
+    print(f'Board of {args.repeat}x{args.repeat} full adders: '
+          f'{gates} gates, {wires} wires')
+
+    sim = engine.create(args.engine, board)
+    print(f'Using the {sim.name} engine')
+
+    # Warm up
+    sim.step()
+
+    start = time.perf_counter()
+    sim.step(args.ticks)
+    elapsed = time.perf_counter() - start
+
+    per_tick = elapsed / args.ticks
+    print(f'  Per tick     {per_tick * 1e3:8.2f} ms')
+    print(f'  Per node     {per_tick / len(nodes) * 1e9:8.0f} ns '
+          '(gates and wires)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,45 @@
-import copy
 import logging
 
 import shortcircuit.util as util
-from shortcircuit.simnode import SimNode, Wire, WireBridge, Nand, Switch
+from shortcircuit.simnode import (SimNode, Wire, WireBridge, Nand, Switch,
+                                  Portal)
 
 logger = logging.getLogger()
 
+# Kinds of change recorded in `Board.changes`
+#   (SET, coords, old node, new node)
+#   (LINK, receiver, node, count) -- `receiver.input_link(node, count)`
+#   (FACING, nand, old facing, new facing)
+SET = 0
+LINK = 1
+FACING = 2
+
+
+def _glyph_table():
+    """Works out which class reads each glyph, by trying every class on every
+    glyph any of them could read, so that reading a tile is one lookup rather
+    than an exception per class that turns it down.
+
+    Returns : dict
+      glyph -> class
+    """
+    # In the order they were always tried
+    classes = [Wire, WireBridge, Nand, Switch, Portal]
+    table = {}
+    glyphs = [glyph for cls in classes for glyph in cls.serialized_glyphs]
+    for glyph in glyphs + [glyph.upper() for glyph in glyphs]:
+        for cls in classes:
+            try:
+                cls.deserialize(glyph)
+            except (AssertionError, ValueError):
+                continue
+            table.setdefault(glyph, cls)
+            break
+    return table
+
+
+_GLYPHS = _glyph_table()
+
 
 class Board:
     def __init__(self):
@@ -27,27 +61,62 @@ class Board:
         # wire1 -> coord1, coord2
         # node2 -> coord3
 
+        # Parallel to the grid. For each tile, bit `i` is set if there is a
+        # SimNode next to it in the direction `util.neighbour_deltas()[i]`.
+        # Each row is built on first use, then kept up to date by `set_basic`.
+        self.masks = None
+
+        # (nodes, wires) to evaluate each tick, as tuples. Built on first use
+        # and thrown away whenever the grid changes.
+        self.tick_lists = None
+
+        # Goes up whenever the grid or the connections between nodes change,
+        # so anything compiled from the board (eg, an engine) can tell when
+        # it's out of date.
+        self.version = 0
+
+        # For each WireBridge, coords -> [left, right, top, bottom]: the
+        # extent of the run of bridges it is part of, across and down. Lets
+        # `into` jump straight over any run of bridges. Built on first use,
+        # then kept up to date by `set_basic`.
+        self.bridges = None
+
+        # While this is a list, every change made to the grid and to the
+        # connections between nodes is added to it, so that it can be undone
+        # (or done again) with `apply_changes`.
+        self.changes = None
+
+        # False while the wires and connections of a board loaded with `lazy`
+        # still have to be worked out (see `resolve`).
+        self.resolved = True
+
     def initialize_grid(self, dimensions):
         (x, y) = dimensions
         self.grid = [[None] * x for iy in range(y)]
+        self.resolved = True
+        self.masks = None
+        self.tick_lists = None
+        self.version += 1
+        self.bridges = None
 
     def tick(self):
         """Ticks the sim. Could work in parallel. Only touches the
         graph_cache."""
-        wires, nodes = self._get_caches()
-        logger.info('TICKING THE SIM')
-        logger.debug(f'wires: {wires} nodes: {nodes}')
-
-        for (_, _, node) in nodes:
-            logger.debug(f'Ticking the node: {node}')
+        self.resolve()
+        if self.tick_lists is None:
+            wires, nodes = self._get_caches()
+            self.tick_lists = (tuple(node for (_, _, node) in nodes),
+                               tuple(wires))
+        nodes, wires = self.tick_lists
+
+        for node in nodes:
             node.calculate_next_output()
         # Because nodes can connect directly to other nodes, the tick step must
         # be separate from the calculation step. Otherwise, the unsorted nature
         # of the node set will produce non-deterministic behavior.
-        for (_, _, node) in nodes:
+        for node in nodes:
             node.tick()
         for wire in wires:
-            logger.debug(f'Ticking the wire: {wire}')
             wire.calculate_next_output()
             wire.tick()
 
@@ -80,30 +149,148 @@ class Board:
         n = self.get(coords)
         if n is None:
             return (self, coords, None)
-        else:
-            return n.get(self, coords, delta)
+        if isinstance(n, WireBridge):
+            # Skip the whole run of bridges at once
+            if self.bridges is None:
+                self._grid_global_bridge_refresh()
+            left, right, top, bottom = self.bridges[coords]
+            x, y = coords
+            dx, dy = delta
+            if dx > 0:
+                coords, far = (right, y), (right + 1, y)
+            elif dx < 0:
+                coords, far = (left, y), (left - 1, y)
+            elif dy > 0:
+                coords, far = (x, bottom), (x, bottom + 1)
+            else:
+                coords, far = (x, top), (x, top - 1)
+            n = self.get(far)
+            if n is None:
+                # Nothing on the other side
+                return (self, coords, None)
+            coords = far
+        return n.get(self, coords, delta)
 
     def set(self, coords, node: SimNode):
         """Places a SimNode on the board. This also performs any wire joining
-        and IO updates."""
+        and IO updates.
 
+        Only the connections which run through this tile are touched. Wires
+        which are joined or broken here have their tiles swapped over to new
+        Wire objects, but their connections are moved across rather than
+        worked out again.
+        """
+        self.resolve()
         old_node = self.get(coords)
-        self.set_basic(coords, node)
+        if old_node is node:
+            return
+
+        # Take the old node out, and break any wires it was holding together
+        self.disconnect(coords)
+        self.set_basic(coords, None)
+        wires = []
+        if isinstance(old_node, Wire) and not isinstance(node, Wire):
+            starts = [nc for nc, n in self.neighbours_into(coords)
+                      if n is old_node]
+            wires += self._split_wire(old_node, starts)
+        elif isinstance(old_node, WireBridge) and \
+                not isinstance(node, (Wire, WireBridge)):
+            wires += self._split_bridged_wires(coords)
+
+        # Put the new one in, and join any wires it connects. Its connections
+        # must be in place first, so that the joins can move them.
+        if node is not None:
+            node.clear_links()
+            self.set_basic(coords, node)
+        self.connect(coords)
+        if isinstance(node, Wire):
+            wires.append(self._join_wires(coords, node))
+        elif isinstance(node, WireBridge):
+            wires += self._join_bridged_wires(coords)
 
-        if old_node is not None:
-            # We need to delete the old node first!
-            # Clear it out of our neighbour's inputs.
-            for n in self.neighbour_objs_into(coords):
-                n.input_remove(old_node)
+        # Make sure the changed wires immediately show the correct value
+        for wire in wires:
+            wire.calculate_next_output()
+            wire.tick()
 
-        # Perform any required wire joins/breaks
-        if isinstance(node, Wire):
-            self._grid_local_wire_join(coords, node)
-        elif isinstance(old_node, Wire):
-            self._grid_local_wire_break(coords, old_node)
+    def set_facing(self, coords, facing):
+        """Turns the NAND on a tile to face another way. Only the connections
+        on this tile change."""
+        self.resolve()
+        nand = self.get(coords)
+        self.disconnect(coords)
+        if self.changes is not None:
+            self.changes.append((FACING, nand, nand.facing, facing))
+        nand.facing = facing
+        self.connect(coords)
+
+    def apply_changes(self, changes, undo=False):
+        """Puts back (or, with `undo`, takes back) a list of changes recorded
+        in `changes`.
+
+        Nothing is worked out again: tiles are swapped straight back to the
+        nodes they held, and connections are added or removed by count, so
+        undoing an edit costs as much as the edit changed, however much it
+        had to look at.
+
+        Raises : ValueError
+          If the board has been changed some other way since, so the changes
+          no longer fit. The board is left as it was.
+        """
+        self.resolve()
+        if undo:
+            changes = changes[::-1]
+
+        # Check that every tile holds what the changes expect it to, before
+        # touching anything
+        expected = {}
+        for change in changes:
+            if change[0] == SET:
+                _, coords, old, new = change
+                if undo:
+                    old, new = new, old
+                expected.setdefault(coords, old)
+        for coords, node in expected.items():
+            if self.get(coords) is not node:
+                raise ValueError(f'{coords} has changed since')
+
+        sign = -1 if undo else 1
+        wires = set()
+        for change in changes:
+            kind = change[0]
+            if kind == LINK:
+                _, receiver, node, count = change
+                receiver.input_link(node, sign * count)
+            elif kind == SET:
+                _, coords, old, new = change
+                if undo:
+                    old, new = new, old
+                self.set_basic(coords, new)
+                if isinstance(new, Wire):
+                    wires.add(new)
+            else:
+                _, nand, old, new = change
+                nand.facing = old if undo else new
+        self.version += 1
+
+        # Make sure the changed wires immediately show the correct value
+        for wire in wires:
+            wire.calculate_next_output()
+            wire.tick()
 
-        # Make sure all neighbours have their connections updated
-        self._grid_local_io_refresh(coords)
+    def connect(self, coords):
+        """Connects whatever is on a tile to whatever it touches. A bridge
+        connects whatever is on either side of it."""
+        self.resolve()
+        self._link_tile(coords, 1)
+
+    def disconnect(self, coords):
+        """Removes every connection which runs through a tile. Must be done
+        before anything about the tile is changed (including which way a NAND
+        is facing), so that exactly the same connections are removed as were
+        added."""
+        self.resolve()
+        self._link_tile(coords, -1)
 
     def copy(self, coords_from, dims, coords_to):
         """Copies an area of the board to somewhere else on the board.
@@ -124,7 +311,11 @@ class Board:
                        coords_from[1] + y)
                 dest = (coords_to[0] + x,
                         coords_to[1] + y)
-                node = copy.deepcopy(self.get(src))
+                # A fresh node in the same state. Copying the node itself
+                # would copy everything it's connected to as well.
+                node = self.get(src)
+                if node is not None:
+                    node = self.deserialize_simnode(node.serialize())
                 self.set(dest, node)
 
     def set_basic(self, coords, node: SimNode):
@@ -132,32 +323,91 @@ class Board:
         x, y = coords
         if x < 0 or y < 0:
             raise IndexError
+        old_node = self.grid[y][x]
         self.grid[y][x] = node
+        if old_node is not node:
+            self.tick_lists = None
+            self.version += 1
+            if self.changes is not None:
+                self.changes.append((SET, coords, old_node, node))
+
+        if self.masks is not None and (old_node is None) != (node is None):
+            self._local_mask_update(coords, node is not None)
+
+        if self.bridges is not None:
+            bridge = isinstance(node, WireBridge)
+            if isinstance(old_node, WireBridge) != bridge:
+                self._local_bridge_update(coords, bridge)
+
+    def neighbour_mask(self, coords):
+        """Which of the neighbouring tiles hold a SimNode.
+
+        Returns : int
+          Bit `i` is set if there is a SimNode in the direction
+          `util.neighbour_deltas()[i]`.
+        """
+        if self.masks is None:
+            self._grid_global_mask_refresh()
+        x, y = coords
+        return self.masks[y][x]
 
     @staticmethod
     def deserialize_simnode(glyph):
-        for cls in [Wire, WireBridge, Nand, Switch]:
-            try:
-                return cls.deserialize(glyph)
-            except:
-                continue
-        return None
+        cls = _GLYPHS.get(glyph)
+        if cls is None:
+            return None
+        return cls.deserialize(glyph)
 
     @classmethod
-    def deserialize(cls, string):
-        """Rebuilds the grid from a string."""
+    def deserialize(cls, string, lazy=False):
+        """Rebuilds the grid from a string.
+
+        Parameters
+        ----------
+
+        string : str
+          The board, as written by `serialize`.
+        lazy : bool
+          Only read each row of tiles the first time it's looked at, and
+          leave working out the wires and connections until the board is
+          first changed or ticked (see `resolve`). Lets a huge board be shown
+          straight away. Until then, every wire reads as off.
+        """
 
         rows = string.split('\n')
+        read = cls.deserialize_simnode
 
         board = Board()
-        board.grid = [list(map(cls.deserialize_simnode, list(row)))
-                      for row in rows]
+        if lazy:
+            board.grid = util.LazyRows(
+                len(rows), lambda y: list(map(read, rows[y])))
+            board.resolved = False
+            return board
+
+        board.grid = [list(map(read, row)) for row in rows]
 
         board._grid_global_wire_join()
         board._grid_global_io_refresh()
 
         return board
 
+    def resolve(self):
+        """Reads the rest of the tiles of a board loaded with `lazy`, and
+        works out its wires and connections. Wires can run right across the
+        board, so this is all done at once. Anything which changes or ticks
+        the board does this first, so it only needs calling directly before
+        reading the board's signals."""
+        if self.resolved:
+            return
+        self.resolved = True
+        # None of this is an edit, so none of it can be undone
+        changes, self.changes = self.changes, None
+        self.grid = list(self.grid)
+        self._grid_global_wire_join()
+        self._grid_global_io_refresh()
+        self.changes = changes
+        logger.debug('Resolved lazily loaded board')
+
     def serialize(self):
         """Dumps current grid state to a string."""
         string = ''
@@ -172,6 +422,20 @@ class Board:
         # Slice off the last newline otherwise we end up with two of them
         return string[:-1]
 
+    def signals(self):
+        """Snapshot of the current output of every tile on the board.
+
+        Returns : dict
+          coord -> bool, for every tile which holds a SimNode.
+        """
+        self.resolve()
+        signals = {}
+        for y, row in enumerate(self.grid):
+            for x, node in enumerate(row):
+                if node is not None:
+                    signals[(x, y)] = bool(node.output())
+        return signals
+
     #####################################################
     # Convenience methods
     #####################################################
@@ -183,13 +447,22 @@ class Board:
 
     def neighbour_objs_into(self, coords):
         """Returns the neighbouring nodes through portals (No `None`s)"""
-        n_objs = []
-        for nd in util.neighbour_deltas():
-            nc = util.add(coords, nd)
-            _, nc, n = self.into(nc, nd)
-            if n is not None:
-                n_objs.append(n)
-        return n_objs
+        return [n for _, n in self.neighbours_into(coords) if n is not None]
+
+    def neighbours_into(self, coords):
+        """Looks through portals in every direction from a tile at once.
+
+        Returns : list
+          For each direction, in `util.neighbour_deltas()` order, the
+          `(coords, SimNode)` which is found there. The SimNode is None if
+          there is nothing there.
+        """
+        x, y = coords
+        into = self.into
+        return [into((x, y - 1), util.NEIGHBOUR_DELTAS[0])[1:],
+                into((x + 1, y), util.NEIGHBOUR_DELTAS[1])[1:],
+                into((x, y + 1), util.NEIGHBOUR_DELTAS[2])[1:],
+                into((x - 1, y), util.NEIGHBOUR_DELTAS[3])[1:]]
 
     #####################################################
     # Internal use methods
@@ -209,112 +482,285 @@ class Board:
                     nodes.add((x, y, me))
         return (wires, nodes)
 
-    def _recursive_wire_replace(self, old_wire_coords, new_wire):
-        """Recursively flood through a wire and replace it with a new
-        wire.
-
-        TODO: How does caching fit into this?
+    def _link(self, a, i, b, count):
+        """Adds (or removes, if `count` is negative) connections between two
+        nodes which touch, `b` being in direction `i` from `a`."""
+        if a is b or (isinstance(a, Wire) and isinstance(b, Wire)):
+            # Touching wires are joined into one, not connected
+            return
+        delta = util.NEIGHBOUR_DELTAS[i]
+        back = util.INVERTED_DELTAS[i]
+        changes = self.changes
+        self.version += 1
+        if a.outputs_to(delta) and b.accepts_from(back):
+            b.input_link(a, count)
+            if changes is not None:
+                changes.append((LINK, b, a, count))
+        if b.outputs_to(back) and a.accepts_from(delta):
+            a.input_link(b, count)
+            if changes is not None:
+                changes.append((LINK, a, b, count))
+
+    def _link_tile(self, coords, count):
+        node = self.get(coords)
+        if node is None:
+            return
+        neighbours = self.neighbours_into(coords)
+        if isinstance(node, WireBridge):
+            # Up to down, and left to right
+            for a, i, b in ((0, 2, 2), (3, 1, 1)):
+                na = neighbours[a][1]
+                nb = neighbours[b][1]
+                if na is not None and nb is not None:
+                    self._link(na, i, nb, count)
+        else:
+            for i, (_, n) in enumerate(neighbours):
+                if n is not None:
+                    self._link(node, i, n, count)
 
-        Returns : set
-          Set of all the SimNodes which will need to have their IO updated.
+    def _replace_wire(self, coords, old_wire, new_wire):
+        """Flood through a wire and replace it with a new wire, moving its
+        connections across as we go.
 
+        This used to be recursive, but long wires would blow the stack, so
+        now it keeps its own.
         """
-        # Replace the current wire
-        self.set_basic(old_wire_coords, new_wire)
-
-        dirty_simnodes = {}
-
-        # In the list of all wire neighbours which aren't the new wire...
-        for nd in util.neighbour_deltas():
-            nc = util.add(old_wire_coords, nd)
-            _, nc, n = self.into(nc, nd)
-            if isinstance(n, Wire) and n != new_wire:
-                # Replace them, too!
-                dirty_simnodes.update(
-                        self._recursive_wire_replace(nc, new_wire))
-            elif n is not None:
-                dirty_simnodes[nc] = n
-        return dirty_simnodes
-
-    def _grid_local_wire_join(self, coords, new_wire: Wire):
-        """Ensures all wires in the wire group at the given coords consist of
-        the same object, and that inputs/outputs are correct.
-
-        Parameters
-        ----------
-        coords : tuple
-            A tuple of grid coordinates to join at.
-        new_wire : Wire
-            The new wire to replace the entire group with.
+        link = self._link
+        self.set_basic(coords, new_wire)
+        to_visit = [coords]
+        while to_visit:
+            neighbours = self.neighbours_into(to_visit.pop())
+            for i, (nc, n) in enumerate(neighbours):
+                if n is old_wire:
+                    self.set_basic(nc, new_wire)
+                    to_visit.append(nc)
+                elif n is not None and not isinstance(n, Wire):
+                    link(old_wire, i, n, -1)
+                    link(new_wire, i, n, 1)
+
+    def _join_wires(self, coords, new_wire: Wire):
+        """Joins every wire touching a tile into the wire on it.
+
+        Returns : Wire
+          The joined wire.
         """
-        neighbouring_wires = [sn for sn in self.neighbour_objs(coords)
-                              if isinstance(sn, Wire)]
-
-        new_wire.signal = any([w.output() for w in neighbouring_wires])
-
-        old_input_sets = [w.inputs for w in neighbouring_wires]
-        # The new inputs are a union of all the old input sets
-        new_wire.inputs = set().union(*old_input_sets)
-
-        dirty_simnodes = self._recursive_wire_replace(coords, new_wire)
-
-        # Update IO for all dirty_simnodes
-        for coord, n in dirty_simnodes.items():
-            n.recalculate_io(coord, self)
-        # Make sure the new wires immediately show the correct value
-        new_wire.calculate_next_output()
-        new_wire.tick()
-
+        for i, nc in enumerate(util.neighbour_coords(coords)):
+            # Look each neighbour up as we go, since earlier floods may have
+            # already replaced it
+            _, nc, n = self.into(nc, util.NEIGHBOUR_DELTAS[i])
+            if isinstance(n, Wire) and n is not new_wire:
+                self._replace_wire(nc, n, new_wire)
         return new_wire
 
-    def _grid_local_wire_break(self, coords, broken_wire: Wire):
-        """Break a wire into multiple bits if required
+    def _join_bridged_wires(self, coords):
+        """Joins the wires either side of a bridge, in both directions.
+
+        Returns : list
+          The wires which were joined.
+        """
+        wires = []
+        for a, b in ((0, 2), (3, 1)):
+            neighbours = self.neighbours_into(coords)
+            (_, na), (bc, nb) = neighbours[a], neighbours[b]
+            if isinstance(na, Wire) and isinstance(nb, Wire) and na is not nb:
+                self._replace_wire(bc, nb, na)
+                wires.append(na)
+        return wires
+
+    def _split_bridged_wires(self, coords):
+        """Breaks any wire which crossed a bridge which has been removed.
+
+        Returns : list
+          See `_split_wire`.
+        """
+        starts = {}  # wire -> coords it was seen at
+        neighbours = self.neighbours_into(coords)
+        for a, b in ((0, 2), (3, 1)):
+            (ac, na), (bc, nb) = neighbours[a], neighbours[b]
+            if isinstance(na, Wire) and na is nb:
+                starts.setdefault(na, []).extend([ac, bc])
+        wires = []
+        for wire, wire_starts in starts.items():
+            wires += self._split_wire(wire, wire_starts)
+        return wires
+
+    def _split_wire(self, wire: Wire, starts):
+        """Breaks a wire which has lost a tile into its separate parts.
+
+        The parts are flooded at the same time, a tile at a time each, and
+        the flood stops as soon as only one part is still growing. That part
+        keeps the old Wire object, and only the others are given new ones. So
+        trimming the end off a long wire costs as much as the end, not as
+        much as the wire.
 
         Parameters
         ----------
 
-        coords : (x, y)
-          Coordinates of where the wire group was broken.
-        broken_wire : Wire
-          The wire object which was broken.
+        wire : Wire
+          The wire which lost a tile.
+        starts : list
+          The coords of the tiles of the wire which touched the lost tile.
+
+        Returns : list
+          The wires which now make up the parts.
         """
+        # Each part starts out as a separate flood. When two floods meet,
+        # they are the same part and are merged.
+        owners = {}  # coords -> flood
+        firsts = []  # Where each flood started
+        parents = []
+        frontiers = []
+        sizes = []
+        for coords in starts:
+            if coords not in owners:
+                owners[coords] = len(parents)
+                firsts.append(coords)
+                parents.append(len(parents))
+                frontiers.append([coords])
+                sizes.append(1)
+        if len(parents) < 2:
+            # Nothing to split
+            return [wire]
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        growing = list(range(len(parents)))
+        while len(growing) > 1:
+            for part in growing:
+                frontier = frontiers[part]
+                if parents[part] != part or not frontier:
+                    continue
+                for nc, n in self.neighbours_into(frontier.pop()):
+                    if n is not wire:
+                        continue
+                    other = owners.get(nc)
+                    if other is None:
+                        owners[nc] = part
+                        frontier.append(nc)
+                        sizes[part] += 1
+                        continue
+                    other = find(other)
+                    if other != part:
+                        # The floods met, so they're the same part
+                        parents[other] = part
+                        frontier.extend(frontiers[other])
+                        sizes[part] += sizes[other]
+                        frontiers[other] = None
+            growing = [part for part in growing
+                       if parents[part] == part and frontiers[part]]
+
+        parts = [part for part in range(len(parents)) if parents[part] == part]
+        if growing:
+            keep = growing[0]
+        else:
+            keep = max(parts, key=lambda part: sizes[part])
 
-        current_obj = self.get(coords)
-        assert(not isinstance(current_obj, Wire))
-
-        # Note: This can work even if there are no wires... Just marks all the
-        #       neighbours as dirty.
-        new_wires = set()
-        dirty_simnodes = {}  # coord -> obj
-        for nd in util.neighbour_deltas():
-            nc = util.add(coords, nd)
-            # Use coords to avoid mutating what we are iterating over
-            _, nc, n = self.into(nc, nd)
-            if n is broken_wire:
+        wires = [wire]
+        for part in parts:
+            if part != keep:
                 new_wire = Wire()
-                dirty_simnodes.update(
-                        self._recursive_wire_replace(nc, new_wire))
-                # Update this later - Can't do here because we need to wait for
-                # dirty simnodes to refresh
-                new_wires.add(new_wire)
-            elif n is not None:
-                dirty_simnodes[nc] = n
-
-        # Update IO for all dirty_simnodes
-        for coord, n in dirty_simnodes.items():
-            n.recalculate_io(coord, self)
-        # Make sure the new wires immediately show the correct value
-        for wire in new_wires:
-            wire.calculate_next_output()
-            wire.tick()
-
-    def _grid_local_io_refresh(self, coords):
-        """Update IO for myself and my neighbours"""
-        area_coords = util.neighbour_coords(coords) + [coords]
-        for c in area_coords:
-            n = self.get(c)
-            if n is not None:
-                n.recalculate_io(c, self)
+                self._replace_wire(firsts[part], wire, new_wire)
+                wires.append(new_wire)
+        return wires
+
+    def _local_mask_update(self, coords, occupied):
+        """Tells the neighbours of a tile whether it's occupied now."""
+        for i, nc in enumerate(util.neighbour_coords(coords)):
+            nx, ny = nc
+            if nx < 0 or ny < 0:
+                continue
+            try:
+                mask = self.masks[ny][nx]
+            except IndexError:
+                continue
+            # The neighbour sees us from the opposite direction
+            bit = 1 << ((i + 2) % 4)
+            if occupied:
+                self.masks[ny][nx] = mask | bit
+            else:
+                self.masks[ny][nx] = mask & ~bit
+
+    def _grid_global_mask_refresh(self):
+        """Starts the neighbour masks again. Each row's masks are worked out
+        the first time they're looked at, so only the rows in view ever
+        are."""
+        self.masks = util.LazyRows(len(self.grid), self._row_masks)
+
+    def _row_masks(self, y):
+        """Works out the neighbour mask of every tile in a row."""
+        grid = self.grid
+        row = grid[y]
+        above = grid[y - 1] if y > 0 else []
+        below = grid[y + 1] if y + 1 < len(grid) else []
+        masks = []
+        for x in range(len(row)):
+            mask = 0
+            if x < len(above) and above[x] is not None:
+                mask |= 1
+            if x + 1 < len(row) and row[x + 1] is not None:
+                mask |= 2
+            if x < len(below) and below[x] is not None:
+                mask |= 4
+            if x > 0 and row[x - 1] is not None:
+                mask |= 8
+            masks.append(mask)
+        return masks
+
+    def _local_bridge_update(self, coords, bridge):
+        """Updates the runs of bridges through a tile, after a bridge has been
+        placed on it (or taken off it)."""
+        bridges = self.bridges
+        x, y = coords
+        if bridge:
+            bridges[coords] = [x, x, y, y]
+        else:
+            del bridges[coords]
+
+        # Across, then down
+        for axis, before, after in ((0, (x - 1, y), (x + 1, y)),
+                                    (2, (x, y - 1), (x, y + 1))):
+            pos = coords[axis // 2]
+            start = bridges[before][axis] if before in bridges else pos
+            end = bridges[after][axis + 1] if after in bridges else pos
+            if bridge:
+                # Join the runs on either side into one
+                runs = [(start, end)]
+            else:
+                # Split the run in two
+                runs = [(start, pos - 1), (pos + 1, end)]
+            for start, end in runs:
+                for i in range(start, end + 1):
+                    tile = (i, y) if axis == 0 else (x, i)
+                    bridges[tile][axis] = start
+                    bridges[tile][axis + 1] = end
+
+    def _grid_global_bridge_refresh(self):
+        """Finds every run of bridges on the board."""
+        grid = self.grid
+        self.bridges = bridges = {}
+        for y, row in enumerate(grid):
+            for x, node in enumerate(row):
+                if isinstance(node, WireBridge):
+                    # Extend the runs from the left and from above, if there
+                    # are any
+                    left = bridges.get((x - 1, y))
+                    top = bridges.get((x, y - 1))
+                    bridges[(x, y)] = [left[0] if left else x, x,
+                                       top[2] if top else y, y]
+
+        # Now fill in where each run ends, working backwards
+        for (x, y), span in sorted(bridges.items(), reverse=True,
+                                   key=lambda item: (item[0][1], item[0][0])):
+            right = bridges.get((x + 1, y))
+            if right:
+                span[1] = right[1]
+            bottom = bridges.get((x, y + 1))
+            if bottom:
+                span[3] = bottom[3]
 
     def _grid_global_wire_join(self):
         """Globally reevaluates the grid and performs low-level wire joins.
@@ -323,101 +769,125 @@ class Board:
         Performs connected-component labeling to find groups of wires
 
         https://en.wikipedia.org/wiki/Connected-component_labeling#Two-pass
-        """
-
-        # Map of tiles to labels
-        tile_lookup = {}
-        # Map of labels to tiles
-        label_lookup = {}
-        # Set of (label, label) connections for later merging
-        connections = set()
 
-        for y in range(len(self.grid)):
-            for x in range(len(self.grid[y])):
-                me = (x, y)
-                tile = self.grid[y][x]
-
-                if not isinstance(tile, Wire):
-                    continue
-
-                # Typically we only look directly above/left of the current
-                # tile, but wire bridges throw a spanner in the works, so we
-                # will need to traverse them
-                dx = x - 1
-                dy = y - 1
-                while isinstance(self.get((dx, y)), WireBridge):
-                    dx -= 1
-                while isinstance(self.get((x, dy)), WireBridge):
-                    dy -= 1
-                left = tile_lookup.get((dx, y))
-                top = tile_lookup.get((x, dy))
-
-                neighbouring_labels = [x for x in [left, top] if x is not None]
-                try:
-                    my_label = min(neighbouring_labels)
-                    if len(set(neighbouring_labels)) == 2:
-                        connections.add(
-                                (my_label, max(neighbouring_labels)))
-                except ValueError:
-                    # Looks like there are no neighbouring labels, so this is a
-                    # new group.
-                    my_label = len(label_lookup)
-
-                # Add myself into the tile_lookup
-                tile_lookup[me] = my_label
-                # Add myself into the label_lookup
-                label_lookup[my_label] = label_lookup.get(my_label, []) + [me]
-
-        logger.debug('-- PRE-MERGES --')
-        logger.debug(f'The grid before merges: {tile_lookup}')
-        logger.debug(f'Connection list: {connections}')
-
-        def find(data, i):
-            if i != data[i]:
-                data[i] = find(data, data[i])
-            return data[i]
-
-        def union(data, i, j):
-            pi, pj = find(data, i), find(data, j)
-            if pi != pj:
-                data[pi] = pj
-
-        data = list(range(len(label_lookup)))
-        # Perform all the unions in the connection list
-        for (i, j) in connections:
-            union(data, i, j)
-
-        for i in range(len(label_lookup)):
-            # Beware that this `find` mutates `data`!
-            # Must `find` each element once first if you want to operate on the
-            # list directly.
-            group = find(data, i)
-
-            if i != group:
-                label_lookup[group] = label_lookup[group] + label_lookup[i]
-                for t in label_lookup[i]:
-                    tile_lookup[t] = group
-                del label_lookup[i]
+        Labels are kept in a flat array indexed by `util.linear_index`, so
+        that a big board doesn't cost a tuple (and a dict entry) per tile.
+        """
+        grid = self.grid
+        self.tick_lists = None
+        self._grid_global_bridge_refresh()
+        bridges = self.bridges
+        width = max((len(row) for row in grid), default=0)
+        up, _, _, left = util.linear_neighbour_offsets(width)
+
+        # Map of tiles to labels, -1 for tiles which aren't wires
+        tile_labels = [-1] * (width * len(grid))
+        # Union-find forest of labels. Each label starts out as its own group.
+        parents = []
+
+        def find(i):
+            while parents[i] != i:
+                # Path halving keeps the trees shallow
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for y, row in enumerate(grid):
+            index = y * width
+            for x, tile in enumerate(row):
+                if isinstance(tile, Wire):
+                    # Typically we only look directly above/left of the
+                    # current tile, but wire bridges throw a spanner in the
+                    # works, so we will need to traverse them
+                    dx = x - 1
+                    if dx >= 0 and isinstance(row[dx], WireBridge):
+                        dx = bridges[(dx, y)][0] - 1
+                    dy = y - 1
+                    if (dy >= 0 and x < len(grid[dy]) and
+                            isinstance(grid[dy][x], WireBridge)):
+                        dy = bridges[(x, dy)][2] - 1
+
+                    left_label = -1
+                    if dx >= 0:
+                        left_label = tile_labels[index + left * (x - dx)]
+                    top_label = -1
+                    if dy >= 0:
+                        top_label = tile_labels[index + up * (y - dy)]
+
+                    if left_label >= 0:
+                        my_label = left_label
+                        if top_label >= 0:
+                            # Both neighbours are wire - Merge their groups
+                            a, b = find(left_label), find(top_label)
+                            if a != b:
+                                parents[b] = a
+                    elif top_label >= 0:
+                        my_label = top_label
+                    else:
+                        # Looks like there are no neighbouring labels, so this
+                        # is a new group.
+                        my_label = len(parents)
+                        parents.append(my_label)
+
+                    tile_labels[index] = my_label
+                index += 1
+
+        logger.debug(f'Found {len(parents)} wire labels')
 
         # Component labelling complete!
         # Now we can do what we came here for - Let's replace all the wires so
         # that each group is made up of the same Wire object.
-        for label, coords in label_lookup.items():
-            logger.debug(f'Wire group: {label} is made from coords: {coords}')
-            wire = Wire()
-            for (x, y) in coords:
-                # Low-level wire replace.
-                self.grid[y][x] = wire
+        wires = {}  # group label -> Wire
+        for y, row in enumerate(grid):
+            index = y * width
+            for x in range(len(row)):
+                label = tile_labels[index + x]
+                if label >= 0:
+                    group = find(label)
+                    wire = wires.get(group)
+                    if wire is None:
+                        wire = wires[group] = Wire()
+                    # Low-level wire replace.
+                    row[x] = wire
+        logger.debug(f'Joined wires into {len(wires)} groups')
 
     def _grid_global_io_refresh(self):
-        wires, nodes = self._get_caches()
-        for wire in wires:
-            wire.inputs = set()
-        for (x, y, node) in nodes:
-            node.recalculate_io((x, y), self)
+        """Works out every connection on the board from scratch."""
+        grid = self.grid
+        for row in grid:
+            for node in row:
+                if node is not None:
+                    node.clear_links()
+
+        # Every pair of touching tiles is linked once, from the left or top.
+        # Most tiles don't touch a bridge, so only go through `into` for the
+        # ones that do.
+        link = self._link
+        into = self.into
+        right = util.NEIGHBOUR_DELTAS[1]
+        down = util.NEIGHBOUR_DELTAS[2]
+        for y, row in enumerate(grid):
+            below = grid[y + 1] if y + 1 < len(grid) else ()
+            for x, node in enumerate(row):
+                if node is None or isinstance(node, WireBridge):
+                    continue
+                wire = isinstance(node, Wire)
+
+                n = row[x + 1] if x + 1 < len(row) else None
+                if isinstance(n, WireBridge):
+                    n = into((x + 1, y), right)[2]
+                if n is not None and not (wire and isinstance(n, Wire)):
+                    link(node, 1, n, 1)
+
+                n = below[x] if x < len(below) else None
+                if isinstance(n, WireBridge):
+                    n = into((x, y + 1), down)[2]
+                if n is not None and not (wire and isinstance(n, Wire)):
+                    link(node, 2, n, 1)
 
         # Tick all the wires so they are all are up to date
         # Remember wires are direct proxies for the output of their inputs
+        wires, _ = self._get_caches()
         for wire in wires:
             wire.calculate_next_output()
             wire.tick()
@@ -0,0 +1,314 @@
+"""An append-only log of the edits made to a world, for recovering from a
+crash.
+
+Two files are kept. `PATH.snapshot` holds every board, as of some point,
+and `PATH` holds a line of JSON for each edit since then. Appending a line is
+all an edit costs. Every so often the log is folded into a new snapshot and
+started again, so it never grows very long.
+
+Edits are logged by what they do to the tiles, not by what they do to the
+SimNodes, so they can be replayed onto the boards' glyphs without building
+any SimNodes. A world is rebuilt by loading each board once, after every edit
+has been applied. Ticks aren't logged: a recovered world has the layout and
+switches it had, but its signals are as of the last snapshot (or edit).
+
+To rebuild a world and write out one of its boards:
+
+    PYTHONPATH=. python -m shortcircuit.editlog PATH -o board.ssboard
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+from shortcircuit.board import SET, Board
+from shortcircuit.world import World
+
+logger = logging.getLogger()
+
+NAND_GLYPHS = 'urdl'
+
+
+class EditLog:
+    """Logs every edit made to a world through its messages.
+
+    Opening a log writes a snapshot of the world straight away, and starts
+    an empty log after it.
+
+    Parameters
+    ----------
+
+    path : str
+      Where to keep the log. The snapshot goes next to it.
+    world : World
+      The world to log. `world.log` is set to this.
+    snapshot_every : int
+      How many edits to log before folding them into a new snapshot.
+    fsync : bool
+      Whether to wait for each edit to reach the disk, rather than just the
+      operating system. Survives losing power, but is much slower.
+    """
+
+    def __init__(self, path, world, snapshot_every=1000, fsync=False):
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.file = None
+        # Number of the last edit logged. Carried on from any earlier log
+        # here, so that lines left over from before a snapshot can be told
+        # apart from those after it.
+        self.seq = 0
+        if os.path.exists(self.snapshot_path):
+            self.seq = load(path)[1]
+        self.snapshot_seq = self.seq
+        self.world = world
+        world.log = self
+        self.snapshot()
+
+    def log_message(self, message):
+        """Logs a message which has just been processed, if it edited
+        anything."""
+        record = record_for(message)
+        if record is not None:
+            self.append(record)
+
+    def log_entry(self, index, entry):
+        """Logs the tiles changed by undoing or redoing a `journal.Entry`,
+        which has just been done."""
+        self.append(tiles_record(self.world.boards[index], index, entry))
+
+    def append(self, record):
+        """Logs an edit."""
+        self.seq += 1
+        self.file.write(json.dumps({'seq': self.seq, 'edit': record}) + '\n')
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        if self.seq - self.snapshot_seq >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        """Writes out the whole world, and starts the log again."""
+        world = self.world
+        snapshot = {
+            'seq': self.seq,
+            'ticks': world.ticks,
+            'boards': [board.serialize() for board in world.boards],
+            'links': [[index, list(coords), target_index,
+                       list(target_coords)]
+                      for (index, coords), (target_index, target_coords)
+                      in world.links.items()],
+            'periods': [[index, period]
+                        for index, period in world.periods.items()],
+        }
+        # Written to the side and moved over, so there is always a whole
+        # snapshot on disk
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+        # If we crash before this, the old log is still there, but all of it
+        # is in the snapshot and will be skipped
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, 'w')
+        self.snapshot_seq = self.seq
+
+    def close(self):
+        """Writes a last snapshot and closes the log."""
+        if self.file is not None:
+            self.snapshot()
+            self.file.close()
+            self.file = None
+            self.world.log = None
+
+
+def record_for(message):
+    """The record to log for a message, or None if it doesn't edit
+    anything."""
+    for key in ('tile_set', 'nand_rotate', 'switch_toggle', 'portal_link',
+                'clock_domain'):
+        if message.get(key):
+            return {key: message[key]}
+    return None
+
+
+def tiles_record(board, index, entry):
+    """A record of the tiles changed by undoing or redoing a
+    `journal.Entry`, as they are now."""
+    coords = set()
+    for change in entry.changes:
+        if change[0] == SET:
+            _, c, old, new = change
+            # Wires which were only joined or split look the same as before
+            if not (old is not None and new is not None and
+                    old.serialize() == new.serialize()):
+                coords.add(tuple(c))
+    rotate = entry.message.get('nand_rotate')
+    if rotate:
+        coords.add(tuple(rotate['coord']))
+    glyphs = []
+    for c in sorted(coords):
+        node = board.get(c)
+        glyphs.append([c[0], c[1], '.' if node is None else node.serialize()])
+    return {'tiles': {'index': index, 'glyphs': glyphs}}
+
+
+def _glyph(glyph):
+    # Exactly what would be on the board after placing it
+    node = Board.deserialize_simnode(glyph)
+    return '.' if node is None else node.serialize()
+
+
+def apply_record(grids, links, periods, record):
+    """Applies a logged edit to the boards' glyphs.
+
+    Parameters
+    ----------
+
+    grids : list
+      Each board, as a list of rows of glyphs.
+    links : dict
+      The world's portal links. See `World.links`.
+    periods : dict
+      The boards' clock periods. See `World.periods`.
+    record : dict
+      The edit.
+    """
+    tile_set = record.get('tile_set')
+    nand_rotate = record.get('nand_rotate')
+    switch_toggle = record.get('switch_toggle')
+    portal_link = record.get('portal_link')
+    tiles = record.get('tiles')
+    clock_domain = record.get('clock_domain')
+
+    if tile_set:
+        x, y = tile_set['coord']
+        grids[tile_set['index']][y][x] = _glyph(tile_set['node'])
+
+    elif nand_rotate:
+        x, y = nand_rotate['coord']
+        row = grids[nand_rotate['index']][y]
+        glyph = row[x]
+        facing = NAND_GLYPHS.index(glyph.lower())
+        new = NAND_GLYPHS[(facing + nand_rotate['delta']) % 4]
+        row[x] = new.upper() if glyph.isupper() else new
+
+    elif switch_toggle:
+        x, y = switch_toggle['coord']
+        row = grids[switch_toggle['index']][y]
+        value = switch_toggle['value']
+        if value is None:
+            value = row[x] == 'x'
+        row[x] = 'o' if value else 'x'
+
+    elif portal_link:
+        index = portal_link['index']
+        x, y = portal_link['coord']
+        target_index = portal_link.get('target_index')
+        if target_index is None:
+            links.pop((index, (x, y)), None)
+        else:
+            row = grids[index][y]
+            if row[x] not in 'pP':
+                row[x] = 'p'
+            links[(index, (x, y))] = (target_index,
+                                      tuple(portal_link['target_coord']))
+
+    elif tiles:
+        grid = grids[tiles['index']]
+        for x, y, glyph in tiles['glyphs']:
+            grid[y][x] = glyph
+
+    elif clock_domain:
+        if clock_domain['period'] == 1:
+            periods.pop(clock_domain['index'], None)
+        else:
+            periods[clock_domain['index']] = clock_domain['period']
+
+
+def load(path):
+    """Reads a snapshot and the edits logged after it.
+
+    A line which was only partly written when we crashed is ignored.
+
+    Returns : tuple
+      (snapshot, seq, records), where `seq` is the number of the last edit.
+    """
+    with open(path + '.snapshot') as f:
+        snapshot = json.load(f)
+    seq = snapshot['seq']
+    records = []
+    try:
+        f = open(path)
+    except FileNotFoundError:
+        return snapshot, seq, records
+    with f:
+        for line in f:
+            try:
+                line = json.loads(line)
+            except ValueError:
+                logger.warning(f'Ignoring a broken line at the end of {path}')
+                break
+            if line['seq'] <= seq:
+                # Already in the snapshot
+                continue
+            seq = line['seq']
+            records.append(line['edit'])
+    return snapshot, seq, records
+
+
+def recover(path):
+    """Rebuilds a world from a log.
+
+    Every edit is applied to the glyphs first, then each board is loaded
+    once.
+
+    Returns : World
+    """
+    snapshot, seq, records = load(path)
+    grids = [[list(row) for row in board.split('\n')]
+             for board in snapshot['boards']]
+    links = {(index, tuple(coords)): (target_index, tuple(target_coords))
+             for index, coords, target_index, target_coords
+             in snapshot['links']}
+    # Older snapshots don't have any periods
+    periods = dict(snapshot.get('periods', []))
+    for record in records:
+        apply_record(grids, links, periods, record)
+
+    boards = [Board.deserialize('\n'.join(''.join(row) for row in grid))
+              for grid in grids]
+    world = World(boards)
+    world.ticks = snapshot['ticks']
+    world.links = links
+    world.periods = periods
+    world._sync_portals()
+    return world
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuilds a world from an '
+                                                 'edit log')
+    parser.add_argument('log', help='The log, as given to --log')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='Write a board to a file')
+    parser.add_argument('--index', type=int, default=0,
+                        help='Which board to write out')
+    args = parser.parse_args()
+
+    world = recover(args.log)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(world.boards[args.index].serialize())
+    print(f'{len(world.boards)} boards, {len(world.links)} links',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,662 @@
+import time
+from array import array
+
+import shortcircuit.native as native
+from shortcircuit.analysis import is_loop, strongly_connected
+from shortcircuit.hashlife import Universe
+from shortcircuit.memo import MemoNetlist
+from shortcircuit.netlist import Netlist
+from shortcircuit.simnode import Switch
+
+
+class Engine:
+    """Simulates a board.
+
+    There are different ways of simulating a board, with different trade
+    offs. Every engine takes a board, and from then on can be told to set
+    switches, run ticks and read signals. All engines must give exactly the
+    same results as `Board.tick()`.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to simulate. Engines may not update the SimNodes on the board
+      until `sync` is called.
+    """
+    name = None
+    # How many lanes (independent copies of the board) can be simulated at
+    # once. None for no limit.
+    max_lanes = 1
+
+    def __init__(self, board):
+        board.resolve()
+        self.board = board
+
+    def step(self, ticks=1):
+        """Runs the simulation for some ticks."""
+        raise NotImplementedError
+
+    def set_switch(self, coords, value):
+        """Sets the switch at some coords on or off."""
+        raise NotImplementedError
+
+    def output(self, coords):
+        """Reads the signal of the node at some coords."""
+        raise NotImplementedError
+
+    def sync(self):
+        """Writes the engine's state back onto the board's SimNodes."""
+        pass
+
+    def refresh(self):
+        """Reads the signals of the switches and portals back from the
+        board's SimNodes, for when they've been changed there rather than
+        with `set_switch`."""
+        raise NotImplementedError
+
+    def stats(self):
+        """What the engine is up to, for display or monitoring."""
+        return {'engine': self.name}
+
+    def reset(self):
+        """Puts every signal back to how it was when the engine was created,
+        so one engine can run many experiments on the same board."""
+        raise NotImplementedError
+
+
+class ObjectEngine(Engine):
+    """Ticks the SimNodes on the board directly, with `Board.tick()`."""
+    name = 'object'
+
+    def __init__(self, board):
+        super().__init__(board)
+        self.initial = [(node, node.output()) for node in self._nodes()]
+
+    def _nodes(self):
+        nodes = set()
+        for row in self.board.grid:
+            nodes.update(node for node in row if hasattr(node, 'signal'))
+        return nodes
+
+    def step(self, ticks=1):
+        for i in range(ticks):
+            self.board.tick()
+
+    def set_switch(self, coords, value):
+        switch = self.board.get(coords)
+        if not isinstance(switch, Switch):
+            raise KeyError(f'No switch at {coords}')
+        switch.toggle(bool(value))
+
+    def output(self, coords):
+        return bool(self.board.get(coords).output())
+
+    def reset(self):
+        for node, signal in self.initial:
+            node.signal = signal
+            if hasattr(node, 'new_signal'):
+                node.new_signal = signal
+
+    def refresh(self):
+        # The SimNodes are the engine's state
+        pass
+
+
+class CompiledEngine(Engine):
+    """Compiles the board to a `Netlist`, and simulates that.
+
+    Each signal is a bit vector, so that many independent copies of the board
+    (lanes) can be simulated at once. Every lane starts out in the state the
+    board is in. With one lane, it's just a faster `Board.tick()`.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to simulate.
+    lanes : int
+      How many copies of the board to simulate at once.
+    """
+    name = 'compiled'
+    max_lanes = None
+
+    def __init__(self, board, lanes=1):
+        super().__init__(board)
+        self.netlist = Netlist(board)
+        self.lanes = lanes
+        self.mask = (1 << lanes) - 1
+        self.initial = [self.mask if s else 0
+                        for s in self.netlist.signals()]
+        self.signals = list(self.initial)
+
+    def step(self, ticks=1):
+        self.netlist.step(self.signals, ticks, self.mask)
+
+    def set_switch(self, coords, value):
+        """Sets the switch at some coords.
+
+        Parameters
+        ----------
+
+        value : bool or int
+          With one lane, on or off. With many lanes, a bit vector with a bit
+          set for each lane the switch should be on in.
+        """
+        if not isinstance(self.board.get(coords), Switch):
+            raise KeyError(f'No switch at {coords}')
+        if self.lanes == 1:
+            value = bool(value)
+        self.signals[self.netlist.index_of(coords)] = int(value) & self.mask
+
+    def output(self, coords):
+        """Reads the node at some coords. With one lane, this is a bool.
+        With many lanes, it's a bit vector with a bit per lane."""
+        i = self.netlist.index.get(self.board.get(coords))
+        # Bridges (and empty tiles) never hold a signal
+        signal = 0 if i is None else self.signals[i]
+        if self.lanes == 1:
+            return bool(signal)
+        return signal
+
+    def reset(self):
+        self.signals[:] = self.initial
+
+    def refresh(self):
+        """Sets every lane of each switch and portal from the board."""
+        netlist = self.netlist
+        signals = self.signals
+        mask = self.mask
+        for i in range(netlist.nand_count + netlist.wire_count,
+                       len(netlist)):
+            signals[i] = mask if netlist.nodes[i].output() else 0
+
+    def sync(self):
+        """Writes the first lane back onto the board."""
+        for node, signal in zip(self.netlist.nodes, self.signals):
+            signal = bool(signal & 1)
+            node.signal = signal
+            if hasattr(node, 'new_signal'):
+                node.new_signal = signal
+
+
+class EventEngine(Engine):
+    """Compiles the board to a `Netlist`, and on each tick only works out the
+    nodes which read something that changed on the last one. Each node keeps
+    count of how many of its inputs are on, so a change costs as much as the
+    number of nodes reading it, however wide they are.
+
+    Much faster than `CompiledEngine` on boards which are quiet most of the
+    time (eg, waiting on a switch), and slower on busy ones.
+
+    `changes` counts every time a signal has changed, which is how busy the
+    board is (see `AutoEngine`).
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to simulate.
+    """
+    name = 'event'
+
+    def __init__(self, board):
+        super().__init__(board)
+        self.netlist = netlist = Netlist(board)
+        # The nodes which read each node, once per connection
+        self.readers = [[] for i in range(len(netlist))]
+        for i, sources in enumerate(netlist.sources):
+            for j in sources:
+                self.readers[j].append(i)
+        self.sizes = [len(sources) for sources in netlist.sources]
+        self.initial = netlist.signals()
+        self.changes = 0
+        self.reset()
+
+    def reset(self):
+        netlist = self.netlist
+        self.signals = signals = list(self.initial)
+        # How many inputs of each node are on
+        self.on = [sum(signals[j] for j in sources)
+                   for sources in netlist.sources]
+        # Nodes to work out on the next tick. To begin with nothing is known
+        # to agree with its inputs, so that's everything.
+        self.nands = set(range(netlist.nand_count))
+        self.wires = set(range(netlist.nand_count,
+                               netlist.nand_count + netlist.wire_count))
+        # Nodes which have changed since the last `sync`
+        self.unsynced = set(range(len(netlist)))
+
+    def _flip(self, i):
+        """Changes the signal of node `i`, and lets everything reading it
+        know."""
+        signal = self.signals[i] = not self.signals[i]
+        delta = 1 if signal else -1
+        on = self.on
+        nand_count = self.netlist.nand_count
+        for r in self.readers[i]:
+            on[r] += delta
+            if r < nand_count:
+                self.nands.add(r)
+            else:
+                self.wires.add(r)
+        self.unsynced.add(i)
+
+    def step(self, ticks=1):
+        signals = self.signals
+        on = self.on
+        sizes = self.sizes
+        flip = self._flip
+        for t in range(ticks):
+            # A NAND is off only when every input is on
+            nands = [i for i in self.nands if (on[i] < sizes[i]) != signals[i]]
+            self.nands = set()
+            for i in nands:
+                flip(i)
+            # A wire is on when any input is on
+            wires = [i for i in self.wires if (on[i] > 0) != signals[i]]
+            self.wires = set()
+            for i in wires:
+                flip(i)
+            self.changes += len(nands) + len(wires)
+
+    def _set(self, i, value):
+        if self.signals[i] != value:
+            self._flip(i)
+
+    def set_switch(self, coords, value):
+        if not isinstance(self.board.get(coords), Switch):
+            raise KeyError(f'No switch at {coords}')
+        self._set(self.netlist.index_of(coords), bool(value))
+
+    def output(self, coords):
+        i = self.netlist.index.get(self.board.get(coords))
+        # Bridges (and empty tiles) never hold a signal
+        if i is None:
+            return False
+        return self.signals[i]
+
+    def refresh(self):
+        netlist = self.netlist
+        for i in range(netlist.nand_count + netlist.wire_count,
+                       len(netlist)):
+            self._set(i, bool(netlist.nodes[i].output()))
+
+    def sync(self):
+        nodes = self.netlist.nodes
+        signals = self.signals
+        for i in self.unsynced:
+            node = nodes[i]
+            node.signal = signals[i]
+            if hasattr(node, 'new_signal'):
+                node.new_signal = signals[i]
+        self.unsynced = set()
+
+
+class MemoEngine(Engine):
+    """Compiles the board to a `MemoNetlist`, which remembers what each kind
+    of block of tiles does. Much faster than a NAND at a time on boards made
+    of lots of copies of the same cell, but slower on boards with no
+    repetition.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to simulate.
+    block : tuple
+      The width and height of a block, in tiles. Works best when it's the
+      size of the repeated cells.
+    cache_size : int
+      How many results each kind of block remembers.
+    """
+    name = 'memo'
+
+    def __init__(self, board, block=(8, 8), cache_size=4096):
+        super().__init__(board)
+        self.netlist = Netlist(board)
+        self.memo = MemoNetlist(self.netlist, block, cache_size)
+        self.initial = self.memo.state_of(self.netlist.signals())
+        self.state = list(self.initial)
+
+    def step(self, ticks=1):
+        self.memo.step(self.state, ticks)
+
+    def _where(self, coords):
+        i = self.netlist.index.get(self.board.get(coords))
+        if i is None:
+            return None
+        return self.memo.where[i]
+
+    def set_switch(self, coords, value):
+        if not isinstance(self.board.get(coords), Switch):
+            raise KeyError(f'No switch at {coords}')
+        b, bit = self._where(coords)
+        if value:
+            self.state[b] |= 1 << bit
+        else:
+            self.state[b] &= ~(1 << bit)
+
+    def output(self, coords):
+        where = self._where(coords)
+        # Bridges (and empty tiles) never hold a signal
+        if where is None:
+            return False
+        b, bit = where
+        return bool(self.state[b] >> bit & 1)
+
+    def reset(self):
+        self.state[:] = self.initial
+
+    def refresh(self):
+        netlist = self.netlist
+        consts = 0
+        for i in range(netlist.nand_count + netlist.wire_count,
+                       len(netlist)):
+            if netlist.nodes[i].output():
+                consts |= 1 << self.memo.where[i][1]
+        self.state[self.memo.const_block] = consts
+
+    def sync(self):
+        for node, signal in zip(self.netlist.nodes,
+                                self.memo.signals_of(self.state)):
+            node.signal = signal
+            if hasattr(node, 'new_signal'):
+                node.new_signal = signal
+
+
+class HashlifeEngine(Engine):
+    """Compiles the board to a `hashlife.Universe`, which remembers where
+    each state of each separate circuit leads. Experimental. Made for running
+    clocks and counters for billions of ticks: once a circuit has been
+    through its cycle, jumping ahead costs about one lookup per bit of the
+    number of ticks.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to simulate.
+    cache_size : int
+      The most jumps to remember.
+    """
+    name = 'hashlife'
+
+    def __init__(self, board, cache_size=1 << 20):
+        super().__init__(board)
+        self.netlist = Netlist(board)
+        self.universe = Universe(self.netlist, cache_size)
+        self.initial_signals = self.netlist.signals()
+        self.reset()
+
+    def step(self, ticks=1):
+        self.universe.step(self.state, ticks)
+
+    def set_switch(self, coords, value):
+        if not isinstance(self.board.get(coords), Switch):
+            raise KeyError(f'No switch at {coords}')
+        i = self.netlist.index_of(coords)
+        self.switches[i] = bool(value)
+        self.universe.set_switch(self.state, i, value)
+
+    def _signal(self, i):
+        signal = self.universe.signal(self.state, i)
+        if signal is None:
+            return self.switches[i]
+        return signal
+
+    def output(self, coords):
+        i = self.netlist.index.get(self.board.get(coords))
+        # Bridges (and empty tiles) never hold a signal
+        if i is None:
+            return False
+        return self._signal(i)
+
+    def reset(self):
+        signals = self.initial_signals
+        self.state = self.universe.state_of(signals)
+        self.switches = {i: signals[i] for i in self.universe.readers}
+
+    def refresh(self):
+        nodes = self.netlist.nodes
+        for i in self.switches:
+            signal = bool(nodes[i].output())
+            if signal != self.switches[i]:
+                self.switches[i] = signal
+                self.universe.set_switch(self.state, i, signal)
+
+    def sync(self):
+        for i, node in enumerate(self.netlist.nodes):
+            signal = self._signal(i)
+            node.signal = signal
+            if hasattr(node, 'new_signal'):
+                node.new_signal = signal
+
+
+class NativeEngine(CompiledEngine):
+    """The same as `CompiledEngine`, but stepped by the native kernel (see
+    `native.py`), for up to 64 lanes. Only available if the kernel has been
+    built."""
+    name = 'native'
+    max_lanes = native.MAX_LANES
+
+    def __init__(self, board, lanes=1):
+        if lanes > self.max_lanes:
+            raise ValueError(f"Can't simulate more than {self.max_lanes} "
+                             f"lanes")
+        super().__init__(board, lanes)
+        self.stepper = native.Stepper(native.kernel, self.netlist,
+                                      self.signals)
+        self.signals = self.stepper.signals
+        self.initial = array('Q', self.initial)
+
+    def step(self, ticks=1):
+        self.stepper.step(ticks, self.mask)
+
+
+class AutoEngine(Engine):
+    """Picks whichever engine runs a board fastest, by trying each of them on
+    it for a few ticks, and tries them again now and then, or as soon as the
+    board gets much busier or quieter.
+
+    Which engine is fastest depends on more than the size of the board: on
+    how many of its signals change each tick, and on how often the engine is
+    synced, which costs the compiled engines a pass over every node. So
+    rather than guess, each is timed doing exactly what it's asked to do,
+    `refresh` and `sync` included.
+
+    `profile` describes the board as it was last time the engines were
+    tried: how many `nodes` it has, how many feedback `loops`, and its
+    `activity`, the fraction of its signals which change each tick.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to simulate.
+    candidates : tuple
+      Names of the engines to try. Defaults to the event, object and fastest
+      compiled engines. The event engine is tried first if it's there, since
+      it's the one which measures activity.
+    warmup : int
+      How many ticks to try each engine for. Only the second half are timed,
+      so that engines aren't held back by filling their caches.
+    recheck : int
+      How many ticks to run the chosen engine for before trying them all
+      again.
+    """
+    name = 'auto'
+
+    def __init__(self, board, candidates=None, warmup=32, recheck=10000):
+        super().__init__(board)
+        if candidates is None:
+            candidates = ('event', 'object', fastest().name)
+        self.candidates = candidates
+        self.warmup = warmup
+        self.recheck = recheck
+        # Puts the SimNodes back for `reset`
+        self.initial = ObjectEngine(board)
+        self.profile = None
+        # Engine name -> seconds per tick, for each engine tried
+        self.timings = {}
+        self.sim = None
+        self._try_all()
+
+    def _use(self, name):
+        if self.sim is not None:
+            if self.sim.name == name:
+                self._start_timing()
+                return
+            # The next engine starts from the SimNodes
+            self.sim.sync()
+        self.sim = create(name, self.board)
+        self._start_timing()
+
+    def _start_timing(self):
+        self._ticks = 0
+        self._seconds = 0.0
+        self._changes = getattr(self.sim, 'changes', 0)
+
+    def _activity(self):
+        """Fraction of signals which have changed per tick since timing
+        started, if the engine counts them."""
+        if not self._ticks or not hasattr(self.sim, 'changes'):
+            return None
+        nodes = max(len(self.sim.netlist), 1)
+        return (self.sim.changes - self._changes) / self._ticks / nodes
+
+    def _try_all(self):
+        self.trying = sorted(self.candidates, key=lambda name: name != 'event')
+        self.timings = {}
+        self._try_next()
+
+    def _try_next(self):
+        self._use(self.trying.pop(0))
+        self.left = self.warmup
+
+    def _tried(self):
+        """Notes how the engine being tried did, and moves on to the next, or
+        picks the fastest if they've all been tried."""
+        sim = self.sim
+        self.timings[sim.name] = self._seconds / max(self._ticks, 1)
+        if sim.name == 'event':
+            netlist = sim.netlist
+            components = strongly_connected(len(netlist), netlist.sources)
+            self.profile = {
+                'nodes': len(netlist),
+                'loops': sum(1 for c in components
+                             if is_loop(c, netlist.sources)),
+                'activity': self._activity(),
+            }
+        if self.trying:
+            self._try_next()
+            return
+        self.trying = None
+        self._use(min(self.timings, key=self.timings.get))
+        self.left = self.recheck
+
+    def _busier_or_quieter(self):
+        """Whether activity has changed a lot since the engines were tried:
+        by more than double (or half), and by more than 1% of the nodes."""
+        if self.profile is None or self.profile['activity'] is None:
+            return False
+        before = self.profile['activity']
+        now = self._activity()
+        if now is None or abs(now - before) <= 0.01:
+            return False
+        return now > 2 * before or before > 2 * now
+
+    def step(self, ticks=1):
+        warmup = self.warmup
+        while ticks:
+            if self.trying is not None and self.left > warmup // 2:
+                # Settling in, not timed
+                n = min(ticks, self.left - warmup // 2)
+            else:
+                n = min(ticks, self.left, warmup)
+            start = time.perf_counter()
+            self.sim.step(n)
+            self._seconds += time.perf_counter() - start
+            self._ticks += n
+            self.left -= n
+            ticks -= n
+
+            if self.trying is not None:
+                if self.left == warmup // 2:
+                    self._start_timing()
+                elif not self.left:
+                    self._tried()
+            elif not self.left:
+                self._try_all()
+            elif self._ticks >= warmup and hasattr(self.sim, 'changes'):
+                if self._busier_or_quieter():
+                    self._try_all()
+                else:
+                    self._start_timing()
+
+    def set_switch(self, coords, value):
+        self.sim.set_switch(coords, value)
+
+    def output(self, coords):
+        return self.sim.output(coords)
+
+    def refresh(self):
+        start = time.perf_counter()
+        self.sim.refresh()
+        self._seconds += time.perf_counter() - start
+
+    def sync(self):
+        start = time.perf_counter()
+        self.sim.sync()
+        self._seconds += time.perf_counter() - start
+
+    def reset(self):
+        self.initial.reset()
+        # Picks the signals up from the SimNodes
+        self.sim = create(self.sim.name, self.board)
+        self._start_timing()
+
+    def stats(self):
+        return {
+            'engine': self.sim.name,
+            'trying': self.trying is not None,
+            'profile': self.profile,
+            'seconds_per_tick': dict(self.timings),
+        }
+
+
+# Name -> Engine class, fastest last
+ENGINES = {
+    'object': ObjectEngine,
+    'memo': MemoEngine,
+    'hashlife': HashlifeEngine,
+    'event': EventEngine,
+    'compiled': CompiledEngine,
+}
+if native.kernel is not None:
+    ENGINES['native'] = NativeEngine
+
+
+def fastest(lanes=1):
+    """The fastest engine which can simulate this many lanes at once."""
+    for cls in reversed(list(ENGINES.values())):
+        if cls.max_lanes is None or lanes <= cls.max_lanes:
+            return cls
+
+
+def engine_class(name, lanes=1):
+    """The class of engine `create` makes for a name. `fastest` is the
+    fastest one, and `auto` is `AutoEngine`, which picks by trying them."""
+    if name == 'fastest':
+        return fastest(lanes)
+    elif name == 'auto':
+        return AutoEngine
+    return ENGINES[name]
+
+
+def create(name, board, lanes=1):
+    """Creates an engine by name (see `engine_class`)."""
+    cls = engine_class(name, lanes)
+    if lanes > 1:
+        return cls(board, lanes=lanes)
+    return cls(board)
@@ -0,0 +1,201 @@
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+
+import shortcircuit.engine as engine
+from shortcircuit.board import Board
+
+Mismatch = collections.namedtuple('Mismatch',
+                                  ['vector', 'probe', 'expected', 'actual'])
+
+
+class TruthTable:
+    """Checks a board against a table of inputs and expected outputs.
+
+    Switches and probes are given names, and each vector (row of the table)
+    sets some switches, runs the board for some ticks, and then says what the
+    probes should read.
+
+    By default every vector starts from the board as it was loaded, so they
+    are all independent and can be simulated at once, a lane each. If the
+    table is `sequential`, vectors run one after the other on the same board,
+    like a waveform.
+
+    Parameters
+    ----------
+
+    board_str : str
+      The serialized board to test.
+    switches : dict
+      name -> coords of a switch
+    probes : dict
+      name -> coords of a node to read
+    vectors : list
+      Each vector is either a dict with `inputs` (switch name -> value),
+      `expect` (probe name -> value) and optionally `ticks`, or a list of
+      values: one per switch, then one per probe, in order. Expecting `None`
+      means "don't care". Switches left out of a vector keep their value.
+    ticks : int
+      How many ticks to run each vector for, if it doesn't say.
+    sequential : bool
+      Whether each vector carries on from the end of the last.
+    """
+
+    def __init__(self, board_str, switches, probes, vectors, ticks=1,
+                 sequential=False):
+        self.board_str = board_str
+        self.switches = {k: tuple(v) for k, v in switches.items()}
+        self.probes = {k: tuple(v) for k, v in probes.items()}
+        self.ticks = ticks
+        self.sequential = sequential
+        self.vectors = [self._normalise(v) for v in vectors]
+
+    @classmethod
+    def from_dict(cls, spec, base_dir='.'):
+        """Builds a table from a dict (eg, parsed JSON). The `board` key is
+        the path of a `.ssboard`, relative to `base_dir`."""
+        with open(os.path.join(base_dir, spec['board'])) as f:
+            board_str = f.read()
+        return cls(board_str, spec['switches'], spec['probes'],
+                   spec['vectors'], spec.get('ticks', 1),
+                   spec.get('sequential', False))
+
+    @classmethod
+    def load(cls, path):
+        """Loads a table from a JSON file."""
+        with open(path) as f:
+            spec = json.load(f)
+        return cls.from_dict(spec, os.path.dirname(path))
+
+    def _normalise(self, vector):
+        """Turns a vector into `(inputs, expect, ticks)`."""
+        if isinstance(vector, dict):
+            return (vector.get('inputs', {}), vector.get('expect', {}),
+                    vector.get('ticks', self.ticks))
+
+        n = len(self.switches)
+        if len(vector) != n + len(self.probes):
+            raise ValueError(f'Vector {vector} should have {n} inputs and '
+                             f'{len(self.probes)} outputs')
+        return (dict(zip(self.switches, vector[:n])),
+                dict(zip(self.probes, vector[n:])),
+                self.ticks)
+
+    def run(self, engine_name='fastest'):
+        """Runs every vector through an engine.
+
+        Returns : list
+          A `Mismatch` for every probe which didn't read what was expected.
+        """
+        if self.sequential:
+            return self._run_sequential(engine_name)
+
+        if engine_name == 'fastest' or \
+                engine.engine_class(engine_name).max_lanes != 1:
+            return self._run_lanes(engine_name)
+
+        # This engine can only do one lane at a time
+        mismatches = []
+        for i, vector in enumerate(self.vectors):
+            sim = engine.create(engine_name, Board.deserialize(self.board_str))
+            mismatches += self._apply(sim, i, vector)
+        return mismatches
+
+    def _run_sequential(self, engine_name):
+        sim = engine.create(engine_name, Board.deserialize(self.board_str))
+        mismatches = []
+        for i, vector in enumerate(self.vectors):
+            mismatches += self._apply(sim, i, vector)
+        return mismatches
+
+    def _apply(self, sim, i, vector):
+        inputs, expect, ticks = vector
+        for name, value in inputs.items():
+            sim.set_switch(self.switches[name], value)
+        sim.step(ticks)
+        return self._check(i, expect, lambda coords: sim.output(coords))
+
+    def _run_lanes(self, engine_name):
+        """Runs every vector at once, a lane each. Vectors which run for
+        different numbers of ticks need their own batches, as do vectors
+        past the most lanes the engine can simulate at once."""
+        if engine_name == 'fastest':
+            max_lanes = None
+        else:
+            max_lanes = engine.engine_class(engine_name).max_lanes
+        by_ticks = collections.defaultdict(list)
+        for i, vector in enumerate(self.vectors):
+            by_ticks[vector[2]].append(i)
+        batches = []
+        for ticks, batch in by_ticks.items():
+            size = max_lanes or len(batch)
+            batches += [(ticks, batch[i:i + size])
+                        for i in range(0, len(batch), size)]
+
+        mismatches = []
+        for ticks, batch in batches:
+            board = Board.deserialize(self.board_str)
+            sim = engine.create(engine_name, board, lanes=len(batch))
+
+            for name, coords in self.switches.items():
+                # Lanes which don't mention the switch leave it alone
+                bits = 0
+                for lane, i in enumerate(batch):
+                    value = self.vectors[i][0].get(name)
+                    if value is None:
+                        value = board.get(coords).output()
+                    if value:
+                        bits |= 1 << lane
+                sim.set_switch(coords, bits)
+
+            sim.step(ticks)
+
+            outputs = {coords: sim.output(coords)
+                       for coords in self.probes.values()}
+            for lane, i in enumerate(batch):
+                mismatches += self._check(
+                        i, self.vectors[i][1],
+                        lambda coords: bool(outputs[coords] >> lane & 1))
+
+        mismatches.sort()
+        return mismatches
+
+    def _check(self, i, expect, read):
+        mismatches = []
+        for name, expected in expect.items():
+            if expected is None:
+                continue
+            actual = read(self.probes[name])
+            if bool(actual) != bool(expected):
+                mismatches.append(Mismatch(i, name, bool(expected),
+                                           bool(actual)))
+        return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks a board against a '
+                                                 'truth table')
+    parser.add_argument('table', help='JSON truth table')
+    parser.add_argument('--engine', default='fastest',
+                        choices=['fastest', 'auto'] + list(engine.ENGINES),
+                        help='Simulation engine to use')
+    args = parser.parse_args()
+
+    table = TruthTable.load(args.table)
+    start = time.perf_counter()
+    mismatches = table.run(args.engine)
+    elapsed = time.perf_counter() - start
+
+    for m in mismatches:
+        print(f'vector {m.vector}: {m.probe} expected {int(m.expected)}, '
+              f'got {int(m.actual)}')
+    print(f'{len(table.vectors)} vectors, {len(mismatches)} mismatches '
+          f'in {elapsed:.3f}s')
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
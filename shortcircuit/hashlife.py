@@ -0,0 +1,234 @@
+"""Jumps far ahead in time by remembering where states lead, in the spirit of
+Hashlife.
+
+Hashlife cuts a cellular automaton into a quadtree, and remembers where each
+square of it will be 2^k generations later. That relies on a cell only being
+affected by cells close by, and here that isn't true: a wire carries a signal
+from one end of the board to the other within a tick. So instead of squares,
+the board is cut into the separate circuits which make it up (the connected
+parts of its netlist), which really don't affect each other at all.
+
+Circuits which are wired up the same way (eg, two copies of a clock) are
+canonicalized into one `Circuit`, and share what they remember. For each
+state a circuit is seen in, it remembers the state 2^k ticks later, for each
+k, and works those out from two jumps of 2^(k - 1). A clock or a counter
+with a period of P ticks only ever has P states, so after its first cycle it
+jumps a billion ticks in about 30 lookups.
+"""
+import collections
+
+from shortcircuit.netlist import CONST, NAND
+
+
+class Circuit:
+    """Everything which is the same about circuits which are wired up the
+    same way.
+
+    A circuit's state is an int, with a bit per node, followed by a bit for
+    each switch it reads. Each node has a mask of the bits it reads.
+
+    Parameters
+    ----------
+
+    nodes : tuple
+      (kind, mask) for each node, NANDs first.
+    cache : Cache
+      Where to remember jumps.
+    """
+
+    def __init__(self, nodes, cache):
+        self.nands = [(1 << i, mask) for i, (kind, mask) in enumerate(nodes)
+                      if kind == NAND]
+        self.wires = [(1 << i, mask) for i, (kind, mask) in enumerate(nodes)
+                      if kind != NAND]
+        # The bits of the state which aren't switches
+        self.node_mask = (1 << len(nodes)) - 1
+        self.cache = cache
+
+    def tick(self, state):
+        """The state one tick later. Works exactly like `Netlist.step()`."""
+        nands = 0
+        for bit, mask in self.nands:
+            if state & mask != mask:
+                nands |= bit
+        # The switches don't change
+        new = (state & ~self.node_mask) | nands
+        for bit, mask in self.wires:
+            if new & mask:
+                new |= bit
+        return new
+
+    def jump(self, state, k):
+        """The state 2^k ticks later."""
+        if k == 0:
+            return self.tick(state)
+        key = (self, state, k)
+        cache = self.cache
+        later = cache.get(key)
+        if later is None:
+            later = self.jump(self.jump(state, k - 1), k - 1)
+            cache.put(key, later)
+        return later
+
+    def advance(self, state, ticks):
+        """The state `ticks` ticks later."""
+        k = 0
+        while ticks:
+            if ticks & 1:
+                state = self.jump(state, k)
+            ticks >>= 1
+            k += 1
+        return state
+
+
+class Cache:
+    """Remembers a bounded number of jumps, forgetting the least recently
+    used first.
+
+    Parameters
+    ----------
+
+    size : int
+      The most jumps to remember.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        later = self.entries.get(key)
+        if later is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return later
+
+    def put(self, key, later):
+        entries = self.entries
+        entries[key] = later
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class Universe:
+    """A `Netlist`, cut into its separate circuits.
+
+    `state` has an int per circuit (see `Circuit`).
+
+    Parameters
+    ----------
+
+    netlist : Netlist
+      The netlist to simulate.
+    cache_size : int
+      The most jumps to remember, across every circuit.
+    """
+
+    def __init__(self, netlist, cache_size=1 << 20):
+        self.netlist = netlist
+        self.cache = Cache(cache_size)
+        count = len(netlist)
+        kinds = netlist.kinds
+
+        # Find the circuits. Switches don't join circuits together, since
+        # their signals never change while running.
+        parents = list(range(count))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for i in range(count):
+            if kinds[i] == CONST:
+                continue
+            for j in netlist.sources[i]:
+                if kinds[j] != CONST:
+                    a, b = find(i), find(j)
+                    if a != b:
+                        parents[b] = a
+
+        members = collections.OrderedDict()
+        for i in range(count):
+            if kinds[i] != CONST:
+                members.setdefault(find(i), []).append(i)
+
+        # Node index -> (circuit, bit), for the nodes in each circuit
+        self.where = [None] * count
+        # Switch index -> [(circuit, bit), ...], for every circuit reading it
+        self.readers = {i: [] for i in range(count) if kinds[i] == CONST}
+        circuits = {}
+        self.circuits = []
+        for c, nodes in enumerate(members.values()):
+            # Nodes are already NANDs first, then wires, each along the rows,
+            # so copies of a circuit list their nodes in the same order
+            for bit, i in enumerate(nodes):
+                self.where[i] = (c, bit)
+            switches = {}
+            signature = []
+            for i in nodes:
+                mask = 0
+                for j in netlist.sources[i]:
+                    if kinds[j] == CONST:
+                        bit = switches.get(j)
+                        if bit is None:
+                            bit = switches[j] = len(nodes) + len(switches)
+                            self.readers[j].append((c, bit))
+                    else:
+                        bit = self.where[j][1]
+                    mask |= 1 << bit
+                signature.append((kinds[i], mask))
+            signature = tuple(signature)
+            circuit = circuits.get(signature)
+            if circuit is None:
+                circuit = circuits[signature] = Circuit(signature, self.cache)
+            self.circuits.append(circuit)
+        # How many different kinds of circuit there are
+        self.kind_count = len(circuits)
+
+    def __len__(self):
+        return len(self.circuits)
+
+    def state_of(self, signals):
+        """Packs a signal per node (see `Netlist.signals()`) into a state."""
+        state = [0] * len(self.circuits)
+        for i, signal in enumerate(signals):
+            if not signal:
+                continue
+            if i in self.readers:
+                for c, bit in self.readers[i]:
+                    state[c] |= 1 << bit
+            else:
+                c, bit = self.where[i]
+                state[c] |= 1 << bit
+        return state
+
+    def signal(self, state, i):
+        """The signal of node `i`, or None if it's a switch."""
+        where = self.where[i]
+        if where is None:
+            return None
+        c, bit = where
+        return bool(state[c] >> bit & 1)
+
+    def set_switch(self, state, i, value):
+        """Sets switch `i` in every circuit which reads it."""
+        for c, bit in self.readers[i]:
+            if value:
+                state[c] |= 1 << bit
+            else:
+                state[c] &= ~(1 << bit)
+
+    def step(self, state, ticks=1):
+        """Runs forwards, updating `state` in place."""
+        circuits = self.circuits
+        for c in range(len(circuits)):
+            state[c] = circuits[c].advance(state[c], ticks)
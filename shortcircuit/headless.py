@@ -0,0 +1,136 @@
+import argparse
+import json
+import sys
+import time
+
+import shortcircuit.engine as engine
+from shortcircuit.board import Board
+from shortcircuit.waveform import Recorder
+
+
+def parse_coords(string):
+    """Parses `X,Y` into a tuple."""
+    try:
+        x, y = string.split(',')
+        return (int(x), int(y))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected coords as X,Y, got '
+                                         f'"{string}"')
+
+
+def parse_setting(string):
+    """Parses `X,Y=VALUE` into `((x, y), bool)`."""
+    coords, _, value = string.partition('=')
+    if value not in ('0', '1'):
+        raise argparse.ArgumentTypeError(f'Expected a switch setting as '
+                                         f'X,Y=0 or X,Y=1, got "{string}"')
+    return (parse_coords(coords), value == '1')
+
+
+def parse_probe(string):
+    """Parses `NAME=X,Y` (or just `X,Y`) into `(name, (x, y))`."""
+    name, _, coords = string.rpartition('=')
+    coords = parse_coords(coords)
+    return (name or '{}_{}'.format(*coords), coords)
+
+
+def load_settings(path):
+    """Reads switch settings from a JSON file, which maps `"X,Y"` to 0 or
+    1."""
+    with open(path) as f:
+        settings = json.load(f)
+    return [(parse_coords(coords), bool(value))
+            for coords, value in settings.items()]
+
+
+def add_arguments(parser):
+    """Adds the headless runner's arguments to an argparse parser."""
+    parser.add_argument('board', help='Board file to simulate')
+    parser.add_argument('-n', '--ticks', metavar='N', type=int, default=1,
+                        help='How many ticks to run for')
+    parser.add_argument('--engine', default='fastest',
+                        choices=['fastest', 'auto'] + list(engine.ENGINES),
+                        help='Simulation engine to use')
+    parser.add_argument('--set', dest='settings', metavar='X,Y=V',
+                        action='append', default=[], type=parse_setting,
+                        help='Set the switch at X,Y on (1) or off (0) before '
+                             'running. May be repeated.')
+    parser.add_argument('--switches', metavar='FILE',
+                        help='JSON file of switch settings, {"X,Y": 0 or 1}')
+    parser.add_argument('--probe', dest='probes', metavar='NAME=X,Y',
+                        action='append', default=[], type=parse_probe,
+                        help='A signal to report at the end, and trace with '
+                             '--trace. May be repeated.')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Write a VCD waveform of the probes, sampled '
+                             'every tick')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='Write the final board to a file')
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help='Write the final signals to a JSON file, or '
+                             '"-" for stdout')
+
+
+def run(args):
+    """Runs a board without a UI.
+
+    Returns : int
+      The exit status.
+    """
+    with open(args.board) as f:
+        board = Board.deserialize(f.read())
+
+    sim = engine.create(args.engine, board)
+
+    settings = list(args.settings)
+    if args.switches:
+        settings = load_settings(args.switches) + settings
+    for coords, value in settings:
+        try:
+            sim.set_switch(coords, value)
+        except KeyError:
+            print(f'There is no switch at {coords}', file=sys.stderr)
+            return 2
+
+    probes = dict(args.probes)
+    recorder = None
+    if args.trace:
+        recorder = Recorder(probes, sim.output, path=args.trace)
+
+    start = time.perf_counter()
+    if recorder is None:
+        sim.step(args.ticks)
+    else:
+        recorder.sample(0)
+        for tick in range(1, args.ticks + 1):
+            sim.step()
+            recorder.sample(tick)
+        recorder.close()
+    elapsed = time.perf_counter() - start
+    sim.sync()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(board.serialize())
+
+    if args.snapshot:
+        snapshot = {
+            'ticks': args.ticks,
+            'signals': [[x, y, sig] for (x, y), sig
+                        in board.signals().items()],
+            'probes': {name: sim.output(coords)
+                       for name, coords in probes.items()},
+        }
+        if args.snapshot == '-':
+            json.dump(snapshot, sys.stdout)
+            sys.stdout.write('\n')
+        else:
+            with open(args.snapshot, 'w') as f:
+                json.dump(snapshot, f)
+
+    for name, coords in probes.items():
+        print(f'{name}: {int(sim.output(coords))}', file=sys.stderr)
+    rate = args.ticks / elapsed if elapsed > 0 else float('inf')
+    print(f'{args.ticks} ticks in {elapsed:.3f}s ({rate:.0f} ticks/s, '
+          f'{sim.name} engine)', file=sys.stderr)
+    return 0
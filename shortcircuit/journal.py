@@ -0,0 +1,96 @@
+import collections
+
+# One edit made to a world.
+#   index : the board it was made to
+#   message : the message which made it
+#   changes : what it changed, as recorded in `Board.changes`
+Entry = collections.namedtuple('Entry', ['index', 'message', 'changes'])
+
+
+class Journal:
+    """Remembers the edits made to a world, so that they can be undone and
+    redone.
+
+    Each entry holds exactly what an edit changed on the board, including the
+    wires it joined and broken up, so stepping back and forth through them
+    never has to flood a wire again. See `Board.apply_changes`.
+
+    Parameters
+    ----------
+
+    limit : int
+      The most edits to remember. The oldest are forgotten first.
+    """
+
+    def __init__(self, limit=1000):
+        self.done = collections.deque(maxlen=limit)
+        self.undone = []
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, board, index, message, edit):
+        """Makes an edit to a board, and remembers it.
+
+        Parameters
+        ----------
+
+        board : Board
+          The board being edited.
+        index : int
+          The board's index in the world.
+        message : dict
+          The message asking for the edit.
+        edit : function
+          Makes the edit. Called with no arguments.
+        """
+        changes = board.changes = []
+        try:
+            edit()
+        finally:
+            board.changes = None
+        if changes:
+            self.done.append(Entry(index, message, changes))
+            # A new edit starts a new history
+            self.undone.clear()
+
+    def undo(self, boards):
+        """Takes back the latest edit.
+
+        Returns : Entry
+          The edit, or None if there's nothing to undo.
+
+        Raises : ValueError
+          If the board has been changed without going through the journal.
+          Everything is forgotten, since none of it can be trusted.
+        """
+        if not self.done:
+            return None
+        entry = self.done.pop()
+        self._apply(boards, entry, True)
+        self.undone.append(entry)
+        return entry
+
+    def redo(self, boards):
+        """Puts back the latest edit to be undone.
+
+        Returns : Entry
+          The edit, or None if there's nothing to redo.
+        """
+        if not self.undone:
+            return None
+        entry = self.undone.pop()
+        self._apply(boards, entry, False)
+        self.done.append(entry)
+        return entry
+
+    def _apply(self, boards, entry, undo):
+        try:
+            boards[entry.index].apply_changes(entry.changes, undo)
+        except ValueError:
+            self.clear()
+            raise
+
+    def clear(self):
+        self.done.clear()
+        self.undone.clear()
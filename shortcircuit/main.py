@@ -1,8 +1,13 @@
 import argparse
 import logging
+import os
+import sys
 
+import shortcircuit.analysis as analysis
+import shortcircuit.editlog as editlog
+import shortcircuit.headless as headless
+import shortcircuit.sweep as sweep
 from shortcircuit.board import Board
-from shortcircuit.tui import TermUI
 from shortcircuit.world import World
 
 logger = logging.getLogger()
@@ -14,6 +19,23 @@ logging.basicConfig(filename=logname,
                     datefmt='%H:%M:%S',
                     level=logging.DEBUG)
 
+# Boards with more tiles than this are loaded lazily (see
+# `Board.deserialize`), so they can be shown straight away. Smaller ones are
+# quick enough to load fully, and show their wires' signals from the start.
+LAZY_LOAD_TILES = 200000
+
+
+def parse_rate(string):
+    """Parses a clock rate, which must be more than 0."""
+    try:
+        rate = float(string)
+    except ValueError:
+        rate = None
+    if rate is None or not rate > 0:
+        raise argparse.ArgumentTypeError(f'Expected a rate of more than 0, '
+                                         f'got "{string}"')
+    return rate
+
 
 def main():
 
@@ -34,22 +56,78 @@ def main():
                             help='Disable UTF-8 box drawing characters')
     box_parser.set_defaults(box_draw=True)
 
+    parser.add_argument('--rate', metavar='N', type=parse_rate, default=None,
+                        help='Target ticks per second when the clock is '
+                             'running (default: as fast as possible)')
+    parser.add_argument('--fps', metavar='N', type=float, default=30,
+                        help='Frames per second to draw while the clock is '
+                             'running')
+    parser.add_argument('--log', metavar='PATH',
+                        help='Log every edit to PATH as it happens. If there '
+                             'is already a log there, the world is rebuilt '
+                             'from it instead of loaded from --file.')
+    parser.add_argument('--share', metavar='NAME',
+                        help='Publish the signals on the board to shared '
+                             'memory called NAME, for other processes to '
+                             'watch (see shortcircuit/signalmap.py)')
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help='Run headless and serve the world as JSON lines '
+                             'on HOST:PORT, a unix socket path, or "stdio"')
+
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser(
+            'run', help='Simulate a board without a UI, as fast as possible')
+    headless.add_arguments(run_parser)
+    sweep_parser = subparsers.add_parser(
+            'sweep', help='Simulate many boards and switch settings in '
+                          'parallel')
+    sweep.add_arguments(sweep_parser)
+    analyze_parser = subparsers.add_parser(
+            'analyze', help='Report on the structure of a board as JSON')
+    analysis.add_arguments(analyze_parser)
+
     args = parser.parse_args()
 
     logger.debug(args)
 
-    if args.file:
-        # Read board from file
-        with open(args.file, 'r') as f:
-            board_str = f.read()
-            board = Board.deserialize(board_str)
+    if args.command == 'run':
+        sys.exit(headless.run(args))
+    elif args.command == 'sweep':
+        sys.exit(sweep.run(args))
+    elif args.command == 'analyze':
+        sys.exit(analysis.run(args))
+
+    if args.log and os.path.exists(args.log + '.snapshot'):
+        # Carry on from where we left off
+        world = editlog.recover(args.log)
     else:
-        # Create a new board
-        board = Board()
-        board.initialize_grid((args.width, args.height))
+        if args.file:
+            # Read board from file
+            with open(args.file, 'r') as f:
+                board_str = f.read()
+                board = Board.deserialize(
+                        board_str, lazy=len(board_str) > LAZY_LOAD_TILES)
+        else:
+            # Create a new board
+            board = Board()
+            board.initialize_grid((args.width, args.height))
+
+        world = World([board])
+
+    if args.log:
+        editlog.EditLog(args.log, world)
+
+    if args.share:
+        world.share(0, args.share)
+
+    if args.serve:
+        # Imported here so a headless server doesn't need a terminal library
+        from shortcircuit.server import serve
+        serve(world, args.serve)
+        return
 
     # # Start up the UI
-    world = World([board])
+    from shortcircuit.tui import TermUI
     t = TermUI(args, world)
     # Block until we quit the UI
     t.start()
@@ -0,0 +1,240 @@
+"""Simulates a netlist a block of tiles at a time, remembering what each kind
+of block does.
+
+The board is cut into blocks of tiles, and each block's nodes are packed into
+a single int. Blocks which are wired up the same way (eg, the cells of a
+register file) share one function for working out their next state from
+their current state and their inputs, and that function is memoized. So a
+block which has been in the same situation before, anywhere on the board,
+ticks with a single cache lookup instead of a NAND at a time.
+"""
+import functools
+
+from shortcircuit.netlist import CONST, NAND
+
+
+class Kind:
+    """The tick functions shared by every block which is wired up the same
+    way.
+
+    Each node in the block has a mask of the block's bits it reads, and a
+    mask of the block's inputs it reads. A NAND is off only when everything
+    it reads is on. A wire is on when anything it reads is on.
+
+    Parameters
+    ----------
+
+    nodes : tuple
+      (kind, internal mask, external mask) for each node in the block.
+    cache_size : int
+      How many results to remember for each of the two tick functions.
+    """
+
+    def __init__(self, nodes, cache_size):
+        nands = [(1 << i, internal, external)
+                 for i, (kind, internal, external) in enumerate(nodes)
+                 if kind == NAND]
+        wires = [(1 << i, internal, external)
+                 for i, (kind, internal, external) in enumerate(nodes)
+                 if kind != NAND]
+
+        def next_nands(state, inputs):
+            out = 0
+            for bit, internal, external in nands:
+                if (state & internal) != internal or \
+                        (inputs & external) != external:
+                    out |= bit
+            return out
+
+        def next_wires(nands, inputs):
+            out = 0
+            for bit, internal, external in wires:
+                if nands & internal or inputs & external:
+                    out |= bit
+            return out
+
+        self.next_nands = functools.lru_cache(cache_size)(next_nands)
+        self.next_wires = functools.lru_cache(cache_size)(next_wires)
+        # Which of the block's bits each function actually reads. Masking
+        # the rest off means more lookups hit.
+        self.nand_reads = 0
+        for bit, internal, external in nands:
+            self.nand_reads |= internal
+        self.wire_reads = 0
+        for bit, internal, external in wires:
+            self.wire_reads |= internal
+
+
+class MemoNetlist:
+    """A `Netlist`, cut up into blocks of tiles.
+
+    Each node belongs to the block holding the first of its tiles (reading
+    along the rows). Switches and portals are kept together, apart from the
+    blocks.
+
+    `state` has an int per block, with a bit per node in it, and then an
+    int with a bit per switch.
+
+    Parameters
+    ----------
+
+    netlist : Netlist
+      The netlist to simulate.
+    block : tuple
+      The width and height of a block, in tiles. Repeated cells are only
+      spotted if they line up with the blocks in the same way.
+    cache_size : int
+      How many results each kind of block remembers, for each of its two
+      functions. The least recently used are forgotten first.
+    """
+
+    def __init__(self, netlist, block=(8, 8), cache_size=4096):
+        self.netlist = netlist
+        width, height = block
+
+        # Where each node first appears
+        first = {}
+        for y, row in enumerate(netlist.board.grid):
+            for x, node in enumerate(row):
+                if node is not None and node not in first:
+                    first[node] = (x, y)
+
+        # Node index -> (block, bit). Blocks are numbered in the order they
+        # are first seen, and bits in the order their nodes are.
+        blocks = {}
+        members = []
+        self.where = [None] * len(netlist)
+        consts = []
+        order = sorted(range(len(netlist)),
+                       key=lambda i: first[netlist.nodes[i]][::-1])
+        for i in order:
+            if netlist.kinds[i] == CONST:
+                consts.append(i)
+                continue
+            x, y = first[netlist.nodes[i]]
+            key = (x // width, y // height)
+            b = blocks.get(key)
+            if b is None:
+                b = blocks[key] = len(members)
+                members.append([])
+            self.where[i] = (b, len(members[b]))
+            members[b].append(i)
+        self.const_block = len(members)
+        for bit, i in enumerate(consts):
+            self.where[i] = (self.const_block, bit)
+
+        kinds = {}
+        self.kinds = []
+        self.nand_inputs = []
+        self.wire_inputs = []
+        for b, nodes in enumerate(members):
+            origin = first[netlist.nodes[nodes[0]]]
+            signature = []
+            # (block, bit) of each input from outside the block, for each
+            # phase of the tick
+            inputs = ([], [])
+            slots = ({}, {})
+            for i in nodes:
+                kind = netlist.kinds[i]
+                phase = 0 if kind == NAND else 1
+                internal = 0
+                external = 0
+                # In a fixed order, so that blocks wired up the same way
+                # look the same whatever order their edits were made in
+                sources = sorted(netlist.sources[i],
+                                 key=lambda j: self._sort_key(j, b, first,
+                                                              origin))
+                for j in sources:
+                    sb, bit = self.where[j]
+                    if sb == b:
+                        internal |= 1 << bit
+                        continue
+                    slot = slots[phase].get(j)
+                    if slot is None:
+                        slot = slots[phase][j] = len(inputs[phase])
+                        inputs[phase].append((sb, bit, 1 << slot))
+                    external |= 1 << slot
+                signature.append((kind, internal, external))
+            signature = tuple(signature)
+            kind = kinds.get(signature)
+            if kind is None:
+                kind = kinds[signature] = Kind(signature, cache_size)
+            self.kinds.append(kind)
+            self.nand_inputs.append(tuple(inputs[0]))
+            self.wire_inputs.append(tuple(inputs[1]))
+        # How many different kinds of block there are
+        self.kind_count = len(kinds)
+        self._unique_kinds = list(kinds.values())
+
+    def _sort_key(self, j, b, first, origin):
+        sb, bit = self.where[j]
+        if sb == b:
+            return (0, bit, 0)
+        x, y = first[self.netlist.nodes[j]]
+        return (1, y - origin[1], x - origin[0])
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def state_of(self, signals):
+        """Packs a signal per node (see `Netlist.signals()`) into a state."""
+        state = [0] * (self.const_block + 1)
+        for i, signal in enumerate(signals):
+            b, bit = self.where[i]
+            if signal:
+                state[b] |= 1 << bit
+        return state
+
+    def signals_of(self, state):
+        """Unpacks a state into a signal per node."""
+        return [bool(state[b] >> bit & 1) for b, bit in self.where]
+
+    def step(self, state, ticks=1):
+        """Runs forwards, updating `state` in place.
+
+        Works exactly like `Netlist.step()`: every NAND works out its next
+        signal from the current signals, then they all update at once, then
+        each wire takes the OR of its (new) inputs.
+        """
+        kinds = self.kinds
+        nand_inputs = self.nand_inputs
+        wire_inputs = self.wire_inputs
+        blocks = range(len(kinds))
+        nands = [0] * (len(kinds) + 1)
+
+        for t in range(ticks):
+            for b in blocks:
+                inputs = 0
+                for sb, bit, slot in nand_inputs[b]:
+                    if state[sb] >> bit & 1:
+                        inputs |= slot
+                kind = kinds[b]
+                nands[b] = kind.next_nands(state[b] & kind.nand_reads,
+                                           inputs)
+            # Wires read the switches too
+            nands[-1] = state[-1]
+            for b in blocks:
+                inputs = 0
+                for sb, bit, slot in wire_inputs[b]:
+                    if nands[sb] >> bit & 1:
+                        inputs |= slot
+                kind = kinds[b]
+                new = nands[b]
+                state[b] = new | kind.next_wires(new & kind.wire_reads,
+                                                 inputs)
+
+    def cache_info(self):
+        """How well the caches are doing, over every kind of block.
+
+        Returns : dict
+          Numbers of `hits` and `misses`, and how many results are held
+          (`size`).
+        """
+        hits = misses = size = 0
+        for kind in self._unique_kinds:
+            for f in (kind.next_nands, kind.next_wires):
+                info = f.cache_info()
+                hits += info.hits
+                misses += info.misses
+                size += info.currsize
+        return {'hits': hits, 'misses': misses, 'size': size}
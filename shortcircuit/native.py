@@ -0,0 +1,184 @@
+"""The optional native kernel for stepping netlists.
+
+The kernel is a small C extension, `shortcircuit/_kernel.c`. It isn't built
+automatically. To build it in place, with the compiler Python was built with:
+
+    PYTHONPATH=. python -m shortcircuit.native
+
+If it hasn't been built, or doesn't give the same results as `Board.tick()`,
+`kernel` is None and everything falls back to the pure Python netlist.
+"""
+import importlib.util
+import logging
+import os
+import random
+import shlex
+import subprocess
+import sys
+import sysconfig
+from array import array
+
+from shortcircuit.board import Board
+from shortcircuit.netlist import Netlist
+
+logger = logging.getLogger()
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      '_kernel.c')
+
+# The kernel works on fixed size ints
+MAX_LANES = 64
+assert array('I').itemsize == 4 and array('Q').itemsize == 8
+
+# Checked against `Board.tick()` before the kernel is trusted. Has a NAND
+# loop, NANDs feeding NANDs, a bridge, a long wire and some switches.
+CHECK_BOARD = (" x-----       \n"
+               "  -   r--  r- \n"
+               "  r---- r-----\n"
+               " o--|--  -r-  \n"
+               "    -    - -  \n"
+               "  --|------|- \n"
+               "  - -      -  \n"
+               " x- -------r--\n"
+               "    rl   d-   \n")
+CHECK_TICKS = 40
+
+
+def build(output_dir=None):
+    """Compiles the kernel.
+
+    Parameters
+    ----------
+
+    output_dir : str
+      Where to put the extension. Defaults to next to the source, where it
+      will be found by `import shortcircuit._kernel`.
+
+    Returns : str
+      The path of the built extension.
+
+    Raises : subprocess.CalledProcessError
+      If the compiler fails.
+    """
+    if output_dir is None:
+        output_dir = os.path.dirname(SOURCE)
+    output = os.path.join(output_dir,
+                          '_kernel' + sysconfig.get_config_var('EXT_SUFFIX'))
+
+    config = sysconfig.get_config_vars()
+    # eg, "gcc -pthread -shared". Has the right flags for making an extension
+    # on this platform.
+    command = shlex.split(config.get('LDSHARED') or 'cc -shared')
+    command += shlex.split(config.get('CCSHARED') or '')
+    command += ['-O2', '-I', sysconfig.get_paths()['include'],
+                SOURCE, '-o', output]
+    logger.info(f'Building native kernel: {" ".join(command)}')
+    subprocess.run(command, check=True)
+    return output
+
+
+def load(path=None):
+    """Imports the kernel, from `path` if given.
+
+    Returns : module
+      The kernel, or None if it hasn't been built.
+    """
+    if path is None:
+        try:
+            import shortcircuit._kernel as module
+        except ImportError:
+            return None
+        return module
+
+    spec = importlib.util.spec_from_file_location('shortcircuit._kernel',
+                                                  path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Stepper:
+    """Steps a netlist with the native kernel, with up to 64 lanes.
+
+    Holds the netlist's arrays in the fixed size form the kernel expects.
+    `signals` is an `array('Q')` which can be read and written like a list.
+
+    Parameters
+    ----------
+
+    module : module
+      The kernel.
+    netlist : Netlist
+      The netlist to step.
+    signals : list
+      Starting signal of each node.
+    """
+
+    def __init__(self, module, netlist, signals):
+        self.module = module
+        self.netlist = netlist
+        self.offsets = array('I', netlist.offsets)
+        self.indices = array('I', netlist.indices)
+        self.signals = array('Q', signals)
+        self.scratch = array('Q', bytes(8 * netlist.nand_count))
+
+    def step(self, ticks, mask):
+        self.module.step(self.offsets, self.indices, self.signals,
+                         self.scratch, self.netlist.nand_count,
+                         self.netlist.wire_count, ticks, mask)
+
+
+def check(module):
+    """Whether a kernel gives exactly the same results as `Board.tick()`,
+    and as `Netlist.step()` with every lane in use."""
+    board = Board.deserialize(CHECK_BOARD)
+    netlist = Netlist(board)
+    switches = [i for i, node in enumerate(netlist.nodes)
+                if i >= netlist.nand_count + netlist.wire_count]
+
+    # One lane, against the SimNodes
+    stepper = Stepper(module, netlist, netlist.signals())
+    for t in range(CHECK_TICKS):
+        board.tick()
+        stepper.step(1, 1)
+        if list(stepper.signals) != netlist.signals():
+            return False
+
+    # Every lane, with the switches set differently in each
+    rand = random.Random(0)
+    mask = (1 << MAX_LANES) - 1
+    signals = [mask if s else 0 for s in netlist.signals()]
+    for i in switches:
+        signals[i] = rand.getrandbits(MAX_LANES)
+    stepper = Stepper(module, netlist, signals)
+    stepper.step(CHECK_TICKS, mask)
+    netlist.step(signals, CHECK_TICKS, mask)
+    return list(stepper.signals) == signals
+
+
+def _load_checked():
+    module = load()
+    if module is None:
+        return None
+    try:
+        ok = check(module)
+    except Exception as e:
+        logger.warning(f'Native kernel failed its self check: {e!r}')
+        return None
+    if not ok:
+        logger.warning("Native kernel doesn't match Board.tick(), not using "
+                       "it")
+        return None
+    return module
+
+
+# The kernel, if it's been built and gives the right answers
+kernel = _load_checked()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    path = build()
+    if not check(load(path)):
+        sys.exit(f"Built {path}, but it doesn't match Board.tick()!")
+    print(f'Built {path}')
@@ -0,0 +1,125 @@
+from shortcircuit.simnode import Nand, Portal, Switch, Wire, WireBridge
+
+# Kinds of node in a netlist
+NAND = 0
+WIRE = 1
+# Anything else (eg, a switch or portal). Holds its signal until told
+# otherwise.
+CONST = 2
+
+
+class Netlist:
+    """A board compiled down to flat arrays, so it can be simulated without
+    touching any SimNodes.
+
+    Every distinct SimNode which can hold a signal gets an index. NANDs come
+    first, then wires, then everything else. The inputs of node `i` are
+    `indices[offsets[i]:offsets[i + 1]]` (compressed sparse rows).
+
+    One tick works exactly like `Board.tick()`: every NAND works out its next
+    signal from the current signals, then they all update at once, then each
+    wire takes the OR of its (new) inputs.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to compile. It is only read from.
+    """
+
+    def __init__(self, board):
+        nands = []
+        wires = []
+        others = []
+        # SimNode -> index. Built in two passes, because wires can span many
+        # tiles and we only want each one once.
+        index = {}
+        for row in board.grid:
+            for node in row:
+                if node is None or node in index:
+                    continue
+                index[node] = None
+                if isinstance(node, Nand):
+                    nands.append(node)
+                elif isinstance(node, Wire):
+                    wires.append(node)
+                elif isinstance(node, (Switch, Portal)):
+                    others.append(node)
+                elif not isinstance(node, WireBridge):
+                    raise ValueError(f"Can't compile {node!r}")
+
+        self.nodes = nands + wires + others
+        self.nand_count = len(nands)
+        self.wire_count = len(wires)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.kinds = ([NAND] * len(nands) + [WIRE] * len(wires) +
+                      [CONST] * len(others))
+
+        self.offsets = [0]
+        self.indices = []
+        for node, kind in zip(self.nodes, self.kinds):
+            if kind != CONST:
+                self.indices.extend(self.index[source]
+                                    for source in node.inputs)
+            self.offsets.append(len(self.indices))
+        # The same again, as a tuple per node, which is quicker to loop over
+        # from Python than slicing `indices`
+        self.sources = [tuple(self.indices[start:end]) for start, end
+                        in zip(self.offsets, self.offsets[1:])]
+
+        # Where to find each node on the board, for looking them up by coords
+        self.board = board
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def index_of(self, coords):
+        """Index of the node at some coords.
+
+        Raises : KeyError
+          If there's nothing which holds a signal at those coords.
+        """
+        return self.index[self.board.get(coords)]
+
+    def signals(self):
+        """The current signal of every node, read from the SimNodes."""
+        return [bool(node.output()) for node in self.nodes]
+
+    def step(self, signals, ticks=1, mask=1):
+        """Runs the netlist forwards, updating `signals` in place.
+
+        Signals are ints used as bit vectors, so many independent copies of
+        the board (lanes) can be simulated at once: bit `n` of every signal
+        belongs to lane `n`.
+
+        Parameters
+        ----------
+
+        signals : list
+          The signal of each node, as an int with a bit per lane.
+        ticks : int
+          How many ticks to run for.
+        mask : int
+          A bit set for each lane in use.
+        """
+        sources = self.sources
+        nands = range(self.nand_count)
+        wires = range(self.nand_count, self.nand_count + self.wire_count)
+        new = [0] * self.nand_count
+
+        for t in range(ticks):
+            for i in nands:
+                acc = mask
+                for j in sources[i]:
+                    acc &= signals[j]
+                    if not acc:
+                        break
+                new[i] = acc ^ mask
+            signals[:self.nand_count] = new
+            for i in wires:
+                acc = 0
+                for j in sources[i]:
+                    acc |= signals[j]
+                    if acc == mask:
+                        break
+                signals[i] = acc
@@ -0,0 +1,173 @@
+class FrameBuffer:
+    """Remembers the last frame drawn to the terminal, so that only the cells
+    which have changed since need to be drawn again.
+
+    A frame is a list of rows, and each row is a list of `(glyph, color)`
+    cells. Every row in a frame should be the same width.
+
+    Parameters
+    ----------
+
+    max_gap : int
+      Unchanged cells between two changes are redrawn rather than skipped
+      over if there are at most this many of them. Moving the cursor costs
+      more bytes than a few redundant glyphs do.
+    """
+
+    def __init__(self, max_gap=3):
+        self.max_gap = max_gap
+        self.frame = None
+
+    def invalidate(self):
+        """Forget the last frame, so the next one is drawn in full. Use this
+        when the terminal may have been disturbed (eg, resized)."""
+        self.frame = None
+
+    def diff(self, frame):
+        """Works out what needs to be drawn to turn the last frame into this
+        one, and remembers this one for next time.
+
+        Parameters
+        ----------
+
+        frame : list
+          The frame which should appear on the terminal.
+
+        Returns : tuple
+          `(full, runs)`. `full` is True if the terminal should be cleared
+          before drawing. `runs` is a list of `(x, y, cells)`, where `cells`
+          are consecutive cells to be drawn starting from `(x, y)`.
+        """
+        last = self.frame
+        self.frame = frame
+
+        if (last is None or len(last) != len(frame) or
+                any(len(a) != len(b) for a, b in zip(last, frame))):
+            return (True, [(0, y, row) for y, row in enumerate(frame)])
+
+        runs = []
+        for y, (old_row, row) in enumerate(zip(last, frame)):
+            # Most rows don't change between frames, so check that quickly
+            # before looking at the cells
+            if old_row == row:
+                continue
+
+            start = None
+            end = None
+            for x, (old, new) in enumerate(zip(old_row, row)):
+                if old == new:
+                    continue
+                if start is None:
+                    start = x
+                elif x - end > self.max_gap + 1:
+                    runs.append((start, y, row[start:end + 1]))
+                    start = x
+                end = x
+            runs.append((start, y, row[start:end + 1]))
+
+        return (False, runs)
+
+
+class Viewport:
+    """A window onto part of a board, which scrolls to follow the cursor.
+
+    When zoomed out, each cell on screen stands for a `scale` x `scale` block
+    of tiles.
+
+    Parameters
+    ----------
+
+    width : int
+      Width of the window, in screen cells.
+    height : int
+      Height of the window, in screen cells.
+    margin : int
+      How close (in screen cells) the cursor can get to the edge of the
+      window before it scrolls.
+    """
+
+    def __init__(self, width, height, margin=2):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.scale = 1
+        # Coords of the tile at the top left of the window
+        self.x = 0
+        self.y = 0
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+
+    def zoom(self, scale):
+        self.scale = scale
+        # Keep the window lined up with the blocks
+        self.x -= self.x % scale
+        self.y -= self.y % scale
+
+    def follow(self, coords):
+        """Scrolls the window just far enough to keep `coords` on screen."""
+        self.x = self._follow_axis(coords[0], self.x, self.width)
+        self.y = self._follow_axis(coords[1], self.y, self.height)
+
+    def _follow_axis(self, pos, origin, size):
+        scale = self.scale
+        span = size * scale
+        margin = min(self.margin, (size - 1) // 2) * scale
+        if pos < origin + margin:
+            origin = pos - margin
+        elif pos >= origin + span - margin:
+            origin = pos - span + margin + scale
+        origin = max(0, origin)
+        return origin - origin % scale
+
+    def to_screen(self, coords):
+        """Converts tile coords to screen cell coords"""
+        return ((coords[0] - self.x) // self.scale,
+                (coords[1] - self.y) // self.scale)
+
+    def tiles(self):
+        """The range of tiles in the window.
+
+        Returns : tuple
+          (x0, y0, x1, y1), where x1 and y1 are exclusive.
+        """
+        return (self.x, self.y,
+                self.x + self.width * self.scale,
+                self.y + self.height * self.scale)
+
+
+def block_densities(grid, x0, y0, cols, rows, scale):
+    """Summarises blocks of tiles for a zoomed out view.
+
+    Parameters
+    ----------
+
+    grid : list
+      The board's grid.
+    x0, y0 : int
+      Coords of the tile at the top left of the first block.
+    cols, rows : int
+      How many blocks across and down to summarise.
+    scale : int
+      Width and height of each block, in tiles.
+
+    Returns : list
+      Rows of `(occupied, on)` pairs, counting the tiles in each block which
+      hold a SimNode, and how many of those have their output on.
+    """
+    blocks = []
+    for by in range(rows):
+        occupied = [0] * cols
+        on = [0] * cols
+        top = y0 + by * scale
+        for row in grid[top:top + scale]:
+            for bx in range(cols):
+                left = x0 + bx * scale
+                for node in row[left:left + scale]:
+                    if node is not None:
+                        occupied[bx] += 1
+                        if node.output():
+                            on[bx] += 1
+        blocks.append(list(zip(occupied, on)))
+    return blocks
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import sys
+
+logger = logging.getLogger()
+
+
+def signal_diff(old, new):
+    """Works out which tiles changed between two signal snapshots.
+
+    Parameters
+    ----------
+
+    old : dict
+      coord -> bool, as returned by `Board.signals`
+    new : dict
+      coord -> bool, as returned by `Board.signals`
+
+    Returns : list
+      [x, y, signal] for every tile which changed. Tiles which no longer hold
+      a SimNode are reported with a signal of `None`.
+    """
+    changes = [[x, y, signal] for (x, y), signal in new.items()
+               if old.get((x, y)) != signal]
+    changes += [[x, y, None] for (x, y) in old.keys() - new.keys()]
+    return changes
+
+
+class Client:
+    """A single connection to the server."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        # board index -> the last signal snapshot this client was sent, or
+        # None if it hasn't been sent anything yet
+        self.subscriptions = {}
+
+    def send(self, message):
+        self.writer.write((json.dumps(message) + '\n').encode())
+
+
+class WorldServer:
+    """Exposes a World over JSON lines, so that many clients can drive and
+    observe the same simulation.
+
+    Every line a client sends is a single message in the same format that
+    `World.process_message` understands. Edits are applied as soon as they
+    arrive. Ticks (and steps, which pause the clock first) are queued and run
+    in the background a chunk at a time, so edits from other clients are
+    never stuck behind a long run.
+
+    On top of the World messages, clients may send:
+
+    - `{"subscribe": {"index": 0}}` to receive signal diffs for a board
+    - `{"unsubscribe": {"index": 0}}` to stop receiving them
+    - `{"board": {"index": 0}}` to receive the serialized board
+
+    Parameters
+    ----------
+
+    world : World
+      The world to serve.
+    tick_chunk : int
+      The most ticks to run before giving clients a chance to be serviced.
+    """
+
+    world_messages = ['tile_set', 'nand_rotate', 'switch_toggle',
+                      'run', 'pause', 'resume', 'undo', 'redo',
+                      'portal_link', 'clock_domain']
+
+    def __init__(self, world, tick_chunk=100, frame_rate=30):
+        self.world = world
+        self.tick_chunk = tick_chunk
+        self.frame_rate = frame_rate
+        self.clients = set()
+        # Ticks which have been requested but not run yet
+        self.pending_ticks = 0
+
+        self._tasks = []
+        self._ticks_wanted = None
+
+    async def start(self):
+        """Starts ticking in the background. Must be called from within the
+        event loop the server will run in."""
+        self._ticks_wanted = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._tick_loop()),
+                       asyncio.ensure_future(self._sample_loop())]
+
+    async def stop(self):
+        """Stops ticking and disconnects all clients."""
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self.world.stop()
+        for client in list(self.clients):
+            client.writer.close()
+
+    async def serve_tcp(self, host, port):
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def serve_unix(self, path):
+        return await asyncio.start_unix_server(self.handle_client, path)
+
+    async def serve_stdio(self):
+        """Serves a single client over stdin/stdout until stdin closes."""
+        loop = asyncio.get_event_loop()
+
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        transport, protocol = await loop.connect_write_pipe(
+                asyncio.streams.FlowControlMixin, sys.stdout)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+
+        await self.handle_client(reader, writer)
+
+    async def handle_client(self, reader, writer):
+        client = Client(writer)
+        self.clients.add(client)
+        logger.info(f'Client connected, {len(self.clients)} total')
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    client.send({'error': f'Invalid message: {e}'})
+                else:
+                    self.handle(client, message)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.close()
+            logger.info(f'Client disconnected, {len(self.clients)} total')
+
+    def handle(self, client, message):
+        """Handles a single message from a client."""
+        subscribe = message.get('subscribe')
+        unsubscribe = message.get('unsubscribe')
+        board = message.get('board')
+        tick = message.get('tick')
+        step = message.get('step')
+
+        try:
+            if subscribe:
+                index = subscribe['index']
+                # Make sure the board exists before anything is sent
+                self.world.boards[index]
+                client.subscriptions[index] = None
+                self.publish([client])
+
+            elif unsubscribe:
+                client.subscriptions.pop(unsubscribe['index'], None)
+
+            elif board:
+                index = board['index']
+                client.send({'board': {
+                    'index': index,
+                    'data': self.world.boards[index].serialize()}})
+
+            elif tick is not None or step is not None:
+                ticks = int(step if tick is None else tick)
+                if ticks < 1:
+                    raise ValueError(f"Can't tick {ticks} times")
+                if step is not None:
+                    self.world.pause()
+                self.pending_ticks += ticks
+                self._ticks_wanted.set()
+
+            else:
+                name = next(k for k in self.world_messages if k in message)
+                body = message[name]
+                if isinstance(body, dict) and 'coord' in body:
+                    # JSON has no tuples, but the board wants its coords
+                    # hashable
+                    body = dict(body, coord=tuple(body['coord']))
+                self.world.process_message({name: body})
+                self.publish()
+
+        except StopIteration:
+            client.send({'error': f'Unknown message: {message}'})
+        except (KeyError, IndexError, TypeError, ValueError,
+                AttributeError) as e:
+            logger.warning(f'Bad message {message}: {e!r}')
+            client.send({'error': f'Bad message: {message}'})
+
+    def publish(self, clients=None):
+        """Sends every subscribed client the signals which changed since it
+        was last updated."""
+        if clients is None:
+            clients = self.clients
+
+        # Only snapshot each board once, however many clients are watching
+        snapshots = {}
+        with self.world.lock:
+            for client in clients:
+                for index in client.subscriptions:
+                    if index not in snapshots:
+                        snapshots[index] = self.world.boards[index].signals()
+
+        for client in clients:
+            for index, old in client.subscriptions.items():
+                new = snapshots[index]
+                changes = signal_diff(old or {}, new)
+                client.subscriptions[index] = new
+                if changes or old is None:
+                    client.send({'signals': {'index': index,
+                                             'tick': self.world.ticks,
+                                             'changes': changes}})
+
+    async def _tick_loop(self):
+        while True:
+            await self._ticks_wanted.wait()
+
+            ticks = min(self.pending_ticks, self.tick_chunk)
+            self.pending_ticks -= ticks
+            if self.pending_ticks <= 0:
+                self.pending_ticks = 0
+                self._ticks_wanted.clear()
+
+            if ticks > 0:
+                self.world.process_message({'tick': ticks})
+                self.publish()
+
+            # Give clients a chance to get a word in
+            await asyncio.sleep(0)
+
+    async def _sample_loop(self):
+        """While the world's clock is running it ticks in its own thread, so
+        we sample it at the frame rate to keep subscribers up to date."""
+        while True:
+            await asyncio.sleep(1 / self.frame_rate)
+            if self.world.running():
+                self.publish()
+
+
+def serve(world, address, tick_chunk=100):
+    """Serves a world until interrupted.
+
+    Parameters
+    ----------
+
+    world : World
+      The world to serve.
+    address : str
+      `stdio`, `HOST:PORT`, or the path of a unix socket.
+    tick_chunk : int
+      The most ticks to run before giving clients a chance to be serviced.
+    """
+    async def run():
+        server = WorldServer(world, tick_chunk)
+        await server.start()
+        try:
+            if address == 'stdio':
+                await server.serve_stdio()
+                return
+            if '/' in address:
+                listener = await server.serve_unix(address)
+            else:
+                host, port = address.rsplit(':', 1)
+                listener = await server.serve_tcp(host, int(port))
+            logger.info(f'Serving on {address}')
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            await server.stop()
+
+    asyncio.run(run())
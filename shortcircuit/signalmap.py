@@ -0,0 +1,213 @@
+"""Publishes the signals on a board to shared memory, so that other processes
+can watch a simulation without slowing it down or taking any locks.
+
+The block of shared memory starts with a header (see `HEADER`), then has a
+bitmap with a bit per tile, row by row, `stride` bytes per row, lowest bit
+first. A tile's bit is set if it holds a signal which is on.
+
+Frames are guarded by a sequence number (a seqlock). The publisher makes it
+odd before changing anything, and even again afterwards, so a reader which
+sees the same even number before and after copying a frame knows nobody was
+writing to it in between.
+
+Needs `multiprocessing.shared_memory`, so Python 3.8 or later.
+"""
+import operator
+import struct
+import time
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Before Python 3.8
+    shared_memory = None
+
+# magic, format, width, height, sequence number, tick
+HEADER = struct.Struct('<4sIIIQQ')
+MAGIC = b'SCSM'
+FORMAT = 1
+# The sequence number and tick, on their own
+COUNTER = struct.Struct('<Q')
+SEQ_OFFSET = 16
+TICK_OFFSET = 24
+
+# Names of the blocks this process is publishing
+_published = set()
+
+_get_signal = operator.attrgetter('signal')
+
+
+def _check_available():
+    if shared_memory is None:
+        raise RuntimeError('Sharing signals needs Python 3.8 or later')
+
+
+class Frame:
+    """The signals on a board at one tick, as read by a `Reader`."""
+
+    __slots__ = ('tick', 'width', 'height', 'stride', 'bits')
+
+    def __init__(self, tick, width, height, bits):
+        self.tick = tick
+        self.width = width
+        self.height = height
+        self.stride = (width + 7) // 8
+        self.bits = bits
+
+    def signal(self, coords):
+        """Whether the tile at some coords holds a signal which is on."""
+        x, y = coords
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        return bool(self.bits[y * self.stride + x // 8] >> (x % 8) & 1)
+
+
+class Publisher:
+    """Keeps a board's signals up to date in a block of shared memory.
+
+    The bitmap is kept up to date in private memory, flipping only the tiles
+    of nodes whose signal has changed, and copied across whole. So `publish`
+    costs about a read of every node's signal, and readers only have to wait
+    for the copy. The board must not grow while it's being published.
+
+    Parameters
+    ----------
+
+    board : Board
+      The board to publish.
+    name : str
+      The name of the block of shared memory, or None for a random one.
+      Either way, it's in `name`.
+    """
+
+    def __init__(self, board, name=None):
+        _check_available()
+        self.board = board
+        self.height = len(board.grid)
+        self.width = max((len(row) for row in board.grid), default=0)
+        self.stride = (self.width + 7) // 8
+        size = HEADER.size + self.stride * self.height
+        self.memory = shared_memory.SharedMemory(name, create=True,
+                                                 size=max(size, 1))
+        self.name = self.memory.name
+        _published.add(self.name)
+        self.buf = self.memory.buf
+        HEADER.pack_into(self.buf, 0, MAGIC, FORMAT, self.width,
+                         self.height, 0, 0)
+        self.seq = 0
+        self.bits = bytearray(self.stride * self.height)
+        # The board's version the tile map was built for
+        self.version = None
+        self.nodes = []
+        self.tiles = []
+        self.signals = []
+
+    def _map_tiles(self):
+        """Works out which tiles each node covers, as (offset, mask) into the
+        bitmap, with a mask of every tile it covers in that byte."""
+        first = {}
+        self.nodes = []
+        tiles = []
+        for y, row in enumerate(self.board.grid[:self.height]):
+            offset = y * self.stride
+            for x, node in enumerate(row[:self.width]):
+                if not hasattr(node, 'signal'):
+                    # Empty, or a bridge
+                    continue
+                i = first.get(node)
+                if i is None:
+                    i = first[node] = len(self.nodes)
+                    self.nodes.append(node)
+                    tiles.append({})
+                masks = tiles[i]
+                masks[offset + x // 8] = (masks.get(offset + x // 8, 0) |
+                                          1 << (x % 8))
+        self.tiles = [tuple(masks.items()) for masks in tiles]
+        self.version = self.board.version
+
+    def publish(self, tick):
+        """Writes out any signals which have changed, as the frame for
+        `tick`."""
+        bits = self.bits
+        if self.version != self.board.version:
+            # Start again from a blank bitmap
+            self._map_tiles()
+            bits[:] = bytes(len(bits))
+            self.signals = [False] * len(self.nodes)
+        signals = list(map(_get_signal, self.nodes))
+        if signals != self.signals:
+            tiles = self.tiles
+            for i, (signal, old) in enumerate(zip(signals, self.signals)):
+                if signal != old:
+                    for offset, mask in tiles[i]:
+                        bits[offset] ^= mask
+            self.signals = signals
+
+        buf = self.buf
+        self.seq += 1
+        COUNTER.pack_into(buf, SEQ_OFFSET, self.seq)
+        buf[HEADER.size:HEADER.size + len(bits)] = bits
+        COUNTER.pack_into(buf, TICK_OFFSET, tick)
+        self.seq += 1
+        COUNTER.pack_into(buf, SEQ_OFFSET, self.seq)
+
+    def close(self):
+        """Stops publishing, and frees the shared memory once every reader
+        has closed it too."""
+        self.buf = None
+        self.memory.close()
+        self.memory.unlink()
+        _published.discard(self.name)
+
+
+class Reader:
+    """Reads the frames a `Publisher` writes, from any process.
+
+    Parameters
+    ----------
+
+    name : str
+      The name of the publisher's block of shared memory.
+    """
+
+    def __init__(self, name):
+        _check_available()
+        try:
+            self.memory = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # Before Python 3.13, attaching to a block signs it up to be
+            # freed when this process exits, as if we'd created it. Unless
+            # we did create it, that has to be undone.
+            self.memory = shared_memory.SharedMemory(name)
+            if name not in _published:
+                resource_tracker.unregister(self.memory._name,
+                                            'shared_memory')
+        self.buf = self.memory.buf
+        magic, version, self.width, self.height, _, _ = \
+            HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != FORMAT:
+            self.close()
+            raise ValueError(f"{name} isn't a board's signals")
+        self.stride = (self.width + 7) // 8
+
+    def read(self):
+        """Copies out the latest frame.
+
+        Returns : Frame
+        """
+        buf = self.buf
+        end = HEADER.size + self.stride * self.height
+        while True:
+            seq = COUNTER.unpack_from(buf, SEQ_OFFSET)[0]
+            if seq & 1:
+                # In the middle of being written
+                time.sleep(0)
+                continue
+            bits = bytes(buf[HEADER.size:end])
+            tick = COUNTER.unpack_from(buf, TICK_OFFSET)[0]
+            if COUNTER.unpack_from(buf, SEQ_OFFSET)[0] == seq:
+                return Frame(tick, self.width, self.height, bits)
+
+    def close(self):
+        self.buf = None
+        self.memory.close()
@@ -1,12 +1,22 @@
 import logging
 import json
+import types
 
 import shortcircuit.util as util
 
 logger = logging.getLogger()
 
+# Shared by every node which has no edges yet, so that we don't pay for an
+# empty dict on each of them. Nodes swap it for a real dict when they first
+# need to add something.
+NO_EDGES = types.MappingProxyType({})
+
 
 class SimNode:
+    # No per-instance __dict__, and no attributes unless a subclass asks for
+    # them. There can be millions of these.
+    __slots__ = ()
+
     def output(self):
         return False
 
@@ -16,29 +26,16 @@ class SimNode:
     def tick(self):
         pass
 
-    def recalculate_io(self, my_coords, board):
-        """Add neighbouring SimNodes to my inputs. Inject myself into my
-        neighbours inputs."""
-        pass
+    def accepts_from(self, coord_delta):
+        """Whether this node takes input from a neighbour in the direction
+        `coord_delta`. The board uses this, and `outputs_to`, to work out
+        which nodes are connected."""
+        return False
 
-    def input_remove(self, node):
+    def clear_links(self):
+        """Forgets every connection to or from this node."""
         pass
 
-    def input_add(self, node, coord_delta):
-        """Adds another node to my inputs if possible.
-
-        Sometimes directionality is important when joining, so SimNodes must be
-        able to define their connection strategies via this method.
-
-        Arguments:
-            node (SimNode): The new node to be added
-            coord_delta: Coord difference between the two nodes
-
-        Returns:
-            bool: True if the node was added, False otherwise.
-        """
-        return False
-
     def outputs_to(self, coord_delta):
         """Whether this node can output in the given direction"""
         return True
@@ -80,18 +77,64 @@ class SimNode:
         return (q_board, my_coords, self)
 
 
-class Wire(SimNode):
+class Receiver(SimNode):
+    """A SimNode which reads the outputs of other SimNodes.
+
+    Two nodes can be connected through more than one pair of touching tiles
+    (eg, a NAND with the same wire on two sides), so the board keeps count of
+    the connections from each input in `_inputs`, and an input is only
+    dropped once its last connection is removed. `inputs` are the nodes
+    themselves.
+
+    Evaluating a node happens far more often than editing it, so a tuple copy
+    of the inputs (`sources`) is kept for that, and only rebuilt after they
+    change.
+    """
+    __slots__ = ('_inputs', 'sources')
+
+    @property
+    def inputs(self):
+        return self._inputs.keys()
+
+    def accepts_from(self, coord_delta):
+        return True
+
+    def input_link(self, node: SimNode, count):
+        """Adds `count` connections from `node` (or removes them, if `count`
+        is negative)."""
+        inputs = self._inputs
+        if inputs is NO_EDGES:
+            inputs = self._inputs = {}
+        total = inputs.get(node, 0) + count
+        if total > 0:
+            inputs[node] = total
+        else:
+            inputs.pop(node, None)
+            if not inputs:
+                self._inputs = NO_EDGES
+        self.sources = None
+
+    def clear_links(self):
+        self._inputs = NO_EDGES
+        self.sources = None
+
+    def _get_sources(self):
+        sources = self.sources
+        if sources is None:
+            sources = self.sources = tuple(self._inputs)
+        return sources
+
+
+class Wire(Receiver):
+    __slots__ = ('signal', 'new_signal')
     serialized_glyphs = ['-']
 
     def __init__(self):
         self.signal = False
         self.new_signal = False
 
-        self.inputs = set()
-        # Of all SimNodes, only Wire keeps track of its outputs.
-        # It does this to ensure speedy split/join operations.
-        self.outputs = set()
-        self.pieces = set()
+        self._inputs = NO_EDGES
+        self.sources = None
     # Thoughts:
     #  - Maintain a list of coords which this wire is comprised of
     #    Then we can refer to it when doing wire splits/joins?
@@ -108,7 +151,12 @@ class Wire(SimNode):
         return self.serialized_glyphs[0]
 
     def calculate_next_output(self):
-        self.new_signal = any(x.output() for x in self.inputs)
+        # Same as `any()`, but without building a generator every tick
+        for node in self.sources or self._get_sources():
+            if node.output():
+                self.new_signal = True
+                return
+        self.new_signal = False
 
     def tick(self):
         self.signal = self.new_signal
@@ -116,17 +164,9 @@ class Wire(SimNode):
     def output(self):
         return self.signal
 
-    def input_remove(self, node: SimNode):
-        try:
-            self.inputs.remove(node)
-        except KeyError:
-            pass
-
-    def input_add(self, node: SimNode, coord_delta):
-        self.inputs.add(node)
-
 
 class WireBridge(SimNode):
+    __slots__ = ()
     serialized_glyphs = ['|']
 
     def output(self):
@@ -143,46 +183,21 @@ class WireBridge(SimNode):
         return self.serialized_glyphs[0]
 
     def get(self, q_board, my_coords, q_coord_delta):
-        new_coords = util.add(my_coords, q_coord_delta)
-        new_node = q_board.get(new_coords)
-        try:
-            return new_node.get(q_board, new_coords, q_coord_delta)
-        except AttributeError:
-            return (q_board, my_coords, None)
+        # The board knows where each run of bridges ends
+        return q_board.into(my_coords, q_coord_delta)
 
 
-class Nand(SimNode):
+class Nand(Receiver):
+    __slots__ = ('signal', 'new_signal', 'facing')
     serialized_glyphs = ['u', 'r', 'd', 'l']
 
     def __init__(self):
-        self.inputs = set()
+        self._inputs = NO_EDGES
+        self.sources = None
         self.signal = False
         self.new_signal = False
         self.facing = 0
 
-    def recalculate_io(self, my_coord, board):
-        # Reset inputs as empty, then slowly repopulate
-        self.inputs = set()
-        # Need to keep track of outputs so we don't immediately remove
-        # ourselves again if many neighbour tiles are the same input AND
-        # output object (eg, in the case of a simple 1-tick nand clock)
-        outputs = set()
-        deltas = util.neighbour_deltas()
-
-        for i, delta in enumerate(deltas):
-            nc = util.add(delta, my_coord)
-            _, nc, n = board.into(nc, delta)
-
-            if n is not None:
-                if i == self.facing:
-                    n.input_add(self, util.invert(delta))
-                    outputs.add(n)
-                else:
-                    if n not in outputs:
-                        n.input_remove(self)
-                    if n.outputs_to(util.invert(delta)):
-                        self.inputs.add(n)
-
     @classmethod
     def deserialize(cls, glyph):
         n = cls()
@@ -200,38 +215,30 @@ class Nand(SimNode):
         return self.signal
 
     def calculate_next_output(self):
-        outputs = [x.output() for x in self.inputs]
-        logger.debug(f'nand: Outputs: {outputs}')
-        self.new_signal = not all(outputs)
-        logger.debug(f'nand: New signal: {self.new_signal}')
+        # Same as `not all()`, but stops at the first input which is off and
+        # doesn't allocate anything
+        for node in self.sources or self._get_sources():
+            if not node.output():
+                self.new_signal = True
+                return
+        self.new_signal = False
 
     def tick(self):
         self.signal = self.new_signal
 
-    def input_remove(self, node: SimNode):
-        try:
-            self.inputs.remove(node)
-        except KeyError:
-            pass
-
-    def input_add(self, node: SimNode, coord_delta):
-        # Don't try and add inputs if they are located on your output side!
-        if not self.outputs_to(coord_delta):
-            self.inputs.add(node)
-            return True
-
-        return False
+    def accepts_from(self, coord_delta):
+        # Don't take inputs which are located on your output side!
+        return not self.outputs_to(coord_delta)
 
     def outputs_to(self, coord_delta):
-        return util.neighbour_deltas()[self.facing] == coord_delta
+        return util.NEIGHBOUR_DELTAS[self.facing] == coord_delta
 
     def rotate_facing(self, delta: int, my_coords, board):
-        self.facing = (self.facing + delta) % 4
-
-        self.recalculate_io(my_coords, board)
+        board.set_facing(my_coords, (self.facing + delta) % 4)
 
 
 class Switch(SimNode):
+    __slots__ = ('signal',)
     serialized_glyphs = ['x', 'o']
 
     def __init__(self):
@@ -240,7 +247,7 @@ class Switch(SimNode):
     @classmethod
     def deserialize(cls, glyph):
         s = cls()
-        s.signal = cls.serialized_glyphs.index(glyph)
+        s.signal = bool(cls.serialized_glyphs.index(glyph))
         return s
 
     def serialize(self):
@@ -249,19 +256,39 @@ class Switch(SimNode):
     def output(self):
         return self.signal
 
-    def recalculate_io(self, my_coord, board):
-        neighbour_nodes = board.neighbour_objs_into(my_coord)
-        for output in neighbour_nodes:
-            # Attempt to notify the output space (Not all nodes have inputs, or
-            # there may be nothing there)
-            try:
-                output.inputs.add(self)
-            except AttributeError:
-                pass
-
     def toggle(self, value=None):
         """Toggles the signal of the switch, or sets its signal directly."""
         if value is None:
             self.signal = not self.signal
         else:
             self.signal = value
+
+
+class Portal(SimNode):
+    """Stands in for a tile on another board.
+
+    A portal is a source, like a switch, but its signal is set by the `World`
+    from the tile it is linked to (see `World.link`). Nothing on one board
+    ever reads a node on another, so each board can be ticked on its own.
+    """
+    __slots__ = ('signal',)
+    serialized_glyphs = ['p']
+
+    def __init__(self):
+        self.signal = False
+
+    @classmethod
+    def deserialize(cls, glyph):
+        assert(glyph.lower() in cls.serialized_glyphs)
+        p = cls()
+        p.signal = glyph.isupper()
+        return p
+
+    def serialize(self):
+        glyph = self.serialized_glyphs[0]
+        if self.output():
+            glyph = glyph.upper()
+        return glyph
+
+    def output(self):
+        return self.signal
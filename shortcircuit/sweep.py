@@ -0,0 +1,213 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+import shortcircuit.engine as engine
+import shortcircuit.headless as headless
+from shortcircuit.board import Board
+
+# One simulation to run.
+#   board : path of the board file
+#   settings : ((coords, bool), ...) switches to set before running
+#   ticks : how many ticks to run for
+#   probes : ((name, coords), ...) signals to read at the end
+Job = collections.namedtuple('Job', ['board', 'settings', 'ticks', 'probes'])
+
+# The outcome of a job. `index` is the job's position in the sweep, `outputs`
+# maps probe names to signals, and `error` says why the job failed, if it did.
+Result = collections.namedtuple('Result',
+                                ['index', 'job', 'outputs', 'error',
+                                 'elapsed'])
+
+# Engines built by this process, by (board path, engine name). Each worker
+# process loads and compiles each board once, however many jobs use it.
+_engines = {}
+
+
+def _get_engine(path, engine_name):
+    key = (path, engine_name)
+    sim = _engines.get(key)
+    if sim is None:
+        with open(path) as f:
+            board = Board.deserialize(f.read())
+        sim = _engines[key] = engine.create(engine_name, board)
+    else:
+        sim.reset()
+    return sim
+
+
+def run_job(index, job, engine_name='fastest'):
+    """Runs a single job in this process.
+
+    Returns : Result
+    """
+    start = time.perf_counter()
+    try:
+        sim = _get_engine(job.board, engine_name)
+        for coords, value in job.settings:
+            sim.set_switch(coords, value)
+        sim.step(job.ticks)
+        outputs = {name: sim.output(coords) for name, coords in job.probes}
+        error = None
+    except (OSError, KeyError, ValueError) as e:
+        outputs = None
+        error = f'{e.__class__.__name__}: {e}'
+    return Result(index, job, outputs, error, time.perf_counter() - start)
+
+
+def _run_chunk(chunk, engine_name):
+    return [run_job(index, job, engine_name) for index, job in chunk]
+
+
+def sweep(jobs, workers=None, engine_name='fastest', chunk_size=8):
+    """Runs many jobs across a pool of processes.
+
+    Jobs are sent to the workers in chunks, to save on overheads for short
+    jobs. Results are yielded as each chunk finishes, so they won't
+    necessarily be in the same order as `jobs`.
+
+    Parameters
+    ----------
+
+    jobs : iterable
+      `Job`s to run.
+    workers : int
+      How many processes to use. Defaults to one per CPU. 0 runs every job
+      in this process, which is handy for debugging.
+    engine_name : str
+      The engine to simulate each job with.
+    chunk_size : int
+      How many jobs to send to a worker at once.
+
+    Returns : generator
+      Yields a `Result` per job.
+    """
+    chunks = []
+    chunk = []
+    for item in enumerate(jobs):
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            chunks.append(chunk)
+            chunk = []
+    if chunk:
+        chunks.append(chunk)
+
+    if workers == 0:
+        try:
+            for chunk in chunks:
+                yield from _run_chunk(chunk, engine_name)
+        finally:
+            # Boards might be edited before the next sweep
+            _engines.clear()
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_run_chunk, chunk, engine_name)
+                   for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
+
+
+def product(boards, vectors, ticks, probes):
+    """Jobs for every combination of board and switch settings.
+
+    Parameters
+    ----------
+
+    boards : list
+      Paths of board files.
+    vectors : list
+      Lists of switch settings, as `[(coords, bool), ...]`.
+    ticks : int
+      How many ticks to run each job for.
+    probes : list
+      `(name, coords)` of each signal to read.
+    """
+    probes = tuple(probes)
+    return [Job(board, tuple(settings), ticks, probes)
+            for board in boards for settings in vectors]
+
+
+def load_vectors(path):
+    """Reads a JSON list of switch settings, each of which maps `"X,Y"` to 0
+    or 1."""
+    with open(path) as f:
+        vectors = json.load(f)
+    return [[(headless.parse_coords(coords), bool(value))
+             for coords, value in settings.items()]
+            for settings in vectors]
+
+
+def add_arguments(parser):
+    """Adds the sweep's arguments to an argparse parser."""
+    parser.add_argument('boards', nargs='+', metavar='BOARD',
+                        help='Board files to simulate')
+    parser.add_argument('--vectors', metavar='FILE',
+                        help='JSON list of switch settings, [{"X,Y": 0 or 1}, '
+                             '...]. Every board is run with each of them.')
+    parser.add_argument('-n', '--ticks', metavar='N', type=int, default=1,
+                        help='How many ticks to run each job for')
+    parser.add_argument('--probe', dest='probes', metavar='NAME=X,Y',
+                        action='append', default=[],
+                        type=headless.parse_probe,
+                        help='A signal to report for each job. May be '
+                             'repeated.')
+    parser.add_argument('-j', '--workers', metavar='N', type=int,
+                        default=None,
+                        help='Number of worker processes (default: one per '
+                             'CPU)')
+    parser.add_argument('--engine', default='fastest',
+                        choices=['fastest', 'auto'] + list(engine.ENGINES),
+                        help='Simulation engine to use')
+
+
+def run(args):
+    """Runs a sweep from parsed arguments, printing a line of JSON per job as
+    it finishes.
+
+    Returns : int
+      The exit status. Non-zero if any job failed.
+    """
+    vectors = [[]]
+    if args.vectors:
+        vectors = load_vectors(args.vectors)
+    jobs = product(args.boards, vectors, args.ticks, args.probes)
+
+    failed = 0
+    start = time.perf_counter()
+    for result in sweep(jobs, args.workers, args.engine):
+        line = {
+            'job': result.index,
+            'board': result.job.board,
+            'vector': result.index % len(vectors),
+        }
+        if result.error is None:
+            line['outputs'] = result.outputs
+        else:
+            line['error'] = result.error
+            failed += 1
+        print(json.dumps(line), flush=True)
+    elapsed = time.perf_counter() - start
+
+    if args.workers == 0:
+        where = 'in one process'
+    else:
+        where = f'on {args.workers or os.cpu_count()} workers'
+    print(f'{len(jobs)} jobs ({failed} failed) in {elapsed:.3f}s {where}',
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulates many boards and '
+                                                 'switch settings in parallel')
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
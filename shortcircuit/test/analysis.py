@@ -0,0 +1,76 @@
+import json
+import os
+import unittest
+
+import shortcircuit.analysis as analysis
+from shortcircuit.board import Board
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+
+class AnalysisTest(unittest.TestCase):
+
+    def analyze(self, board_str):
+        return analysis.analyze(Board.deserialize(board_str))
+
+    def testHistogram(self):
+        self.assertEqual(analysis.histogram([0, 1, 1, 2, 3, 4, 7, 8]),
+                         {'0': 1, '1': 2, '2-3': 2, '4-7': 2, '8-15': 1})
+        self.assertEqual(analysis.histogram([]), {})
+
+    def testFullAdder(self):
+        with open(os.path.join(DATA, 'full-adder.ssboard')) as f:
+            report = analysis.analyze(Board.deserialize(f.read()))
+        self.assertEqual(report['counts']['nands'], 9)
+        self.assertEqual(report['counts']['switches'], 3)
+        # Two XORs of three NANDs each, between the inputs and the sum
+        self.assertEqual(report['depth'], 6)
+        self.assertEqual(report['loops']['count'], 0)
+        self.assertEqual(report['dead']['constant']['count'], 0)
+        # Survives a round trip through JSON
+        self.assertEqual(json.loads(json.dumps(report)), report)
+
+    def testOscillator(self):
+        # A NAND feeding itself through a wire
+        report = self.analyze("-r-\n"
+                              "---\n")
+        self.assertEqual(report['loops']['count'], 1)
+        self.assertEqual(report['loops']['inverting'], 1)
+        loop = report['loops']['largest'][0]
+        self.assertEqual(loop['nands'], 1)
+        self.assertEqual(loop['kind'], 'inverting')
+        self.assertEqual(report['dead']['constant']['count'], 0)
+
+    def testLatch(self):
+        # Two NANDs feeding each other
+        report = self.analyze("-r--\n"
+                              "-  -\n"
+                              "--l-\n")
+        self.assertEqual(report['loops']['count'], 1)
+        self.assertEqual(report['loops']['inverting'], 0)
+        self.assertEqual(report['loops']['largest'][0]['kind'], 'latching')
+
+    def testDeadLogic(self):
+        report = self.analyze("x-r- \n"
+                              "  -  \n"
+                              " r-  \n")
+        dead = report['dead']
+        # Nothing drives the second NAND
+        self.assertEqual(dead['undriven']['coords'], [[1, 2]])
+        # So neither it nor the wire it feeds can ever change
+        self.assertEqual(dead['constant']['coords'], [[1, 2], [2, 1]])
+        self.assertEqual(dead['unused']['count'], 0)
+
+    def testLongChain(self):
+        # Deeper than Python would let a recursive search go
+        report = self.analyze('x' + 'r' * 5000 + '-')
+        self.assertEqual(report['depth'], 5000)
+        self.assertEqual(report['loops']['count'], 0)
+
+    def testWidestWires(self):
+        report = self.analyze("x-x\n"
+                              " - \n"
+                              "x--\n")
+        self.assertEqual(report['widest_wires'],
+                         [{'coords': [1, 0], 'inputs': 3}])
+        self.assertEqual(report['fan_in']['wires'], {'2-3': 1})
@@ -1,8 +1,9 @@
+import random
 import unittest
 
 import shortcircuit.util as util
 from shortcircuit.board import Board
-from shortcircuit.simnode import Nand, Wire
+from shortcircuit.simnode import Nand, Wire, WireBridge
 
 
 class TestWireJoin(unittest.TestCase):
@@ -314,6 +315,179 @@ class BridgeDeleteTest(unittest.TestCase):
         self.assertEqual(wire.inputs, set())
 
 
+class LongWireTest(unittest.TestCase):
+    """Joining wires much longer than the recursion limit"""
+
+    def setUp(self):
+        self.length = 5000
+        self.board = Board.deserialize("o" + "-" * self.length + "." +
+                                       "-" * self.length)
+        self.board.set((self.length + 1, 0), Wire())
+
+    def testJoined(self):
+        self.assertIs(self.board.get((1, 0)),
+                      self.board.get((2 * self.length + 1, 0)))
+
+    def testE2E(self):
+        self.board.tick()
+        self.assertTrue(self.board.get((2 * self.length + 1, 0)).output())
+
+
+class NeighbourMaskTest(unittest.TestCase):
+    """The board keeps track of which neighbours each tile has, for drawing
+    wires"""
+
+    def setUp(self):
+        self.board = Board.deserialize(".-.\n"
+                                       "---\n"
+                                       "...\n")
+
+    def _all_masks(self):
+        return [[self.board.neighbour_mask((x, y)) for x in range(3)]
+                for y in range(3)]
+
+    def testInitialMasks(self):
+        # up = 1, right = 2, down = 4, left = 8
+        self.assertEqual(self._all_masks(), [[6, 4, 12],
+                                             [2, 11, 8],
+                                             [1, 1, 1]])
+
+    def testMasksFollowEdits(self):
+        self._all_masks()
+        self.board.set((1, 2), Wire())
+        self.board.set((0, 1), None)
+        self.board.set((2, 1), Nand())
+
+        expected = Board.deserialize(self.board.serialize())
+        for y in range(3):
+            for x in range(3):
+                self.assertEqual(self.board.neighbour_mask((x, y)),
+                                 expected.neighbour_mask((x, y)))
+
+
+class BridgeRunTest(unittest.TestCase):
+    """The board keeps track of where each run of bridges ends, so looking
+    through bridges doesn't have to step over them one at a time"""
+
+    def setUp(self):
+        self.board = Board.deserialize("..-..\n"
+                                       "..|..\n"
+                                       "-|||-\n"
+                                       "..|..\n"
+                                       "..-..\n")
+
+    def testInto(self):
+        board = self.board
+        self.assertEqual(board.into((1, 2), (1, 0)),
+                         (board, (4, 2), board.get((4, 2))))
+        self.assertEqual(board.into((2, 3), (0, -1)),
+                         (board, (2, 0), board.get((2, 0))))
+
+    def testNothingBeyond(self):
+        board = Board.deserialize("-||")
+        self.assertEqual(board.into((1, 0), (1, 0)), (board, (2, 0), None))
+
+    def testRunsFollowEdits(self):
+        rand = random.Random(0)
+        board = self.board
+        board.into((1, 2), (1, 0))
+        for edit in range(200):
+            coords = (rand.randrange(5), rand.randrange(5))
+            board.set(coords, Board.deserialize_simnode(rand.choice('.-|')))
+            expected = Board.deserialize(board.serialize())
+            expected._grid_global_bridge_refresh()
+            self.assertEqual(board.bridges, expected.bridges)
+
+
+class EdgeBookkeepingTest(unittest.TestCase):
+    """Edits only add and remove the connections they touch. Whatever is done
+    to a board, it should end up connected exactly as if it had been loaded
+    from scratch."""
+
+    def connections(self, board):
+        # Nodes are named by the tiles they cover, since reloading a board
+        # makes new SimNodes
+        tiles = {}
+        for y, row in enumerate(board.grid):
+            for x, node in enumerate(row):
+                if node is not None:
+                    tiles.setdefault(node, set()).add((x, y))
+        names = {node: frozenset(coords) for node, coords in tiles.items()}
+        return {names[node]: {names.get(n): count
+                              for n, count in node._inputs.items()}
+                for node in names if hasattr(node, '_inputs')}
+
+    def assertFresh(self, board):
+        fresh = Board.deserialize(board.serialize())
+        self.assertEqual(self.connections(board), self.connections(fresh),
+                         board.serialize())
+
+    def testRandomEdits(self):
+        rand = random.Random(0)
+        for trial in range(50):
+            width, height = rand.randint(2, 8), rand.randint(2, 8)
+            board = Board.deserialize('\n'.join(
+                    ''.join(rand.choice('..--|rldux') for x in range(width))
+                    for y in range(height)))
+            for edit in range(20):
+                coords = (rand.randrange(width), rand.randrange(height))
+                node = board.get(coords)
+                if isinstance(node, Nand) and rand.random() < 0.3:
+                    node.rotate_facing(rand.choice([1, 3]), coords, board)
+                else:
+                    glyph = rand.choice('.-|rldxo')
+                    board.set(coords, Board.deserialize_simnode(glyph))
+                self.assertFresh(board)
+
+    def testNandThroughDeletedBridge(self):
+        board = Board.deserialize("r|-")
+        wire = board.get((2, 0))
+        board.set((1, 0), None)
+        self.assertEqual(wire.inputs, set())
+
+    def testSwitchThroughDeletedBridge(self):
+        board = Board.deserialize("o|-")
+        wire = board.get((2, 0))
+        board.set((1, 0), None)
+        self.assertEqual(wire.inputs, set())
+
+    def testPlacedBridgeJoinsWires(self):
+        board = Board.deserialize("r-.-")
+        board.set((2, 0), WireBridge())
+        self.assertIs(board.get((1, 0)), board.get((3, 0)))
+        self.assertEqual(board.get((3, 0)).inputs, {board.get((0, 0))})
+
+    def testDeletedBridgeBreaksWire(self):
+        board = Board.deserialize("r-|-")
+        board.set((2, 0), None)
+        self.assertIsNot(board.get((1, 0)), board.get((3, 0)))
+        self.assertEqual(board.get((3, 0)).inputs, set())
+
+    def testTrimKeepsWire(self):
+        """Cutting the end off a wire doesn't need to replace it"""
+        board = Board.deserialize("r-----")
+        wire = board.get((1, 0))
+        board.set((5, 0), None)
+        self.assertIs(board.get((1, 0)), wire)
+        board.set((3, 0), None)
+        self.assertIsNot(board.get((1, 0)), board.get((4, 0)))
+        self.assertEqual(board.get((1, 0)).inputs, {board.get((0, 0))})
+        self.assertEqual(board.get((4, 0)).inputs, set())
+
+    def testTwoSides(self):
+        """A NAND with the same wire on two sides is connected twice, and
+        stays connected until both are gone."""
+        board = Board.deserialize("--\nu-\n--")
+        nand = board.get((0, 1))
+        wire = board.get((1, 1))
+        board.set((0, 0), None)
+        self.assertEqual(nand.inputs, {wire})
+        board.set((0, 2), None)
+        self.assertEqual(nand.inputs, {wire})
+        board.set((1, 1), None)
+        self.assertEqual(nand.inputs, set())
+
+
 class PlaygroundTest(unittest.TestCase):
     """A big board to hold all the miscellaneous test cases"""
 
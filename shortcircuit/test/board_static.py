@@ -2,7 +2,7 @@ import logging
 import unittest
 
 from shortcircuit.board import Board
-from shortcircuit.simnode import Switch, Nand, Wire, WireBridge
+from shortcircuit.simnode import Switch, Nand, Wire, WireBridge, Portal
 
 logger = logging.getLogger()
 
@@ -256,5 +256,71 @@ class BridgeTest(unittest.TestCase):
     #     self.assertIsNone(self.bridge.output())
 
 
+class GlyphTest(unittest.TestCase):
+    def testSameAsTryingEachClass(self):
+        """Every glyph is read by the same class as if each were tried in
+        turn"""
+        for code in range(32, 127):
+            glyph = chr(code)
+            expected = None
+            for cls in [Wire, WireBridge, Nand, Switch, Portal]:
+                try:
+                    expected = cls.deserialize(glyph)
+                    break
+                except (AssertionError, ValueError):
+                    continue
+            node = Board.deserialize_simnode(glyph)
+            self.assertIs(type(node), type(expected), glyph)
+            if node is not None:
+                self.assertEqual(node.serialize(), expected.serialize())
+
+
+class LazyLoadTest(unittest.TestCase):
+    board_str = ("x-r-|--\n"
+                 "  --|-r-\n"
+                 "o---|-- \n"
+                 "  u     \n"
+                 "  -----L\n")
+
+    def setUp(self):
+        self.board = Board.deserialize(self.board_str, lazy=True)
+        self.eager = Board.deserialize(self.board_str)
+
+    def testOnlyReadsRowsLookedAt(self):
+        self.assertIsInstance(self.board.get((1, 0)), Wire)
+        self.assertEqual(self.board.neighbour_mask((2, 3)),
+                         self.eager.neighbour_mask((2, 3)))
+        # The rows around the mask, and the first one
+        self.assertEqual(self.board.grid.made(), 4)
+        self.assertFalse(self.board.resolved)
+
+    def testSameAsEager(self):
+        for board in (self.board, self.eager):
+            board.tick()
+            board.set((0, 0), Board.deserialize_simnode('o'))
+            board.tick()
+        self.assertTrue(self.board.resolved)
+        self.assertEqual(self.board.serialize(), self.eager.serialize())
+        for i in range(5):
+            self.assertEqual(self.board.signals(), self.eager.signals())
+            self.board.tick()
+            self.eager.tick()
+
+    def testWiresJoined(self):
+        self.board.resolve()
+        # Across the bridge
+        self.assertIs(self.board.get((3, 0)), self.board.get((6, 2)))
+        self.assertIsNot(self.board.get((1, 0)), self.board.get((3, 0)))
+
+    def testResolvingIsNotAnEdit(self):
+        self.board.changes = []
+        self.board.set((7, 3), Board.deserialize_simnode('-'))
+        self.assertTrue(all(change[1] == (7, 3) or change[0] != 0
+                            for change in self.board.changes))
+        self.board.apply_changes(self.board.changes, undo=True)
+        self.assertEqual(self.board.serialize(), self.eager.serialize())
+        self.assertEqual(self.board.signals(), self.eager.signals())
+
+
 if __name__ == '__main__':
     unittest.main()
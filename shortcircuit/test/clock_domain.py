@@ -0,0 +1,68 @@
+import unittest
+
+from shortcircuit.board import Board
+from shortcircuit.world import World
+
+
+class ClockDomainTest(unittest.TestCase):
+    """Boards in slower clock domains only tick every few ticks"""
+
+    # A NAND which feeds back into itself, so flips every tick
+    OSCILLATOR = "r-\n--"
+
+    def setUp(self):
+        self.fast = Board.deserialize(self.OSCILLATOR)
+        self.slow = Board.deserialize(self.OSCILLATOR)
+        self.world = World([self.fast, self.slow])
+        self.world.set_period(1, 3)
+
+    def tearDown(self):
+        self.world.stop()
+
+    def signal(self, board):
+        return board.get((0, 0)).output()
+
+    def testTicksLess(self):
+        reference = Board.deserialize(self.OSCILLATOR)
+        for tick in range(1, 13):
+            self.world.tick()
+            if tick % 3 == 0:
+                reference.tick()
+            self.assertEqual(self.signal(self.slow), self.signal(reference))
+
+    def testBatch(self):
+        """Running many ticks at once gives the same result as one by one"""
+        other = World([Board.deserialize(self.OSCILLATOR),
+                       Board.deserialize(self.OSCILLATOR)])
+        other.set_period(1, 3)
+        for ticks in [1, 5, 2, 7, 3]:
+            self.world.tick(ticks)
+            for i in range(ticks):
+                other.tick()
+            self.assertEqual(
+                    [self.signal(board) for board in self.world.boards],
+                    [self.signal(board) for board in other.boards])
+
+    def testHandoff(self):
+        """A slow board sees the fast board's signal as of its own ticks, and
+        the fast board sees the slow one's held in between"""
+        sampler = Board.deserialize("pr")
+        world = World([self.fast, sampler])
+        world.link(1, (0, 0), 0, (0, 0))
+        world.set_period(1, 2)
+        seen = []
+        for tick in range(1, 9):
+            before = self.signal(self.fast)
+            world.tick()
+            if tick % 2 == 0:
+                # The NAND inverts whatever the fast board showed going into
+                # this tick
+                seen.append(sampler.get((1, 0)).output() == (not before))
+        self.assertEqual(seen, [True] * 4)
+
+    def testMessage(self):
+        self.world.process_message({'clock_domain': {'index': 1,
+                                                     'period': 1}})
+        self.assertEqual(self.world.periods, {})
+        with self.assertRaises(ValueError):
+            self.world.set_period(0, 0)
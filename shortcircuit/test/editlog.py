@@ -0,0 +1,109 @@
+import os
+import random
+import tempfile
+import unittest
+
+import shortcircuit.editlog as editlog
+from shortcircuit.board import Board
+from shortcircuit.world import World
+
+
+class EditLogTest(unittest.TestCase):
+    """A world can be rebuilt from its edit log"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'edits.log')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def random_world(self, rand):
+        boards = [Board.deserialize('\n'.join(
+                      ''.join(rand.choice('..--|rldux') for x in range(6))
+                      for y in range(6)))
+                  for i in range(2)]
+        return World(boards)
+
+    def random_message(self, rand, world):
+        index = rand.randrange(2)
+        coord = (rand.randrange(6), rand.randrange(6))
+        node = world.boards[index].get(coord)
+        kind = rand.random()
+        if kind < 0.1:
+            return {'undo': rand.randint(1, 3)}
+        elif kind < 0.15:
+            return {'redo': rand.randint(1, 3)}
+        elif kind < 0.25 and hasattr(node, 'facing'):
+            return {'nand_rotate': {'coord': coord, 'index': index,
+                                    'delta': rand.choice([1, 3])}}
+        elif kind < 0.35 and hasattr(node, 'toggle'):
+            return {'switch_toggle': {'coord': coord, 'index': index,
+                                      'value': rand.choice([None, True])}}
+        elif kind < 0.38:
+            return {'clock_domain': {'index': index,
+                                     'period': rand.randint(1, 4)}}
+        elif kind < 0.4:
+            return {'portal_link': {'index': index, 'coord': coord,
+                                    'target_index': 1 - index,
+                                    'target_coord': (0, 0)}}
+        return {'tile_set': {'coord': coord, 'index': index,
+                             'node': rand.choice('.-|rldxo')}}
+
+    def assertSameWorld(self, world, recovered):
+        # Portals only pick up their signals when linked and before a tick,
+        # so may be out of date in between
+        def layout(w):
+            return [board.serialize().replace('P', 'p') for board in w.boards]
+        self.assertEqual(layout(world), layout(recovered))
+        self.assertEqual(world.links, recovered.links)
+        self.assertEqual(world.periods, recovered.periods)
+
+    def testRecover(self):
+        rand = random.Random(0)
+        for trial in range(10):
+            world = self.random_world(rand)
+            editlog.EditLog(self.path, world, snapshot_every=7)
+            for i in range(40):
+                world.process_message(self.random_message(rand, world))
+                self.assertSameWorld(world, editlog.recover(self.path))
+            world.stop()
+
+    def testBrokenLastLine(self):
+        world = self.random_world(random.Random(1))
+        editlog.EditLog(self.path, world)
+        world.process_message({'tile_set': {'coord': (0, 0), 'index': 0,
+                                            'node': 'o'}})
+        with open(self.path, 'a') as f:
+            f.write('{"seq": 2, "edit": {"tile_s')
+        self.assertSameWorld(world, editlog.recover(self.path))
+
+    def testOldLinesSkipped(self):
+        """Lines left over from before a snapshot aren't applied twice"""
+        world = self.random_world(random.Random(2))
+        log = editlog.EditLog(self.path, world)
+        world.process_message({'tile_set': {'coord': (0, 0), 'index': 0,
+                                            'node': 'r'}})
+        world.process_message({'nand_rotate': {'coord': (0, 0), 'index': 0,
+                                               'delta': 1}})
+        with open(self.path) as f:
+            lines = f.read()
+        log.snapshot()
+        # As if we crashed before the log was started again
+        with open(self.path, 'w') as f:
+            f.write(lines)
+        self.assertSameWorld(world, editlog.recover(self.path))
+
+    def testCarryOn(self):
+        """A recovered world can keep logging where it left off"""
+        world = self.random_world(random.Random(3))
+        editlog.EditLog(self.path, world)
+        world.process_message({'tile_set': {'coord': (1, 1), 'index': 1,
+                                            'node': 'x'}})
+        world = editlog.recover(self.path)
+        editlog.EditLog(self.path, world)
+        world.process_message({'switch_toggle': {'coord': (1, 1), 'index': 1,
+                                                 'value': None}})
+        self.assertSameWorld(world, editlog.recover(self.path))
+        world.stop()
+        self.assertIsNone(world.log)
@@ -0,0 +1,396 @@
+import os
+import random
+import subprocess
+import tempfile
+import unittest
+from array import array
+
+import shortcircuit.engine as engine
+import shortcircuit.native as native
+from shortcircuit.board import Board
+from shortcircuit.netlist import Netlist
+from shortcircuit.simnode import Switch
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+
+def random_board(rand):
+    width, height = rand.randint(2, 10), rand.randint(2, 10)
+    return '\n'.join(''.join(rand.choice('..--|rldux') for x in range(width))
+                     for y in range(height))
+
+
+class CompiledEngineTest(unittest.TestCase):
+    board_str = (" x-----   \n"
+                 "  -   r-- \n"
+                 "  r---- r-\n"
+                 " o--|--  -\n"
+                 "    -    r\n")
+
+    def signals(self, board):
+        return {coords: bool(board.get(coords).output())
+                for coords in board.signals()}
+
+    def testMatchesBoardTick(self):
+        board = Board.deserialize(self.board_str)
+        other = Board.deserialize(self.board_str)
+        sim = engine.CompiledEngine(other)
+        for i in range(20):
+            board.tick()
+            sim.step()
+            for coords in board.signals():
+                self.assertEqual(sim.output(coords),
+                                 bool(board.get(coords).output()), coords)
+
+    def testMatchesAfterEdits(self):
+        rand = random.Random(1)
+        board = Board.deserialize(self.board_str)
+        for i in range(30):
+            coords = (rand.randrange(10), rand.randrange(5))
+            glyph = rand.choice('-rludxo ')
+            board.set(coords, Board.deserialize_simnode(glyph))
+
+            sim = engine.CompiledEngine(board)
+            sim.step(3)
+            expected = {}
+            for t in range(3):
+                board.tick()
+            for coords in board.signals():
+                expected[coords] = bool(board.get(coords).output())
+                self.assertEqual(sim.output(coords), expected[coords])
+
+    def testSync(self):
+        board = Board.deserialize(self.board_str)
+        other = Board.deserialize(self.board_str)
+        sim = engine.CompiledEngine(other)
+        for i in range(5):
+            board.tick()
+        sim.step(5)
+        sim.sync()
+        self.assertEqual(other.serialize(), board.serialize())
+
+    def testLanes(self):
+        board = Board.deserialize(self.board_str)
+        sim = engine.CompiledEngine(board, lanes=2)
+        # Lane 0 keeps the switch as it is, lane 1 turns it off
+        sim.set_switch((1, 3), 0b01)
+        sim.step(10)
+
+        for value, lane in ((True, 0), (False, 1)):
+            single = Board.deserialize(self.board_str)
+            single.get((1, 3)).toggle(value)
+            for i in range(10):
+                single.tick()
+            for coords in single.signals():
+                self.assertEqual(sim.output(coords) >> lane & 1,
+                                 single.get(coords).output(), coords)
+
+    def testSetSwitchNotASwitch(self):
+        sim = engine.CompiledEngine(Board.deserialize(self.board_str))
+        with self.assertRaises(KeyError):
+            sim.set_switch((2, 1), True)
+
+
+class CreateTest(unittest.TestCase):
+    def testCreate(self):
+        board = Board.deserialize("x-\n")
+        self.assertIsInstance(engine.create('object', board),
+                              engine.ObjectEngine)
+        self.assertIsInstance(engine.create('fastest', board, lanes=8),
+                              engine.CompiledEngine)
+        self.assertIsInstance(board.get((0, 0)), Switch)
+
+
+class ResetTest(unittest.TestCase):
+    def testReset(self):
+        board_str = CompiledEngineTest.board_str
+        for name in ('object', 'compiled', 'memo', 'hashlife', 'event',
+                     'auto'):
+            board = Board.deserialize(board_str)
+            sim = engine.create(name, board)
+            sim.step(3)
+            before = {c: sim.output(c) for c in board.signals()}
+
+            sim.set_switch((1, 0), True)
+            sim.step(7)
+            sim.reset()
+            sim.step(3)
+            after = {c: sim.output(c) for c in board.signals()}
+            self.assertEqual(before, after, name)
+
+
+class MemoEngineTest(unittest.TestCase):
+    # A cell, which is repeated across the board
+    cell = ["x-r-  ",
+            "  - - ",
+            "o-u-- ",
+            "      "]
+
+    def testMatchesCompiled(self):
+        rand = random.Random(2)
+        for trial in range(30):
+            width, height = rand.randint(2, 12), rand.randint(2, 12)
+            board_str = '\n'.join(
+                    ''.join(rand.choice('..--|rldux') for x in range(width))
+                    for y in range(height))
+            block = (rand.randint(1, 5), rand.randint(1, 5))
+            sim = engine.MemoEngine(Board.deserialize(board_str), block)
+            other = engine.CompiledEngine(Board.deserialize(board_str))
+            for t in range(10):
+                sim.step()
+                other.step()
+                for y in range(height):
+                    for x in range(width):
+                        self.assertEqual(sim.output((x, y)),
+                                         other.output((x, y)), board_str)
+
+    def testRepeatedCells(self):
+        """Copies of a cell share one kind of block, and so one cache"""
+        board_str = '\n'.join(row * 4 for row in self.cell * 3)
+        board = Board.deserialize(board_str)
+        sim = engine.MemoEngine(board, block=(6, 4))
+        self.assertEqual(len(sim.memo), 12)
+        self.assertEqual(sim.memo.kind_count, 1)
+
+        sim.set_switch((6, 0), True)
+        sim.step(10)
+        sim.sync()
+        expected = Board.deserialize(board_str)
+        expected.get((6, 0)).toggle(True)
+        for i in range(10):
+            expected.tick()
+        self.assertEqual(board.serialize(), expected.serialize())
+        # Most blocks were in a state another block had already been in
+        info = sim.memo.cache_info()
+        self.assertGreater(info['hits'], 10 * info['misses'])
+
+    def testCacheSize(self):
+        board_str = '\n'.join(row * 4 for row in self.cell * 3)
+        sim = engine.MemoEngine(Board.deserialize(board_str), block=(6, 4),
+                                cache_size=2)
+        for i in range(12):
+            sim.set_switch((6 * (i % 4), 4 * (i % 3)), i % 2)
+            sim.step()
+        self.assertLessEqual(sim.memo.cache_info()['size'], 4)
+
+
+class HashlifeEngineTest(unittest.TestCase):
+    def assertSame(self, sim, other, board_str):
+        for coords in Board.deserialize(board_str).signals():
+            self.assertEqual(sim.output(coords), other.output(coords),
+                             board_str)
+
+    def testMatchesCompiled(self):
+        rand = random.Random(3)
+        for trial in range(30):
+            board_str = random_board(rand)
+            sim = engine.HashlifeEngine(Board.deserialize(board_str),
+                                        cache_size=rand.choice([1, 100]))
+            other = engine.CompiledEngine(Board.deserialize(board_str))
+            for ticks in [1, 2, 5, 64, 100]:
+                sim.step(ticks)
+                other.step(ticks)
+                self.assertSame(sim, other, board_str)
+
+    def testFarAhead(self):
+        """A billion ticks on, every board is where its cycle says it will
+        be"""
+        rand = random.Random(4)
+        ticks = 10 ** 9 + 3
+        for trial in range(10):
+            board_str = random_board(rand)
+            sim = engine.HashlifeEngine(Board.deserialize(board_str))
+            sim.step(ticks)
+
+            # Find where the board starts repeating itself, then only run as
+            # far as we need to
+            other = engine.CompiledEngine(Board.deserialize(board_str))
+            seen = {}
+            tick = 0
+            while tuple(other.signals) not in seen:
+                seen[tuple(other.signals)] = tick
+                other.step()
+                tick += 1
+            start = seen[tuple(other.signals)]
+            other.reset()
+            other.step(start + (ticks - start) % (tick - start))
+            self.assertSame(sim, other, board_str)
+
+    def testCopiesShareCircuits(self):
+        board = Board.deserialize("r-.r-.r-\n"
+                                  "--.--.--")
+        sim = engine.HashlifeEngine(board)
+        self.assertEqual(len(sim.universe), 3)
+        self.assertEqual(sim.universe.kind_count, 1)
+
+    def testCacheSize(self):
+        board = Board.deserialize(CompiledEngineTest.board_str)
+        sim = engine.HashlifeEngine(board, cache_size=3)
+        sim.step(1000)
+        self.assertLessEqual(len(sim.universe.cache.entries), 3)
+
+
+class EventEngineTest(unittest.TestCase):
+    def testMatchesCompiled(self):
+        rand = random.Random(5)
+        for trial in range(30):
+            board_str = random_board(rand)
+            sim = engine.EventEngine(Board.deserialize(board_str))
+            other = engine.CompiledEngine(Board.deserialize(board_str))
+            switches = [c for c in sim.board.signals()
+                        if isinstance(sim.board.get(c), Switch)]
+            for i in range(20):
+                if switches and rand.random() < 0.3:
+                    coords = rand.choice(switches)
+                    value = rand.random() < 0.5
+                    sim.set_switch(coords, value)
+                    other.set_switch(coords, value)
+                ticks = rand.randint(1, 3)
+                sim.step(ticks)
+                other.step(ticks)
+                for coords in sim.board.signals():
+                    self.assertEqual(sim.output(coords),
+                                     other.output(coords), board_str)
+
+    def testSyncAndRefresh(self):
+        board = Board.deserialize(CompiledEngineTest.board_str)
+        reference = Board.deserialize(CompiledEngineTest.board_str)
+        sim = engine.EventEngine(board)
+        for i in range(10):
+            if i == 4:
+                # Changed on the board, not through the engine
+                board.get((1, 0)).toggle(True)
+                reference.get((1, 0)).toggle(True)
+            sim.refresh()
+            sim.step()
+            sim.sync()
+            reference.tick()
+            for coords in board.signals():
+                self.assertEqual(bool(board.get(coords).output()),
+                                 bool(reference.get(coords).output()))
+
+    def testQuiet(self):
+        """Once a board without feedback has settled, nothing changes"""
+        with open(os.path.join(DATA, 'full-adder.ssboard')) as f:
+            sim = engine.EventEngine(Board.deserialize(f.read()))
+        sim.step(20)
+        changes = sim.changes
+        sim.step(100)
+        self.assertEqual(sim.changes, changes)
+        sim.set_switch((1, 1), True)
+        sim.step(20)
+        self.assertGreater(sim.changes, changes)
+
+
+class AutoEngineTest(unittest.TestCase):
+    # An oscillator, which only runs while the switch is on
+    gated_str = ("x-r-\n"
+                 "  --\n")
+
+    def testMatchesBoardTick(self):
+        """However often it changes engine"""
+        rand = random.Random(6)
+        for trial in range(20):
+            board_str = random_board(rand)
+            board = Board.deserialize(board_str)
+            reference = Board.deserialize(board_str)
+            sim = engine.AutoEngine(board, warmup=4, recheck=10)
+            switches = [c for c in board.signals()
+                        if isinstance(board.get(c), Switch)]
+            for i in range(30):
+                if switches and rand.random() < 0.3:
+                    coords = rand.choice(switches)
+                    value = rand.random() < 0.5
+                    board.get(coords).toggle(value)
+                    reference.get(coords).toggle(value)
+                ticks = rand.randint(1, 7)
+                sim.refresh()
+                sim.step(ticks)
+                sim.sync()
+                for t in range(ticks):
+                    reference.tick()
+                for coords in board.signals():
+                    self.assertEqual(bool(board.get(coords).output()),
+                                     bool(reference.get(coords).output()),
+                                     board_str)
+
+    def testProfile(self):
+        sim = engine.AutoEngine(Board.deserialize(self.gated_str), warmup=4)
+        self.assertIsNone(sim.profile)
+        sim.step(12)
+        self.assertIsNone(sim.trying)
+        self.assertEqual(sim.profile, {'nodes': 4, 'loops': 1,
+                                       'activity': 0.0})
+        self.assertEqual(set(sim.timings), set(sim.candidates))
+        self.assertIn(sim.stats()['engine'], sim.candidates)
+
+    def testTriesAgainWhenBusier(self):
+        sim = engine.AutoEngine(Board.deserialize(self.gated_str),
+                                candidates=('event',), warmup=4,
+                                recheck=1000)
+        sim.step(4)
+        self.assertIsNone(sim.trying)
+        sim.set_switch((0, 0), True)
+        sim.step(4)
+        self.assertIsNotNone(sim.trying)
+        sim.step(4)
+        self.assertIsNone(sim.trying)
+        self.assertGreater(sim.profile['activity'], 0.25)
+
+
+class NativeKernelTest(unittest.TestCase):
+    """The kernel is optional, so these only run if it can be built"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        try:
+            path = native.build(cls.tmp.name)
+        except (OSError, subprocess.CalledProcessError):
+            raise unittest.SkipTest("Can't build the native kernel")
+        cls.module = native.load(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def testCheck(self):
+        self.assertTrue(native.check(self.module))
+
+    def testMatchesBoardTick(self):
+        board = Board.deserialize(CompiledEngineTest.board_str)
+        netlist = Netlist(board)
+        stepper = native.Stepper(self.module, netlist, netlist.signals())
+        for i in range(20):
+            board.tick()
+            stepper.step(1, 1)
+            self.assertEqual(list(stepper.signals), netlist.signals())
+
+    def testBadBuffers(self):
+        board = Board.deserialize(CompiledEngineTest.board_str)
+        netlist = Netlist(board)
+        stepper = native.Stepper(self.module, netlist, netlist.signals())
+        stepper.indices[0] = len(netlist)
+        with self.assertRaises(ValueError):
+            stepper.step(1, 1)
+        stepper.signals = array('Q')
+        with self.assertRaises(ValueError):
+            stepper.step(1, 1)
+
+    @unittest.skipIf(native.kernel is None, 'Native kernel not built')
+    def testEngine(self):
+        board = Board.deserialize(CompiledEngineTest.board_str)
+        reference = engine.CompiledEngine(
+                Board.deserialize(CompiledEngineTest.board_str), lanes=64)
+        sim = engine.create('native', board, lanes=64)
+        rand = random.Random(0)
+        for sw in ((1, 0), (1, 3)):
+            bits = rand.getrandbits(64)
+            sim.set_switch(sw, bits)
+            reference.set_switch(sw, bits)
+        sim.step(30)
+        reference.step(30)
+        for coords in board.signals():
+            self.assertEqual(sim.output(coords), reference.output(coords))
+        with self.assertRaises(ValueError):
+            engine.NativeEngine(board, lanes=65)
@@ -0,0 +1,83 @@
+import argparse
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+import shortcircuit.headless as headless
+from shortcircuit.board import Board
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+
+class HeadlessTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = argparse.ArgumentParser()
+        headless.add_arguments(self.parser)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.board = os.path.join(DATA, 'full-adder.ssboard')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, *argv):
+        args = self.parser.parse_args([self.board] + list(argv))
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            status = headless.run(args)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def testAdd(self):
+        for engine in ('object', 'compiled'):
+            status, out, err = self._run(
+                    '-n', '12', '--engine', engine, '--set', '1,1=1',
+                    '--set', '1,5=1', '--probe', 'sum=18,5',
+                    '--probe', 'carry=18,9', '--snapshot', '-')
+            self.assertEqual(status, 0)
+            snapshot = json.loads(out)
+            self.assertEqual(snapshot['probes'],
+                             {'sum': False, 'carry': True})
+            self.assertIn('12 ticks in', err)
+
+    def testSwitchFile(self):
+        path = os.path.join(self.tmp.name, 'switches.json')
+        with open(path, 'w') as f:
+            json.dump({'1,1': 1, '1,5': 0, '1,9': 1}, f)
+        status, out, err = self._run('-n', '12', '--switches', path,
+                                     '--probe', '18,9', '--snapshot', '-')
+        self.assertEqual(json.loads(out)['probes'], {'18_9': True})
+
+    def testOutputMatchesBoardTick(self):
+        path = os.path.join(self.tmp.name, 'out.ssboard')
+        self._run('-n', '7', '--set', '1,9=1', '-o', path)
+
+        with open(self.board) as f:
+            expected = Board.deserialize(f.read())
+        expected.get((1, 9)).toggle(True)
+        for i in range(7):
+            expected.tick()
+        with open(path) as f:
+            self.assertEqual(f.read(), expected.serialize())
+
+    def testTrace(self):
+        path = os.path.join(self.tmp.name, 'out.vcd')
+        self._run('-n', '12', '--set', '1,1=1', '--probe', 'sum=18,5',
+                  '--trace', path)
+        with open(path) as f:
+            vcd = f.read()
+        self.assertIn('$var wire 1 ! sum $end', vcd)
+        self.assertTrue(vcd.endswith('#12\n'))
+
+    def testNotASwitch(self):
+        status, out, err = self._run('--set', '2,2=1')
+        self.assertEqual(status, 2)
+        self.assertIn('no switch', err)
+
+    def testBadArguments(self):
+        with redirect_stderr(io.StringIO()):
+            for argv in (['--set', '1,1=2'], ['--probe', 'a=1']):
+                with self.assertRaises(SystemExit):
+                    self.parser.parse_args([self.board] + argv)
@@ -0,0 +1,143 @@
+import random
+import unittest
+
+from shortcircuit.board import Board
+from shortcircuit.simnode import Portal, Wire
+from shortcircuit.world import World
+
+
+def connections(board):
+    """Every node's inputs, by the coords of the first tile of each"""
+    first = {}
+    for y, row in enumerate(board.grid):
+        for x, node in enumerate(row):
+            if node is not None:
+                first.setdefault(node, (x, y))
+    return {first[node]: sorted(str(first.get(source)) for source, count
+                                in node._inputs.items() for i in range(count))
+            for node in first if hasattr(node, '_inputs')}
+
+
+def snapshot(board):
+    """Every tile's node, and every node's connections, by identity"""
+    grid = [list(row) for row in board.grid]
+    inputs = {node: dict(node._inputs) for row in board.grid for node in row
+              if hasattr(node, '_inputs')}
+    facings = {node: node.facing for row in board.grid for node in row
+               if hasattr(node, 'facing')}
+    return grid, inputs, facings
+
+
+class JournalTest(unittest.TestCase):
+    """Edits made through the world can be undone and redone"""
+
+    def setUp(self):
+        self.board = Board.deserialize("r----\n"
+                                       "-.|.-\n"
+                                       "--|--\n")
+        self.world = World([self.board])
+
+    def edit(self, coord, glyph):
+        self.world.process_message({'tile_set': {'coord': coord, 'index': 0,
+                                                 'node': glyph}})
+
+    def testUndoRedo(self):
+        before = snapshot(self.board)
+        self.edit((2, 0), '.')
+        after = snapshot(self.board)
+        self.assertEqual(self.world.undo(), 1)
+        self.assertEqual(snapshot(self.board), before)
+        self.assertEqual(self.world.redo(), 1)
+        self.assertEqual(snapshot(self.board), after)
+
+    def testUndoSplitKeepsWire(self):
+        """Undoing a broken wire puts the original Wire back, without
+        looking for its tiles again"""
+        board = Board.deserialize("r---.")
+        world = World([board])
+        wire = board.get((1, 0))
+        world.process_message({'tile_set': {'coord': (2, 0), 'index': 0,
+                                            'node': 'd'}})
+        self.assertIsNot(board.get((1, 0)), board.get((3, 0)))
+        world.undo()
+        self.assertIs(board.get((1, 0)), wire)
+        self.assertIs(board.get((3, 0)), wire)
+        self.assertIsInstance(board.get((2, 0)), Wire)
+
+    def testRotate(self):
+        before = snapshot(self.board)
+        self.world.process_message({'nand_rotate': {'coord': (0, 0),
+                                                    'index': 0, 'delta': 1}})
+        self.world.process_message({'undo': 1})
+        self.assertEqual(snapshot(self.board), before)
+
+    def testNothingToUndo(self):
+        self.assertEqual(self.world.undo(), 0)
+        self.assertEqual(self.world.redo(), 0)
+
+    def testNewEditForgetsRedo(self):
+        self.edit((1, 1), 'x')
+        self.world.undo()
+        self.edit((3, 1), 'x')
+        self.assertEqual(self.world.redo(), 0)
+
+    def testEditedOutsideJournal(self):
+        self.edit((1, 1), 'x')
+        self.board.set((1, 1), None)
+        self.assertEqual(self.world.undo(), 0)
+        self.assertEqual(len(self.world.journal), 0)
+
+    def testPortalLink(self):
+        before = snapshot(self.board)
+        self.world.link(0, (1, 1), 0, (0, 0))
+        self.assertIsInstance(self.board.get((1, 1)), Portal)
+        self.assertEqual(self.world.undo(), 1)
+        self.assertEqual(snapshot(self.board), before)
+        self.assertEqual(self.world.redo(), 1)
+        self.assertIsInstance(self.board.get((1, 1)), Portal)
+
+    def testRandomEditsAndPortals(self):
+        rand = random.Random(0)
+        for trial in range(50):
+            board = Board.deserialize('\n'.join(
+                    ''.join(rand.choice('..--|rldux') for x in range(6))
+                    for y in range(6)))
+            world = World([board])
+            for edit in range(15):
+                coord = (rand.randrange(6), rand.randrange(6))
+                choice = rand.random()
+                if choice < 0.5:
+                    world.process_message({'tile_set': {
+                        'coord': coord, 'index': 0,
+                        'node': rand.choice('.-|rldxo')}})
+                elif choice < 0.65:
+                    world.link(0, coord, 0, (0, 0))
+                elif choice < 0.85:
+                    world.undo()
+                else:
+                    world.redo()
+            fresh = Board.deserialize(board.serialize())
+            self.assertEqual(connections(board), connections(fresh))
+
+    def testRandomEdits(self):
+        rand = random.Random(0)
+        for trial in range(20):
+            board = Board.deserialize('\n'.join(
+                    ''.join(rand.choice('..--|rldux') for x in range(6))
+                    for y in range(6)))
+            world = World([board])
+            history = [snapshot(board)]
+            for edit in range(15):
+                coord = (rand.randrange(6), rand.randrange(6))
+                world.process_message({'tile_set': {
+                    'coord': coord, 'index': 0,
+                    'node': rand.choice('.-|rldxo')}})
+                history.append(snapshot(board))
+            while len(world.journal):
+                world.undo()
+            self.assertEqual(snapshot(board), history[0])
+            while world.redo():
+                pass
+            self.assertEqual(snapshot(board), history[-1])
+            fresh = Board.deserialize(board.serialize())
+            self.assertEqual(board.serialize(), fresh.serialize())
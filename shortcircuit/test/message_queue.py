@@ -1,3 +1,4 @@
+import time
 import unittest
 
 from shortcircuit.board import Board
@@ -44,5 +45,131 @@ class TestMessageQueue(unittest.TestCase):
         self.assertTrue(self.board.get(coord).output())
 
 
+class TestEngines(unittest.TestCase):
+    board_str = ("x-r-  \n"
+                 "  --r-\n"
+                 "o-u-- \n")
+
+    def testSameAsObject(self):
+        """Boards run the same whatever engine ticks them, through edits,
+        undo and switch toggles"""
+        worlds = [World([Board.deserialize(self.board_str)], engine=name)
+                  for name in ('object', 'auto', 'event', 'compiled')]
+        messages = [
+            {'tick': 5},
+            {'switch_toggle': {'coord': (0, 0), 'index': 0, 'value': True}},
+            {'tick': 3},
+            {'tile_set': {'coord': (5, 0), 'index': 0, 'node': '-'}},
+            {'tick': 1},
+            {'nand_rotate': {'coord': (4, 1), 'index': 0, 'delta': 1}},
+            {'tick': 4},
+            {'undo': 1},
+            {'tick': 40},
+        ]
+        for message in messages:
+            for world in worlds:
+                world.process_message(message)
+            expected = worlds[0].boards[0]
+            for world in worlds[1:]:
+                board = world.boards[0]
+                for coords in expected.signals():
+                    self.assertEqual(bool(board.get(coords).output()),
+                                     bool(expected.get(coords).output()),
+                                     (world.engine, message))
+
+    def testStats(self):
+        world = World([Board.deserialize(self.board_str),
+                       Board.deserialize(self.board_str)], engine='event')
+        self.assertEqual(world.stats()['boards'],
+                         [{'engine': None, 'ticks_per_second': 0.0}] * 2)
+        world.tick(10)
+        for board_stats in world.stats()['boards']:
+            self.assertEqual(board_stats['engine'], 'event')
+            self.assertGreater(board_stats['ticks_per_second'], 0)
+
+
+class TestClock(unittest.TestCase):
+    """The world can tick itself in the background"""
+    def setUp(self):
+        board_str = ("r--\n"
+                     "-x-\n"
+                     "---\n")
+        self.board = Board.deserialize(board_str)
+        self.world = World([self.board])
+
+    def tearDown(self):
+        self.world.stop()
+
+    def _wait_for_ticks(self, ticks, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.world.ticks < ticks:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def testStep(self):
+        self.world.submit({'step': 3})
+        self.world.process_queue()
+        self.assertEqual(self.world.ticks, 3)
+        self.assertFalse(self.world.running())
+
+    def testRunAndPause(self):
+        self.world.submit({'run': {'rate': None}})
+        self.world.process_queue()
+        self.assertTrue(self.world.running())
+        self._wait_for_ticks(100)
+
+        self.world.submit({'pause': True})
+        self.world.process_queue()
+        self.assertFalse(self.world.running())
+        with self.world.lock:
+            paused_ticks = self.world.ticks
+        time.sleep(0.05)
+        self.assertEqual(self.world.ticks, paused_ticks)
+
+        self.world.submit({'resume': True})
+        self.world.process_queue()
+        self._wait_for_ticks(paused_ticks + 100)
+
+    def testEditWhileRunning(self):
+        """Edits should get a look in while the clock runs flat out"""
+        self.world.run()
+        self._wait_for_ticks(10)
+        self.world.submit({'tile_set': {'coord': (0, 0),
+                                        'index': 0,
+                                        'node': '-'}})
+        self.world.process_queue()
+        self.assertIsInstance(self.board.get((0, 0)), Wire)
+
+    def testTargetRate(self):
+        self.world.run(rate=200)
+        time.sleep(0.25)
+        self.world.pause()
+        # Should be roughly 50 ticks. Be generous, machines are noisy.
+        self.assertGreater(self.world.ticks, 10)
+        self.assertLess(self.world.ticks, 80)
+
+    def testBadRate(self):
+        for rate in (0, -1, float('nan')):
+            with self.assertRaises(ValueError):
+                self.world.run(rate)
+        self.assertFalse(self.world.running())
+        self.world.run(rate=200)
+        with self.assertRaises(ValueError):
+            self.world.run(rate=0)
+        # The clock keeps going at the rate it had
+        self.assertEqual(self.world.clock.rate, 200)
+        self.assertTrue(self.world.running())
+
+    def testDeadClock(self):
+        """A clock whose thread has gone is replaced"""
+        self.world.run()
+        self.world.clock.stop()
+        self.assertFalse(self.world.running())
+        ticks = self.world.ticks
+        self.world.run()
+        self.assertTrue(self.world.running())
+        self._wait_for_ticks(ticks + 10)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,96 @@
+import random
+import unittest
+
+from shortcircuit.board import Board
+from shortcircuit.simnode import Portal
+from shortcircuit.world import World
+
+
+class PortalTest(unittest.TestCase):
+    """Portals show a tile from one board on another"""
+
+    def setUp(self):
+        self.source = Board.deserialize("x-")
+        self.board = Board.deserialize("pr-")
+        self.world = World([self.source, self.board])
+        self.world.link(1, (0, 0), 0, (0, 0))
+
+    def tearDown(self):
+        self.world.stop()
+
+    def testSerialize(self):
+        self.assertIsInstance(Board.deserialize_simnode('p'), Portal)
+        self.assertTrue(Board.deserialize_simnode('P').output())
+        self.assertEqual(Board.deserialize("pP").serialize(), "pP")
+
+    def testSameAsOneBoard(self):
+        """A NAND reading a portal behaves as if it were next to the tile the
+        portal shows"""
+        reference = Board.deserialize("xr-")
+        switch = self.source.get((0, 0))
+        for value in [False, True, True, False]:
+            switch.toggle(value)
+            reference.get((0, 0)).toggle(value)
+            self.world.tick()
+            reference.tick()
+            self.assertEqual(self.board.get((1, 0)).output(),
+                             reference.get((1, 0)).output())
+            self.assertEqual(self.board.get((2, 0)).output(),
+                             reference.get((2, 0)).output())
+
+    def testOverwritten(self):
+        self.source.get((0, 0)).toggle(True)
+        self.board.set((0, 0), Board.deserialize_simnode('x'))
+        self.world.tick()
+        self.assertFalse(self.board.get((0, 0)).output())
+
+    def testUnlink(self):
+        self.world.unlink(1, (0, 0))
+        self.source.get((0, 0)).toggle(True)
+        self.world.tick()
+        self.assertFalse(self.board.get((0, 0)).output())
+
+    def testMessage(self):
+        self.world.submit({'portal_link': {'index': 0, 'coord': [1, 0],
+                                           'target_index': 1,
+                                           'target_coord': [2, 0]}})
+        self.world.process_queue()
+        self.world.tick(2)
+        self.assertIsInstance(self.source.get((1, 0)), Portal)
+        self.assertTrue(self.source.get((1, 0)).output())
+
+
+class ParallelTickTest(unittest.TestCase):
+    """Ticking boards on several workers gives the same results as ticking
+    them one at a time"""
+
+    def make_world(self, workers):
+        rand = random.Random(0)
+        boards = [Board.deserialize('\n'.join(
+                      ''.join(rand.choice('..--|rldux') for x in range(8))
+                      for y in range(8)))
+                  for i in range(4)]
+        world = World(boards, workers)
+        for i in range(8):
+            world.link(rand.randrange(4), (rand.randrange(8), 0),
+                       rand.randrange(4), (rand.randrange(8), 7))
+        return world
+
+    def testSameAsSerial(self):
+        serial = self.make_world(1)
+        parallel = self.make_world(4)
+        for i in range(20):
+            serial.tick(3)
+            parallel.tick(3)
+            self.assertEqual([board.serialize() for board in serial.boards],
+                             [board.serialize() for board in parallel.boards])
+        parallel.stop()
+
+    def testNoLinks(self):
+        serial = World([Board.deserialize("r-\n-u") for i in range(3)])
+        parallel = World([Board.deserialize("r-\n-u") for i in range(3)], 3)
+        serial.tick(7)
+        parallel.tick(7)
+        self.assertEqual([board.serialize() for board in serial.boards],
+                         [board.serialize() for board in parallel.boards])
+        parallel.stop()
@@ -0,0 +1,115 @@
+import subprocess
+import sys
+import threading
+import unittest
+
+import shortcircuit.signalmap as signalmap
+from shortcircuit.board import Board
+from shortcircuit.world import World
+
+
+@unittest.skipIf(signalmap.shared_memory is None,
+                 'Needs multiprocessing.shared_memory')
+class SignalMapTest(unittest.TestCase):
+    board_str = ("x-r-  \n"
+                 "  --r-\n"
+                 "o-u-- \n")
+
+    def setUp(self):
+        self.world = World([Board.deserialize(self.board_str)])
+        self.publisher = self.world.share(0)
+        self.reader = signalmap.Reader(self.publisher.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.world.stop()
+
+    def assertMatches(self, frame):
+        board = self.world.boards[0]
+        self.assertEqual(frame.tick, self.world.ticks)
+        for y, row in enumerate(board.grid):
+            for x, node in enumerate(row):
+                expected = hasattr(node, 'signal') and bool(node.output())
+                self.assertEqual(frame.signal((x, y)), expected, (x, y))
+
+    def testFrames(self):
+        grid = self.world.boards[0].grid
+        self.assertEqual((self.reader.width, self.reader.height),
+                         (6, len(grid)))
+        self.assertMatches(self.reader.read())
+        for i in range(10):
+            self.world.tick()
+            self.assertMatches(self.reader.read())
+        self.world.process_message({'switch_toggle': {'coord': (0, 0),
+                                                      'index': 0,
+                                                      'value': True}})
+        self.world.tick(5)
+        self.assertMatches(self.reader.read())
+
+    def testEdits(self):
+        self.world.process_message({'tile_set': {'coord': (5, 1),
+                                                 'index': 0,
+                                                 'node': '-'}})
+        self.world.process_message({'tile_set': {'coord': (2, 2),
+                                                 'index': 0,
+                                                 'node': ' '}})
+        self.world.tick(3)
+        self.assertMatches(self.reader.read())
+
+    def testOutsideBoard(self):
+        frame = self.reader.read()
+        self.assertFalse(frame.signal((6, 0)))
+        self.assertFalse(frame.signal((-1, 0)))
+
+    def testOtherProcess(self):
+        self.world.tick(7)
+        code = ('import sys\n'
+                'import shortcircuit.signalmap as signalmap\n'
+                'reader = signalmap.Reader(sys.argv[1])\n'
+                'frame = reader.read()\n'
+                'print(frame.tick, int(frame.signal((2, 0))))\n'
+                'reader.close()\n')
+        out = subprocess.run([sys.executable, '-c', code,
+                              self.publisher.name],
+                             stdout=subprocess.PIPE, check=True).stdout
+        board = self.world.boards[0]
+        self.assertEqual(out.decode().split(),
+                         ['7', str(int(bool(board.get((2, 0)).output())))])
+        # The other process didn't free the memory when it exited
+        self.world.tick()
+        self.assertMatches(self.reader.read())
+
+    def testConsistentFrames(self):
+        """A reader never sees half of one tick and half of another"""
+        # A NAND, and the wire it feeds, which always has the same signal
+        world = World([Board.deserialize("-r-\n"
+                                         "---\n")])
+        publisher = world.share(0)
+        code = ('import sys\n'
+                'import shortcircuit.signalmap as signalmap\n'
+                'reader = signalmap.Reader(sys.argv[1])\n'
+                'wire = [(0, 0), (2, 0), (0, 1), (1, 1), (2, 1)]\n'
+                'torn = 0\n'
+                'for i in range(20000):\n'
+                '    frame = reader.read()\n'
+                '    nand = frame.signal((1, 0))\n'
+                '    torn += any(frame.signal(c) != nand for c in wire)\n'
+                'reader.close()\n'
+                'print(torn)\n')
+        stop = threading.Event()
+
+        def run():
+            while not stop.is_set():
+                world.tick()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        try:
+            out = subprocess.run([sys.executable, '-c', code,
+                                  publisher.name],
+                                 stdout=subprocess.PIPE, check=True).stdout
+        finally:
+            stop.set()
+            thread.join()
+            world.stop()
+        self.assertEqual(out.decode().strip(), '0')
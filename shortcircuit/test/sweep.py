@@ -0,0 +1,55 @@
+import os
+import unittest
+
+import shortcircuit.sweep as sweep
+from shortcircuit.board import Board
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+FULL_ADDER = os.path.join(DATA, 'full-adder.ssboard')
+
+
+class SweepTest(unittest.TestCase):
+    def setUp(self):
+        # Every combination of the full adder's inputs
+        switches = [(1, 1), (1, 5), (1, 9)]
+        vectors = [[(coords, bool(i >> bit & 1))
+                    for bit, coords in enumerate(switches)]
+                   for i in range(8)]
+        probes = [('sum', (18, 5)), ('carry', (18, 9))]
+        self.jobs = sweep.product([FULL_ADDER], vectors, 12, probes)
+
+    def expected(self, job):
+        with open(job.board) as f:
+            board = Board.deserialize(f.read())
+        for coords, value in job.settings:
+            board.get(coords).toggle(value)
+        for i in range(job.ticks):
+            board.tick()
+        return {name: board.get(coords).output()
+                for name, coords in job.probes}
+
+    def check(self, results):
+        results = sorted(results)
+        self.assertEqual([r.index for r in results], list(range(8)))
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(result.outputs, self.expected(result.job))
+            count = sum(value for _, value in result.job.settings)
+            self.assertEqual(result.outputs,
+                             {'sum': count % 2 == 1, 'carry': count >= 2})
+
+    def testInProcess(self):
+        for engine in ('object', 'compiled'):
+            self.check(sweep.sweep(self.jobs, workers=0, engine_name=engine,
+                                   chunk_size=3))
+
+    def testPool(self):
+        self.check(sweep.sweep(self.jobs, workers=2, chunk_size=3))
+
+    def testErrors(self):
+        jobs = [sweep.Job(FULL_ADDER, (((2, 2), True),), 1, ()),
+                sweep.Job('no-such-board', (), 1, ())] + self.jobs
+        results = sorted(sweep.sweep(jobs, workers=0))
+        self.assertIn('KeyError', results[0].error)
+        self.assertIn('FileNotFoundError', results[1].error)
+        self.assertTrue(all(r.error is None for r in results[2:]))
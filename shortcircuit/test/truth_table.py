@@ -0,0 +1,42 @@
+import os
+import unittest
+
+from shortcircuit.harness import Mismatch, TruthTable
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data')
+
+
+class TruthTableTest(unittest.TestCase):
+    def setUp(self):
+        self.table = TruthTable.load(os.path.join(DATA,
+                                                  'full-adder.truth.json'))
+
+    def testFullAdder(self):
+        for name in ('fastest', 'auto', 'object', 'compiled'):
+            self.assertEqual(self.table.run(name), [], name)
+
+    def testMismatch(self):
+        # Claim 1 + 1 has no carry
+        self.table.vectors[3] = self.table._normalise([1, 1, 0, 0, 0])
+        expected = [Mismatch(3, 'carry', False, True)]
+        self.assertEqual(self.table.run('compiled'), expected)
+        self.assertEqual(self.table.run('object'), expected)
+        self.assertEqual(self.table.run('auto'), expected)
+
+    def testDontCare(self):
+        self.table.vectors[3] = self.table._normalise([1, 1, 0, None, 0])
+        self.assertEqual(len(self.table.run()), 1)
+
+    def testSequential(self):
+        board_str = "x-r-\n"
+        table = TruthTable(board_str, {'in': (0, 0)}, {'out': (3, 0)}, [
+            {'inputs': {'in': 1}, 'expect': {'out': 0}},
+            # Nothing changes if no inputs change
+            {'expect': {'out': 0}},
+            {'inputs': {'in': 0}, 'expect': {'out': 1}},
+        ], ticks=2, sequential=True)
+        self.assertEqual(table.run(), [])
+
+    def testBadVector(self):
+        with self.assertRaises(ValueError):
+            self.table._normalise([1, 0])
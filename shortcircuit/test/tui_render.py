@@ -0,0 +1,119 @@
+import unittest
+
+from shortcircuit.board import Board
+from shortcircuit.render import FrameBuffer, Viewport, block_densities
+
+
+def frame(*rows):
+    """Builds a frame from strings, with every glyph the same color"""
+    return [[(glyph, 1) for glyph in row] for row in rows]
+
+
+class FrameBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.fb = FrameBuffer(max_gap=1)
+        self.fb.diff(frame("-----",
+                           "-----"))
+
+    def testFirstFrameIsFull(self):
+        full, runs = FrameBuffer().diff(frame("ab"))
+        self.assertTrue(full)
+        self.assertEqual(runs, [(0, 0, [('a', 1), ('b', 1)])])
+
+    def testNoChanges(self):
+        full, runs = self.fb.diff(frame("-----",
+                                        "-----"))
+        self.assertFalse(full)
+        self.assertEqual(runs, [])
+
+    def testSingleChange(self):
+        full, runs = self.fb.diff(frame("-----",
+                                        "--x--"))
+        self.assertFalse(full)
+        self.assertEqual(runs, [(2, 1, [('x', 1)])])
+
+    def testColorChange(self):
+        new = frame("-----",
+                    "-----")
+        new[0][4] = ('-', 8)
+        _, runs = self.fb.diff(new)
+        self.assertEqual(runs, [(4, 0, [('-', 8)])])
+
+    def testSmallGapsAreJoined(self):
+        _, runs = self.fb.diff(frame("x-x--",
+                                     "-----"))
+        self.assertEqual(runs, [(0, 0, [('x', 1), ('-', 1), ('x', 1)])])
+
+    def testLargeGapsAreSplit(self):
+        _, runs = self.fb.diff(frame("x---x",
+                                     "-----"))
+        self.assertEqual(runs, [(0, 0, [('x', 1)]),
+                                (4, 0, [('x', 1)])])
+
+    def testResizeIsFull(self):
+        full, _ = self.fb.diff(frame("------",
+                                     "------"))
+        self.assertTrue(full)
+
+    def testInvalidate(self):
+        self.fb.invalidate()
+        full, _ = self.fb.diff(frame("-----",
+                                     "-----"))
+        self.assertTrue(full)
+
+
+class ViewportTest(unittest.TestCase):
+    def setUp(self):
+        self.vp = Viewport(10, 5, margin=2)
+
+    def testNoScrollNearOrigin(self):
+        self.vp.follow((3, 2))
+        self.assertEqual((self.vp.x, self.vp.y), (0, 0))
+
+    def testScrollRight(self):
+        self.vp.follow((8, 0))
+        # Should keep a margin of two cells to the right of the cursor
+        self.assertEqual(self.vp.x, 1)
+        self.assertEqual(self.vp.to_screen((8, 0)), (7, 0))
+
+    def testScrollBack(self):
+        self.vp.follow((100, 100))
+        self.vp.follow((50, 50))
+        self.assertEqual(self.vp.to_screen((50, 50)), (2, 2))
+
+    def testNeverNegative(self):
+        self.vp.follow((100, 100))
+        self.vp.follow((0, 0))
+        self.assertEqual((self.vp.x, self.vp.y), (0, 0))
+
+    def testZoomedTiles(self):
+        self.vp.zoom(4)
+        self.vp.follow((100, 0))
+        x0, y0, x1, y1 = self.vp.tiles()
+        self.assertEqual(x0 % 4, 0)
+        self.assertEqual(x1 - x0, 40)
+        self.assertEqual(y1 - y0, 20)
+        self.assertTrue(x0 <= 100 < x1)
+        self.assertEqual(self.vp.to_screen((100, 0))[0], 7)
+
+
+class BlockDensityTest(unittest.TestCase):
+    def setUp(self):
+        self.board = Board.deserialize("o-..\n"
+                                       "x...\n"
+                                       "....\n"
+                                       "...x\n")
+
+    def testBlocks(self):
+        blocks = block_densities(self.board.grid, 0, 0, 2, 2, 2)
+        self.assertEqual(blocks, [[(3, 2), (0, 0)],
+                                  [(0, 0), (1, 0)]])
+
+    def testPastTheEdge(self):
+        blocks = block_densities(self.board.grid, 2, 2, 2, 2, 2)
+        self.assertEqual(blocks, [[(1, 0), (0, 0)],
+                                  [(0, 0), (0, 0)]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import os
+import tempfile
+import unittest
+
+from shortcircuit.board import Board
+from shortcircuit.waveform import Recorder, vcd_identifier
+from shortcircuit.world import World
+
+
+class VcdIdentifierTest(unittest.TestCase):
+    def testUnique(self):
+        ids = [vcd_identifier(i) for i in range(10000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids[0], '!')
+        self.assertTrue(all(' ' not in i for i in ids))
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        # A NAND looped back on itself flips every tick. The switch never
+        # changes.
+        board_str = ("r-\n"
+                     "--\n"
+                     "  \n"
+                     "x \n")
+        self.board = Board.deserialize(board_str)
+        self.world = World([self.board])
+        self.probes = {'clk': (0, 0), 'sw': (0, 3)}
+
+    def testChangesOnly(self):
+        recorder = Recorder.for_board(self.board, self.probes)
+        self.world.record(recorder)
+        self.world.tick(4)
+        self.assertEqual(recorder.trace('clk'),
+                         [(0, False), (1, True), (2, False), (3, True),
+                          (4, False)])
+        self.assertEqual(recorder.trace('sw'), [(0, False)])
+
+    def testHistory(self):
+        recorder = Recorder.for_board(self.board, self.probes, history=3)
+        self.world.record(recorder)
+        self.world.tick(20)
+        self.assertLess(len(recorder.changes), 6)
+        trace = recorder.trace('clk')
+        self.assertEqual(trace[-1], (20, False))
+        # The values the trimmed changes left behind are kept
+        self.assertEqual([v for t, v in trace],
+                         [t % 2 == 1 for t, v in trace])
+
+    def testVcd(self):
+        recorder = Recorder.for_board(self.board, self.probes)
+        self.world.record(recorder)
+        self.world.tick(2)
+        self.world.stop_recording(recorder)
+        self.world.tick(2)
+
+        f = io.StringIO()
+        recorder.write_vcd(f)
+        vcd = f.getvalue()
+        self.assertIn('$var wire 1 ! clk $end', vcd)
+        self.assertIn('$var wire 1 " sw $end', vcd)
+        body = vcd.split('$enddefinitions $end\n')[1]
+        self.assertEqual(body, '#0\n$dumpvars\n0!\n0"\n$end\n'
+                               '#1\n1!\n#2\n0!\n')
+
+    def testStreamedVcdMatches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.vcd')
+            streamed = Recorder.for_board(self.board, self.probes, path=path)
+            memory = Recorder.for_board(self.board, self.probes)
+            self.world.record(streamed)
+            self.world.record(memory)
+            self.world.tick(5)
+            self.world.stop_recording(streamed)
+            self.world.stop_recording(memory)
+
+            f = io.StringIO()
+            memory.write_vcd(f)
+            with open(path) as vcd:
+                streamed_body = vcd.read().split('$enddefinitions')[1]
+            self.assertEqual(streamed_body,
+                             f.getvalue().split('$enddefinitions')[1])
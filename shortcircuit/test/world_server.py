@@ -0,0 +1,217 @@
+import asyncio
+import json
+import unittest
+
+from shortcircuit.board import Board
+from shortcircuit.server import WorldServer, signal_diff
+from shortcircuit.simnode import Portal, Wire
+from shortcircuit.world import World
+
+
+class SignalDiffTest(unittest.TestCase):
+    def testChanged(self):
+        old = {(0, 0): False, (1, 0): True}
+        new = {(0, 0): True, (1, 0): True}
+        self.assertEqual(signal_diff(old, new), [[0, 0, True]])
+
+    def testRemoved(self):
+        old = {(0, 0): False, (1, 0): True}
+        new = {(0, 0): False}
+        self.assertEqual(signal_diff(old, new), [[1, 0, None]])
+
+
+class WorldServerTest(unittest.TestCase):
+    """Drives a server over a real local socket"""
+
+    def setUp(self):
+        board_str = ("r--\n"
+                     "-x-\n"
+                     "---\n")
+        self.board = Board.deserialize(board_str)
+        self.world = World([self.board])
+
+    def _run(self, session):
+        """Runs `session(connect)` against a fresh server, where `connect`
+        opens a new client connection."""
+        async def run():
+            server = WorldServer(self.world, tick_chunk=3)
+            await server.start()
+            listener = await server.serve_tcp('127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+
+            async def connect():
+                return await asyncio.open_connection('127.0.0.1', port)
+            try:
+                return await session(server, connect)
+            finally:
+                listener.close()
+                await listener.wait_closed()
+                await server.stop()
+
+        return asyncio.run(asyncio.wait_for(run(), 5))
+
+    @staticmethod
+    def _send(writer, message):
+        writer.write((json.dumps(message) + '\n').encode())
+
+    @staticmethod
+    async def _recv(reader):
+        return json.loads(await reader.readline())
+
+    def testSetTile(self):
+        async def session(server, connect):
+            reader, writer = await connect()
+            self._send(writer, {'tile_set': {'coord': [0, 0],
+                                             'index': 0,
+                                             'node': '-'}})
+            self._send(writer, {'board': {'index': 0}})
+            return await self._recv(reader)
+
+        reply = self._run(session)
+        self.assertIsInstance(self.board.get((0, 0)), Wire)
+        self.assertEqual(reply['board']['data'], self.board.serialize())
+
+    def testSubscriptionSnapshot(self):
+        """Subscribing should send the state of every tile"""
+        async def session(server, connect):
+            reader, writer = await connect()
+            self._send(writer, {'subscribe': {'index': 0}})
+            return await self._recv(reader)
+
+        reply = self._run(session)
+        changes = reply['signals']['changes']
+        self.assertEqual(len(changes), len(self.board.signals()))
+
+    def testSubscriptionDiff(self):
+        """Edits from one client should be streamed to another as diffs"""
+        async def session(server, connect):
+            watch_reader, watch_writer = await connect()
+            self._send(watch_writer, {'subscribe': {'index': 0}})
+            await self._recv(watch_reader)
+
+            _, edit_writer = await connect()
+            self._send(edit_writer, {'switch_toggle': {'coord': [1, 1],
+                                                       'index': 0,
+                                                       'value': True}})
+            self._send(edit_writer, {'tick': 1})
+            return [await self._recv(watch_reader),
+                    await self._recv(watch_reader)]
+
+        toggled, ticked = self._run(session)
+        self.assertEqual(toggled['signals']['changes'], [[1, 1, True]])
+        self.assertEqual(ticked['signals']['tick'], 1)
+        self.assertIn([0, 0, True], ticked['signals']['changes'])
+
+    def testBackgroundTicking(self):
+        """Long runs are chunked, so edits can land in the middle of them"""
+        async def session(server, connect):
+            reader, writer = await connect()
+            self._send(writer, {'subscribe': {'index': 0}})
+            await self._recv(reader)
+            self._send(writer, {'tick': 10})
+            ticks = []
+            while sum(ticks) < 10:
+                reply = await self._recv(reader)
+                ticks.append(reply['signals']['tick'] - sum(ticks))
+            return ticks
+
+        ticks = self._run(session)
+        self.assertEqual(ticks, [3, 3, 3, 1])
+
+    def testStep(self):
+        """Steps are chunked like ticks, and stop the clock"""
+        async def session(server, connect):
+            # Ticks once straight away, then not for another quarter second
+            self.world.run(rate=4)
+            while not self.world.ticks:
+                await asyncio.sleep(0.001)
+            reader, writer = await connect()
+            self._send(writer, {'subscribe': {'index': 0}})
+            start = (await self._recv(reader))['signals']['tick']
+            self._send(writer, {'step': 10})
+            ticks = []
+            while sum(ticks) < 10:
+                reply = await self._recv(reader)
+                ticks.append(reply['signals']['tick'] - start - sum(ticks))
+            return ticks
+
+        ticks = self._run(session)
+        self.assertFalse(self.world.running())
+        self.assertEqual(ticks, [3, 3, 3, 1])
+
+    def testBadTickCounts(self):
+        async def session(server, connect):
+            reader, writer = await connect()
+            messages = [{'tick': 0}, {'tick': -5}, {'step': 0},
+                        {'step': -5}]
+            for message in messages:
+                self._send(writer, message)
+            replies = [await self._recv(reader) for message in messages]
+            return replies, server.pending_ticks
+
+        replies, pending = self._run(session)
+        for reply in replies:
+            self.assertIn('error', reply)
+        self.assertEqual(pending, 0)
+        self.assertEqual(self.world.ticks, 0)
+
+    def testUndoRedo(self):
+        async def session(server, connect):
+            reader, writer = await connect()
+            self._send(writer, {'tile_set': {'coord': [0, 0],
+                                             'index': 0,
+                                             'node': '-'}})
+            self._send(writer, {'undo': 1})
+            self._send(writer, {'board': {'index': 0}})
+            undone = await self._recv(reader)
+            self._send(writer, {'redo': 1})
+            self._send(writer, {'board': {'index': 0}})
+            return undone, await self._recv(reader)
+
+        original = self.board.serialize()
+        undone, redone = self._run(session)
+        self.assertEqual(undone['board']['data'], original)
+        self.assertIsInstance(self.board.get((0, 0)), Wire)
+        self.assertEqual(redone['board']['data'], self.board.serialize())
+
+    def testPortalLink(self):
+        async def session(server, connect):
+            reader, writer = await connect()
+            self._send(writer, {'portal_link': {'coord': [2, 0],
+                                                'index': 0,
+                                                'target_index': 0,
+                                                'target_coord': [1, 1]}})
+            self._send(writer, {'board': {'index': 0}})
+            return await self._recv(reader)
+
+        reply = self._run(session)
+        self.assertIn('board', reply)
+        self.assertIsInstance(self.board.get((2, 0)), Portal)
+        self.assertEqual(self.world.links, {(0, (2, 0)): (0, (1, 1))})
+
+    def testClockDomain(self):
+        async def session(server, connect):
+            reader, writer = await connect()
+            self._send(writer, {'clock_domain': {'index': 0, 'period': 4}})
+            self._send(writer, {'board': {'index': 0}})
+            return await self._recv(reader)
+
+        reply = self._run(session)
+        self.assertIn('board', reply)
+        self.assertEqual(self.world.periods, {0: 4})
+
+    def testBadMessage(self):
+        async def session(server, connect):
+            reader, writer = await connect()
+            writer.write(b'not json\n')
+            self._send(writer, {'nonsense': True})
+            self._send(writer, {'tile_set': {'coord': [0, 0]}})
+            return [await self._recv(reader) for i in range(3)]
+
+        replies = self._run(session)
+        for reply in replies:
+            self.assertIn('error', reply)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,17 +6,37 @@ from blessed import Terminal
 from blessed.keyboard import Keystroke
 
 import shortcircuit.util as util
+from shortcircuit.render import FrameBuffer, Viewport, block_densities
 from shortcircuit.simnode import Nand, Wire, WireBridge, Switch
 
 logger = logging.getLogger()
 
 
 class TermUI:
+    # Tiles per screen cell for each zoom level
+    zoom_levels = (1, 4, 16)
+
+    # Indexed by the board's neighbour mask, which has a bit for each
+    # neighbour in the order up, right, down, left.
+    wire_glyphs = [
+        'o', '╹', '╺', '┗',
+        '╻', '┃', '┏', '┣',
+        '╸', '┛', '━', '┻',
+        '┓', '┫', '┳', '╋'
+    ]
+
     def __init__(self, args, world):
         self.args = args
         self.t = Terminal()
         self.world = world
         self.cursor_pos = (0, 0)
+        # What is currently on the terminal
+        self.frame_buffer = FrameBuffer()
+        self.term_size = None
+        # The part of the board which is on screen
+        self.viewport = Viewport(self.t.width - 1, self.t.height - 1)
+        # Colors to use for dead/alive signal
+        self.colors = [8, 1]
 
     def start(self):
         """Start the UI and block until the UI is closed."""
@@ -35,21 +55,7 @@ class TermUI:
     def _get_fancy_glyph(self, board, coords, node):
         """Gets a fancy glyph for a SimNode. Takes neighbours into account."""
         if isinstance(node, Wire):
-            # 4-bit indexed based on neighbours.
-            wire_glyphs = [
-                'o', '╸', '╺', '━',
-                '╹', '┛', '┗', '┻',
-                '╻', '┓', '┏', '┳',
-                '┃', '┫', '┣', '╋'
-            ]
-
-            connecting_neighbour = [board.get(c) is not None
-                                    for c in util.neighbour_coords(coords)]
-            index = (1 * connecting_neighbour[3] +
-                     2 * connecting_neighbour[1] +
-                     4 * connecting_neighbour[0] +
-                     8 * connecting_neighbour[2])
-            return wire_glyphs[index]
+            return self.wire_glyphs[board.neighbour_mask(coords)]
         elif isinstance(node, WireBridge):
             # Other possibilities:
             # ['┇', '╏']
@@ -57,38 +63,134 @@ class TermUI:
         else:
             return node.serialize()
 
-    def render(self, board):
-        """Renders a board onto the current terminal"""
-        print(self.t.clear())
-        print(self.t.move(0, 0), end='')
+    def _build_frame(self, board):
+        """Works out what every cell on screen should look like. Only the
+        tiles within the viewport are looked at.
+
+        Returns : list
+          A frame, as understood by `FrameBuffer`.
+        """
+        if self.viewport.scale == 1:
+            frame = self._build_board_frame(board)
+        else:
+            frame = self._build_minimap_frame(board)
+
+        stats = self.world.stats()
+        status = (f'tick {stats["ticks"]} | '
+                  f'{self.cursor_pos[0]},{self.cursor_pos[1]}')
+        if self.viewport.scale != 1:
+            status += f' | zoom 1:{self.viewport.scale}'
+        if stats['running']:
+            status += f' | {stats["ticks_per_second"]:.0f} ticks/s'
+            engine_name = stats['boards'][0]['engine']
+            if engine_name is not None:
+                status += f' ({engine_name})'
+        # Keep the status line the same width every frame, so stale
+        # characters get overwritten
+        width = self.viewport.width
+        status = status.ljust(width)[:width]
+        frame.append([(c, self.colors[0]) for c in status])
+
+        return frame
+
+    def _build_board_frame(self, board):
+        colors = self.colors
+        x0, y0, x1, y1 = self.viewport.tiles()
+        blank = [(' ', None)] * self.viewport.width
+
+        frame = []
+        for y in range(y0, y1):
+            if y >= len(board.grid):
+                frame.append(blank)
+                continue
+            row = []
+            for x, node in enumerate(board.grid[y][x0:x1], x0):
+                if node is None:
+                    row.append(('.', None))
+                    continue
+                if self.args.box_draw:
+                    glyph = self._get_fancy_glyph(board, (x, y), node)
+                else:
+                    glyph = node.serialize()
+                row.append((glyph, colors[node.output()]))
+            # Pad out past the right edge of the board
+            row += blank[len(row):]
+            frame.append(row)
+        return frame
+
+    def _build_minimap_frame(self, board):
+        """Each cell shows how much of its block of tiles is switched on."""
+        vp = self.viewport
+        blocks = block_densities(board.grid, vp.x, vp.y,
+                                 vp.width, vp.height, vp.scale)
+        shades = ['░', '▒', '▓', '█']
+
+        frame = []
+        for row in blocks:
+            cells = []
+            for occupied, on in row:
+                if occupied == 0:
+                    cells.append(('.', None))
+                elif on == 0:
+                    cells.append((shades[0], self.colors[0]))
+                else:
+                    shade = shades[(on * (len(shades) - 1) - 1) // occupied
+                                   + 1]
+                    cells.append((shade, self.colors[1]))
+            frame.append(cells)
+        return frame
 
+    def render(self, board):
+        """Renders a board onto the current terminal. Only the cells which
+        changed since the last render are redrawn."""
         board = self.world.boards[0]
 
         # DEBUG For super ghetto rendering...
         # print(board.serialize())
 
-        # Colors to use for dead/alive signal
-        colors = [8, 1]
-        for y in range(len(board.grid)):
-            for x in range(len(board.grid[y])):
-                coords = (x, y)
-                node = board.get(coords)
-                try:
-                    if self.args.box_draw:
-                        glyph = self._get_fancy_glyph(board, coords, node)
+        size = (self.t.width, self.t.height)
+        if size != self.term_size:
+            self.term_size = size
+            self.frame_buffer.invalidate()
+            # Leave the last row for the status line, and the last column
+            # empty so we never make the terminal wrap
+            self.viewport.resize(self.t.width - 1, self.t.height - 1)
+        self.viewport.follow(self.cursor_pos)
+
+        full, runs = self.frame_buffer.diff(self._build_frame(board))
+
+        # Build the whole frame up and write it out in one go
+        out = []
+        if full:
+            out.append(self.t.home + self.t.clear)
+        # The terminal remembers the color across cursor movements, so we
+        # only need to send it when it changes
+        current_color = None
+        out.append(self.t.normal)
+        for x, y, cells in runs:
+            out.append(self.t.move_yx(y, x))
+            for glyph, color in cells:
+                if color != current_color:
+                    current_color = color
+                    if color is None:
+                        out.append(self.t.normal)
                     else:
-                        glyph = node.serialize()
-                    glyph = self.t.color(colors[node.output()])(glyph)
-                except AttributeError:
-                    glyph = '.'
-                print(glyph, end='')
-            print('')
+                        out.append(self.t.color(color))
+                out.append(glyph)
 
         # Move the cursor to the cursor position
-        # Can change this to be smarter if we ever have a viewport
-        print(self.t.move(self.cursor_pos[1], self.cursor_pos[0]), end='')
+        cursor_x, cursor_y = self.viewport.to_screen(self.cursor_pos)
+        out.append(self.t.move_yx(cursor_y, cursor_x))
+        sys.stdout.write(''.join(out))
         sys.stdout.flush()
 
+    def _clamp_to_board(self, coords):
+        grid = self.world.boards[0].grid
+        x, y = coords
+        y = max(0, min(y, len(grid) - 1))
+        x = max(0, min(x, len(grid[y]) - 1))
+        return (x, y)
+
     def _obj_under_cursor(self):
         return self.world.boards[0].get(self.cursor_pos)
 
@@ -110,10 +212,16 @@ class TermUI:
             return {'move': (-1, 0)}
         elif inp == 'l' or inp.name == 'KEY_RIGHT':
             return {'move': (1, 0)}
+        elif inp == 'm':
+            return {'zoom': True}
         elif inp == 'q':
             return {'quit': True}
         elif inp == '.':
             return {'tick': 1}
+        elif inp == 'r':  # Run/pause the clock
+            if self.world.running():
+                return {'pause': True}
+            return {'run': {'rate': self.args.rate}}
         elif inp == ' ':  # Wire / delete
             node = '-' if self._obj_under_cursor() is None else '.'
             return {'tile_set': {'coord': self.cursor_pos,
@@ -144,6 +252,11 @@ class TermUI:
                                  'index': 0,
                                  'node': '|'}}
 
+        elif inp == 'u':
+            return {'undo': 1}
+        elif inp == 'U':
+            return {'redo': 1}
+
         elif inp == 'x':  # Examine tile under cursor
             logger.info(repr(self._obj_under_cursor()))
 
@@ -157,11 +270,17 @@ class TermUI:
 
     def editor_loop(self):
         while True:
-            # Just render the first board for now
-            self.render(self.world.boards[0])
+            # Just render the first board for now. The clock may be ticking
+            # in the background, so hold still while we look at it.
+            with self.world.lock:
+                self.render(self.world.boards[0])
 
-            # Get input
-            inp = self.t.inkey()
+            # Get input. If the clock is running, give up waiting after a
+            # frame so we can show the latest state.
+            timeout = 1 / self.args.fps if self.world.running() else None
+            inp = self.t.inkey(timeout=timeout)
+            if not inp:
+                continue
             logger.debug('Key Input: ' + repr(inp))
 
             ui_event = self.key_to_event(inp)
@@ -169,14 +288,24 @@ class TermUI:
                 continue
 
             move_delta = ui_event.get('move')
+            zoom = ui_event.get('zoom')
             quit = ui_event.get('quit')
             write_board = ui_event.get('write_board')
 
             if move_delta:
-                new_pos = util.add(self.cursor_pos, move_delta)
-                if min(new_pos) >= 0:
-                    self.cursor_pos = new_pos
+                # When zoomed out, move a whole block at a time
+                scale = self.viewport.scale
+                new_pos = util.add(self.cursor_pos,
+                                   (move_delta[0] * scale,
+                                    move_delta[1] * scale))
+                self.cursor_pos = self._clamp_to_board(new_pos)
+            elif zoom:
+                levels = self.zoom_levels
+                scale = levels[(levels.index(self.viewport.scale) + 1) %
+                               len(levels)]
+                self.viewport.zoom(scale)
             elif quit:
+                self.world.stop()
                 return
             elif write_board:
                 index = write_board['index']
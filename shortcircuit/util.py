@@ -13,12 +13,78 @@ def invert(tup):
     a, b = tup
     return (-a, -b)
 
+
+def linear_index(coords, width):
+    """Index of some coords in a flat, row-major array `width` wide."""
+    return coords[1] * width + coords[0]
+
+
+def linear_coords(index, width):
+    """Inverse of `linear_index`."""
+    y, x = divmod(index, width)
+    return (x, y)
+
 # Board releated
 
 
+# The four directions, in the order up, right, down, left. A NAND's facing is
+# an index into this. These are shared, so they must never be mutated.
+NEIGHBOUR_DELTAS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+# The delta pointing back the way each of the above came
+INVERTED_DELTAS = tuple(invert(d) for d in NEIGHBOUR_DELTAS)
+# Index of the opposite direction of each direction
+OPPOSITE = (2, 3, 0, 1)
+
+
 def neighbour_deltas():
-    return [(0, -1), (1, 0), (0, 1), (-1, 0)]
+    return NEIGHBOUR_DELTAS
 
 
 def neighbour_coords(coords):
-    return [add(coords, x) for x in neighbour_deltas()]
+    x, y = coords
+    return ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y))
+
+
+def linear_neighbour_offsets(width):
+    """Like `neighbour_deltas`, but for a flat, row-major array `width` wide.
+    Adding these to an index gives the index of each neighbour (callers must
+    check they haven't walked off an edge)."""
+    return (-width, 1, width, -1)
+
+
+class LazyRows(list):
+    """A list of rows which are each made the first time they're looked at,
+    and kept from then on. Indexing, slicing and iterating all make whatever
+    rows they touch, so it can stand in for a grid which is a list of lists.
+
+    Parameters
+    ----------
+
+    count : int
+      How many rows there are.
+    make : function
+      Called with the index of a row to make it.
+    """
+
+    def __init__(self, count, make):
+        super().__init__([None] * count)
+        self.make = make
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[y] for y in range(*i.indices(len(self)))]
+        row = super().__getitem__(i)
+        if row is None:
+            if i < 0:
+                i += len(self)
+            row = self.make(i)
+            super().__setitem__(i, row)
+        return row
+
+    def __iter__(self):
+        for y in range(len(self)):
+            yield self[y]
+
+    def made(self):
+        """How many of the rows have been made so far."""
+        return sum(1 for row in super().__iter__() if row is not None)
@@ -0,0 +1,176 @@
+import datetime
+import re
+
+
+def vcd_identifier(i):
+    """A short VCD identifier code for the `i`th variable, made from the
+    printable ASCII characters `!` to `~`."""
+    chars = []
+    while True:
+        i, r = divmod(i, 94)
+        chars.append(chr(33 + r))
+        if i == 0:
+            return ''.join(chars)
+        i -= 1
+
+
+def vcd_header(names, scope='board', date=None):
+    """The declarations section of a VCD file, up to and including
+    `$enddefinitions`, for a set of one bit signals."""
+    if date is None:
+        date = datetime.datetime.now().isoformat(timespec='seconds')
+    lines = [
+        f'$date {date} $end',
+        '$version short-circuit $end',
+        # There's no real unit of time in a simulation, so one tick is one ns
+        '$timescale 1 ns $end',
+        f'$scope module {scope} $end',
+    ]
+    for i, name in enumerate(names):
+        # Names can't contain whitespace
+        name = re.sub(r'\s+', '_', str(name))
+        lines.append(f'$var wire 1 {vcd_identifier(i)} {name} $end')
+    lines += ['$upscope $end', '$enddefinitions $end', '']
+    return '\n'.join(lines)
+
+
+class Recorder:
+    """Records the signals of some probes every tick.
+
+    Only changes are stored. They are either streamed straight out to a VCD
+    file (so runs of any length can be recorded), or kept in memory, where
+    `history` can be used to cap how many changes are kept.
+
+    Parameters
+    ----------
+
+    probes : dict
+      name -> coords of each signal to record. A list of coords may be given
+      instead, in which case they are named after their coords.
+    read : function
+      Takes coords, and returns the signal there. See `for_board`.
+    path : str
+      If given, changes are written to a VCD file here instead of being kept
+      in memory. `close()` must be called once recording is finished.
+    history : int
+      Roughly the most changes to keep in memory (up to twice this many are
+      held between trims), or None for no limit. The oldest changes are
+      folded into the starting values.
+    """
+
+    def __init__(self, probes, read, path=None, history=None):
+        if not isinstance(probes, dict):
+            probes = {f'{x}_{y}': (x, y) for (x, y) in probes}
+        self.names = list(probes)
+        self.coords = [tuple(c) for c in probes.values()]
+        self.read = read
+        self.history = history
+
+        # The tick and values that `changes` starts from
+        self.start_tick = None
+        self.start_values = None
+        # The latest value of each signal
+        self.values = None
+        # (tick, index, value)
+        self.changes = []
+
+        self.file = None
+        if path is not None:
+            self.file = open(path, 'w', buffering=1 << 16)
+            self.file.write(vcd_header(self.names))
+        self._ids = [vcd_identifier(i) for i in range(len(self.names))]
+        self.last_tick = None
+        # The last tick written to the file
+        self._written_tick = None
+
+    @classmethod
+    def for_board(cls, board, probes, **kwargs):
+        """A recorder which reads the SimNodes on a board."""
+        def read(coords):
+            node = board.get(coords)
+            return node is not None and bool(node.output())
+        return cls(probes, read, **kwargs)
+
+    def sample(self, tick):
+        """Reads every probe, and records any which have changed since the
+        last sample."""
+        read = self.read
+        values = [bool(read(coords)) for coords in self.coords]
+        self.last_tick = tick
+
+        if self.values is None:
+            self.start_tick = tick
+            self.start_values = values
+            self.values = list(values)
+            if self.file is not None:
+                self._written_tick = tick
+                self.file.write(f'#{tick}\n$dumpvars\n')
+                self.file.writelines(f'{int(v)}{ident}\n' for v, ident
+                                     in zip(values, self._ids))
+                self.file.write('$end\n')
+            return
+
+        old = self.values
+        if values == old:
+            return
+
+        changed = [i for i, (a, b) in enumerate(zip(old, values)) if a != b]
+        self.values = values
+        if self.file is not None:
+            self._written_tick = tick
+            self.file.write(f'#{tick}\n')
+            self.file.writelines(f'{int(values[i])}{self._ids[i]}\n'
+                                 for i in changed)
+            return
+
+        self.changes.extend((tick, i, values[i]) for i in changed)
+        # Trimming one change at a time would be quadratic, so let the buffer
+        # grow to double its size between trims
+        if self.history is not None and \
+                len(self.changes) >= 2 * self.history:
+            self._trim()
+
+    def _trim(self):
+        drop = len(self.changes) - self.history
+        for tick, i, value in self.changes[:drop]:
+            self.start_values[i] = value
+            self.start_tick = tick
+        del self.changes[:drop]
+
+    def trace(self, name):
+        """The changes recorded for one probe, as (tick, value) pairs,
+        starting with its first recorded value."""
+        i = self.names.index(name)
+        trace = [(self.start_tick, self.start_values[i])]
+        trace += [(tick, value) for tick, j, value in self.changes if j == i]
+        return trace
+
+    def write_vcd(self, f):
+        """Writes what has been recorded in memory to a file object, as
+        VCD."""
+        f.write(vcd_header(self.names))
+        if self.values is None:
+            return
+        f.write(f'#{self.start_tick}\n$dumpvars\n')
+        f.writelines(f'{int(v)}{ident}\n' for v, ident
+                     in zip(self.start_values, self._ids))
+        f.write('$end\n')
+
+        tick = self.start_tick
+        for change_tick, i, value in self.changes:
+            if change_tick != tick:
+                tick = change_tick
+                f.write(f'#{tick}\n')
+            f.write(f'{int(value)}{self._ids[i]}\n')
+        if self.last_tick != tick:
+            f.write(f'#{self.last_tick}\n')
+
+    def close(self):
+        """Finishes off the VCD file, if we're streaming to one."""
+        if self.file is not None:
+            if self.last_tick != self._written_tick:
+                # Mark how long the recording ran for, even if nothing changed
+                # at the end
+                self.file.write(f'#{self.last_tick}\n')
+            self.file.close()
+            self.file = None
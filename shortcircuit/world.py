@@ -1,15 +1,75 @@
+import concurrent.futures
 import queue
 import logging
+import threading
+import time
 
+import shortcircuit.engine as engine
 from shortcircuit.board import Board
+from shortcircuit.journal import Journal
+from shortcircuit.signalmap import Publisher
+from shortcircuit.simnode import Portal
 
 logger = logging.getLogger()
 
 
 class World:
-    def __init__(self, boards):
+    """A set of boards, and everything which happens to them.
+
+    Boards are linked to each other by portals (see `link`). During a tick
+    every board only reads its own nodes, and the portals' signals are passed
+    across in between ticks, so the boards can be ticked by separate workers.
+
+    Parameters
+    ----------
+
+    boards : list
+      The boards in the world. Messages refer to them by index.
+    workers : int
+      How many threads to tick the boards with. 1 ticks them one after the
+      other. Ticking SimNodes is pure Python, so more only helps where the
+      interpreter can run threads at the same time.
+    engine : str
+      The engine to tick each board with (see `engine.create`). `auto` picks
+      one for each board by trying them, and `object` ticks the SimNodes
+      directly. Whichever it is, the SimNodes are up to date after every
+      tick.
+    """
+
+    def __init__(self, boards, workers=1, engine='auto'):
         self.boards = boards
+        self.workers = workers
+        self.executor = None
+        self.engine = engine
+        # index -> (Engine, the board's version when it was created), for
+        # each board which has been ticked. Rebuilt whenever the board
+        # changes.
+        self.engines = {}
+        # index -> [ticks, seconds, ticks per second], for measuring how fast
+        # each board's engine is going
+        self.timings = {}
+        # (index, coords) of each portal -> (index, coords) of the tile it
+        # shows
+        self.links = {}
+        # index -> period of each board which is in a slower clock domain.
+        # See `set_period`.
+        self.periods = {}
         self.queue = queue.Queue()
+        # Held while the boards are being read or modified. The clock ticks
+        # from its own thread, so anything looking at the boards while it
+        # might be running (eg, a renderer) should hold this too.
+        self.lock = threading.RLock()
+        # Total number of ticks since the world was created
+        self.ticks = 0
+        self.clock = None
+        # Sampled after every tick. See `waveform.Recorder`.
+        self.recorders = []
+        # Written to after every call to `tick`. See `share`.
+        self.publishers = []
+        # Edits to the boards, for undo and redo
+        self.journal = Journal()
+        # Logs every edit to disk, if set. See `editlog.EditLog`.
+        self.log = None
 
     def submit(self, arg):
         """Submits a message into the message queue."""
@@ -24,40 +84,497 @@ class World:
     def process_queue(self):
         """Reads a single message from the queue."""
         message = self.queue.get()
+        self.process_message(message)
+
+    def process_message(self, message):
+        """Applies a single message to the world."""
         logger.info(f"Got message: {message}")
 
         tile_set = message.get('tile_set')
         nand_rotate = message.get('nand_rotate')
         tick = message.get('tick')
         switch_toggle = message.get('switch_toggle')
+        run = message.get('run')
+        pause = message.get('pause')
+        resume = message.get('resume')
+        step = message.get('step')
+        portal_link = message.get('portal_link')
+        clock_domain = message.get('clock_domain')
+        undo = message.get('undo')
+        redo = message.get('redo')
 
-        if tile_set:
-            node = Board.deserialize_simnode(tile_set['node'])
-            coord = tile_set['coord']
-            index = tile_set['index']
-            self.boards[index].set(coord, node)
+        with self.lock:
+            if tile_set:
+                node = Board.deserialize_simnode(tile_set['node'])
+                coord = tile_set['coord']
+                index = tile_set['index']
+                board = self.boards[index]
+                self.journal.record(board, index, message,
+                                    lambda: board.set(coord, node))
 
-        elif nand_rotate:
-            coord = nand_rotate['coord']
-            index = nand_rotate['index']
-            delta = nand_rotate['delta']
+            elif nand_rotate:
+                coord = nand_rotate['coord']
+                index = nand_rotate['index']
+                delta = nand_rotate['delta']
 
-            board = self.boards[index]
-            nand = board.get(coord)
+                board = self.boards[index]
+                nand = board.get(coord)
+
+                self.journal.record(
+                        board, index, message,
+                        lambda: nand.rotate_facing(delta, coord, board))
+
+            elif switch_toggle:
+                coord = switch_toggle['coord']
+                index = switch_toggle['index']
+                value = switch_toggle['value']
+
+                board = self.boards[index]
+                switch = board.get(coord)
+
+                switch.toggle(value)
+
+            elif portal_link:
+                index = portal_link['index']
+                coord = tuple(portal_link['coord'])
+                target_index = portal_link.get('target_index')
+                if target_index is None:
+                    self.unlink(index, coord)
+                else:
+                    self.link(index, coord, target_index,
+                              tuple(portal_link['target_coord']))
+
+            elif clock_domain:
+                self.set_period(clock_domain['index'],
+                                clock_domain['period'])
+
+            elif undo:
+                self.undo(undo)
+
+            elif redo:
+                self.redo(redo)
+
+            elif tick:
+                self.tick(tick)
+
+            if self.log is not None:
+                self.log.log_message(message)
+
+        # The clock takes the lock itself, and must not be started or stopped
+        # while we are holding it
+        if run is not None:
+            self.run(run.get('rate'))
+        elif pause:
+            self.pause()
+        elif resume:
+            self.resume()
+        elif step:
+            self.pause()
+            self.tick(step)
+
+    def tick(self, ticks=1, publish=True):
+        """Ticks every board in the world.
 
-            nand.rotate_facing(delta, coord, board)
+        Parameters
+        ----------
 
-        elif switch_toggle:
-            coord = switch_toggle['coord']
-            index = switch_toggle['index']
-            value = switch_toggle['value']
+        ticks : int
+          How many ticks to run for.
+        publish : bool
+          Whether to publish the boards' signals afterwards (see `share`).
+          The clock leaves it until the end of each batch of ticks.
+        """
+        with self.lock:
+            recorders = self.recorders
+            if not recorders and not self.links:
+                # Nothing needs doing between ticks, so each board can run
+                # straight through
+                self._tick_boards(self._due(self.ticks, ticks))
+            else:
+                for i in range(ticks):
+                    if self.links:
+                        self._sync_portals()
+                    self._tick_boards(self._due(self.ticks + i, 1))
+                    for recorder in recorders:
+                        recorder.sample(self.ticks + i + 1)
+            self.ticks += ticks
+            if publish:
+                self._publish()
 
+    def _due(self, start, ticks):
+        """How many times each board is due to tick, over the `ticks` ticks
+        after tick number `start`.
+
+        Returns : list
+          (index, count) for each board which is due at all.
+        """
+        periods = self.periods
+        if not periods:
+            return [(index, ticks) for index in range(len(self.boards))]
+        due = []
+        for index in range(len(self.boards)):
+            period = periods.get(index, 1)
+            # A board ticks on every tick number which is a multiple of its
+            # period
+            count = (start + ticks) // period - start // period
+            if count:
+                due.append((index, count))
+        return due
+
+    def _tick_boards(self, due):
+        if self.workers <= 1 or len(due) < 2:
+            for index, ticks in due:
+                self._tick_board(index, ticks)
+            return
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                    self.workers, thread_name_prefix='tick')
+        futures = [self.executor.submit(self._tick_board, index, ticks)
+                   for index, ticks in due]
+        for future in futures:
+            # Raises anything which went wrong in the worker
+            future.result()
+
+    def _tick_board(self, index, ticks):
+        board = self.boards[index]
+        board.resolve()
+        sim, version = self.engines.get(index, (None, None))
+        if sim is None or sim.board is not board or version != board.version:
+            sim = engine.create(self.engine, board)
+            self.engines[index] = (sim, board.version)
+
+        start = time.perf_counter()
+        # Switches and portals are set on the SimNodes
+        sim.refresh()
+        sim.step(ticks)
+        sim.sync()
+        elapsed = time.perf_counter() - start
+
+        timing = self.timings.setdefault(index, [0, 0.0, 0.0])
+        timing[0] += ticks
+        timing[1] += elapsed
+        # Averaged over roughly the last half second spent ticking the board
+        if timing[1] >= 0.5:
+            timing[:] = [0, 0.0, timing[0] / timing[1]]
+
+    def set_period(self, index, period):
+        """Puts a board in a slower clock domain, so that it only ticks on
+        every `period`th tick of the world. A period of 1 ticks it every
+        tick.
+
+        Boards only see each other through portals, which are updated before
+        every tick of the world. So a slow board sees the latest signals from
+        a fast one whenever it ticks, and a fast board sees the slow board's
+        signals held steady in between.
+        """
+        if period < 1:
+            raise ValueError(f'A clock period must be at least 1, not '
+                             f'{period}')
+        with self.lock:
+            if period == 1:
+                self.periods.pop(index, None)
+            else:
+                self.periods[index] = period
+
+    #####################################################
+    # Portals
+    #####################################################
+
+    def link(self, index, coords, target_index, target_coords):
+        """Shows a tile from one board on another.
+
+        A portal is placed at `coords` on board `index`, if there isn't one
+        there already. Before every tick it takes the signal of the tile at
+        `target_coords` on board `target_index`. A NAND next to a portal sees
+        that signal on the same tick it would if it were next to the tile
+        itself, but a wire fed by a portal is a tick behind.
+
+        Portals only carry signals one way. Link a second portal for the way
+        back.
+        """
+        with self.lock:
             board = self.boards[index]
-            switch = board.get(coord)
+            if not isinstance(board.get(coords), Portal):
+                # Placing the portal is an edit like any other, so that
+                # undoing the edits around it still fits the board
+                message = {'portal_link': {
+                    'index': index, 'coord': tuple(coords),
+                    'target_index': target_index,
+                    'target_coord': tuple(target_coords)}}
+                self.journal.record(board, index, message,
+                                    lambda: board.set(coords, Portal()))
+            self.links[(index, tuple(coords))] = (target_index,
+                                                  tuple(target_coords))
+            self._sync_portals()
+
+    def unlink(self, index, coords):
+        """Stops updating a portal. It keeps whatever signal it had."""
+        with self.lock:
+            self.links.pop((index, tuple(coords)), None)
+
+    def _sync_portals(self):
+        boards = self.boards
+        updates = []
+        # Read every target before setting any portals, so that a portal
+        # showing another portal gets its old signal
+        for (index, coords), (target_index, target_coords) in \
+                self.links.items():
+            portal = boards[index].get(coords)
+            if not isinstance(portal, Portal):
+                # Something else has been put there since
+                continue
+            target = boards[target_index].get(target_coords)
+            updates.append((portal, target is not None and
+                            bool(target.output())))
+        for portal, signal in updates:
+            portal.signal = signal
+
+    def undo(self, count=1):
+        """Takes back the last `count` edits.
+
+        Returns : int
+          How many edits were undone.
+        """
+        return self._step_journal(self.journal.undo, count)
+
+    def redo(self, count=1):
+        """Puts back the last `count` edits to be undone.
+
+        Returns : int
+          How many edits were redone.
+        """
+        return self._step_journal(self.journal.redo, count)
+
+    def _step_journal(self, step, count):
+        with self.lock:
+            for i in range(count):
+                try:
+                    entry = step(self.boards)
+                except ValueError as e:
+                    logger.warning(f"Can't undo or redo, the board was "
+                                   f"edited outside the journal: {e}")
+                    return i
+                if entry is None:
+                    return i
+                if self.log is not None:
+                    self.log.log_entry(entry.index, entry)
+            return count
+
+    def record(self, recorder):
+        """Starts sampling a `waveform.Recorder` after every tick, starting
+        with the current state."""
+        with self.lock:
+            recorder.sample(self.ticks)
+            self.recorders.append(recorder)
+
+    def stop_recording(self, recorder):
+        """Stops sampling a recorder, and closes it."""
+        with self.lock:
+            self.recorders.remove(recorder)
+        recorder.close()
+
+    def share(self, index, name=None):
+        """Publishes the signals on a board to shared memory, so other
+        processes can watch it with a `signalmap.Reader` without slowing the
+        world down. Needs Python 3.8 or later.
+
+        Returns : signalmap.Publisher
+          Its `name` is the name of the shared memory.
+        """
+        with self.lock:
+            publisher = Publisher(self.boards[index], name)
+            publisher.publish(self.ticks)
+            self.publishers.append(publisher)
+        return publisher
+
+    def unshare(self, publisher):
+        """Stops publishing a board's signals, and frees the shared memory."""
+        with self.lock:
+            self.publishers.remove(publisher)
+        publisher.close()
+
+    def _publish(self):
+        for publisher in self.publishers:
+            publisher.publish(self.ticks)
+
+    #####################################################
+    # Free-running clock
+    #####################################################
+
+    def run(self, rate=None):
+        """Starts ticking continuously in the background, or changes the rate
+        of a clock which is already running.
+
+        Parameters
+        ----------
+
+        rate : float
+          Target ticks per second, or None to tick as fast as possible.
+
+        Raises : ValueError
+          If the rate isn't more than 0.
+        """
+        if self.clock is None or not self.clock.is_alive():
+            self.clock = Clock(self, rate)
+            self.clock.start()
+        else:
+            self.clock.set_rate(rate)
+        self.clock.resume()
+
+    def pause(self):
+        if self.clock is not None:
+            self.clock.pause()
+
+    def resume(self):
+        if self.clock is not None:
+            self.clock.resume()
+
+    def stop(self):
+        """Shuts down the clock thread and any tick workers, and closes the
+        edit log and any shared signals."""
+        if self.clock is not None:
+            self.clock.stop()
+            self.clock = None
+        for publisher in list(self.publishers):
+            self.unshare(publisher)
+        if self.log is not None:
+            self.log.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def running(self):
+        return self.clock is not None and self.clock.running()
+
+    def stats(self):
+        """Current state of the simulation, for display or monitoring.
+
+        `boards` has the engine ticking each board (see `Engine.stats()`),
+        and how many ticks per second it manages, not counting time spent
+        outside it.
+        """
+        clock = self.clock
+        with self.lock:
+            boards = []
+            for index in range(len(self.boards)):
+                sim, version = self.engines.get(index, (None, None))
+                board_stats = {'engine': None} if sim is None else sim.stats()
+                ticks, seconds, rate = self.timings.get(index, (0, 0.0, 0.0))
+                if not rate and seconds:
+                    # Not yet ticked for long enough to average
+                    rate = ticks / seconds
+                board_stats['ticks_per_second'] = rate
+                boards.append(board_stats)
+        return {
+            'ticks': self.ticks,
+            'running': self.running(),
+            'rate': None if clock is None else clock.rate,
+            'ticks_per_second': 0.0 if clock is None else clock.measured_rate,
+            'boards': boards,
+        }
+
+
+def check_rate(rate):
+    """Raises ValueError unless `rate` is a usable clock rate: None, or more
+    than 0."""
+    if rate is not None and not rate > 0:
+        raise ValueError(f'A clock rate must be more than 0, not {rate}')
+
+
+class Clock(threading.Thread):
+    """Ticks a World continuously from a background thread.
+
+    The world's lock is only held for a short slice of time per batch of
+    ticks, so edits and renders get to interleave with a fast-running clock.
+
+    Parameters
+    ----------
+
+    world : World
+      The world to tick.
+    rate : float
+      Target ticks per second, or None to tick as fast as possible.
+    time_slice : float
+      The longest time, in seconds, to hold the world's lock for at once.
+    """
+
+    def __init__(self, world, rate=None, time_slice=0.01):
+        super().__init__(daemon=True)
+        check_rate(rate)
+        self.world = world
+        self.rate = rate
+        self.time_slice = time_slice
+        # Ticks per second, averaged over roughly the last half second
+        self.measured_rate = 0.0
+
+        self._unpaused = threading.Event()
+        self._stopped = threading.Event()
+        self._epoch = None
+
+    def running(self):
+        return (self.is_alive() and self._unpaused.is_set() and
+                not self._stopped.is_set())
+
+    def set_rate(self, rate):
+        check_rate(rate)
+        self.rate = rate
+        self._epoch = None
+
+    def pause(self):
+        self._unpaused.clear()
+        self.measured_rate = 0.0
+
+    def resume(self):
+        # Start pacing afresh, otherwise we'd try to catch up on every tick
+        # we missed while paused.
+        self._epoch = None
+        self._unpaused.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._unpaused.set()
+        self.join()
+
+    def run(self):
+        sample_time = time.monotonic()
+        sample_ticks = self.world.ticks
+
+        while True:
+            self._unpaused.wait()
+            if self._stopped.is_set():
+                return
+
+            now = time.monotonic()
+            rate = self.rate
+            if rate is None:
+                due = None
+            else:
+                if self._epoch is None:
+                    self._epoch = (now, self.world.ticks)
+                epoch_time, epoch_ticks = self._epoch
+                due = (int((now - epoch_time) * rate) + 1 -
+                       (self.world.ticks - epoch_ticks))
+                if due <= 0:
+                    # Ahead of schedule, wait for the next tick to be due
+                    time.sleep(min(-due + 1, rate) / rate)
+                    continue
+
+            with self.world.lock:
+                deadline = time.monotonic() + self.time_slice
+                ticked = 0
+                while due is None or ticked < due:
+                    self.world.tick(publish=False)
+                    ticked += 1
+                    if time.monotonic() >= deadline:
+                        break
+                self.world._publish()
 
-            switch.toggle(value)
+            now = time.monotonic()
+            if now - sample_time >= 0.5:
+                self.measured_rate = ((self.world.ticks - sample_ticks) /
+                                      (now - sample_time))
+                sample_time = now
+                sample_ticks = self.world.ticks
 
-        elif tick:
-            for i in range(tick):
-                for board in self.boards:
-                    board.tick()
+            # Let any thread waiting on the lock in
+            time.sleep(0)